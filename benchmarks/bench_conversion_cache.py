@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: Claude -> OpenAI request conversion of a long agentic session.
+
+Builds a synthetic Claude Code style session (assistant text + tool_use, user
+tool_result with sizeable file contents) and converts the last turn's request,
+which resends the whole history, with the conversion cache disabled and warm.
+The warm cache has seen the previous turn, so only the newest messages are
+converted. Also checks that both produce identical OpenAI requests.
+
+Usage: python benchmarks/bench_conversion_cache.py [messages]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import src.conversion.request_converter as request_converter
+from src.conversion.message_cache import MessageConversionCache
+from src.core.model_manager import model_manager
+from src.models.claude import ClaudeMessagesRequest
+
+
+SOURCE_LINE = '    result = self._cache.get(key, default={"hits": 0})  # “cached” lookup\n'
+
+
+def tool_call(turn: int):
+    """A (tool name, input, result content) triple in the shape Claude Code sends."""
+    path = f"/repo/src/storage/module_{turn}.py"
+    kind = turn % 3
+    if kind == 0:
+        listing = "".join(f"{line:6}\t{SOURCE_LINE}" for line in range(1, 121))
+        return "Read", {"file_path": path}, [{"type": "text", "text": listing}]
+    if kind == 1:
+        return (
+            "Edit",
+            {"file_path": path, "old_string": SOURCE_LINE * 12, "new_string": SOURCE_LINE.replace("get", "fetch") * 12},
+            f"The file {path} has been updated.",
+        )
+    return (
+        "Bash",
+        {"command": "python -m pytest -q tests/", "description": "Run the test suite"},
+        [{"type": "text", "text": "." * 400 + "\n212 passed in 3.41s\n"}],
+    )
+
+
+def build_session(num_messages: int) -> ClaudeMessagesRequest:
+    messages = [{"role": "user", "content": "Refactor the storage layer and keep the tests green."}]
+    turn = 0
+    while len(messages) < num_messages:
+        name, tool_input, result = tool_call(turn)
+        messages.append(
+            {
+                "role": "assistant",
+                "content": [
+                    {"type": "text", "text": f"Next I will use {name} on module {turn}."},
+                    {"type": "tool_use", "id": f"toolu_{turn:04d}", "name": name, "input": tool_input},
+                ],
+            }
+        )
+        messages.append(
+            {
+                "role": "user",
+                "content": [{"type": "tool_result", "tool_use_id": f"toolu_{turn:04d}", "content": result}],
+            }
+        )
+        turn += 1
+    return ClaudeMessagesRequest(model="claude-3-5-sonnet", max_tokens=1024, messages=messages[:num_messages])
+
+
+def run(label: str, cache: MessageConversionCache, previous, request, rounds: int = 20):
+    request_converter.message_cache = cache
+    best = float("inf")
+    result = None
+    for _ in range(rounds):
+        # Each round starts from the state after the previous turn
+        cache._entries.clear()
+        request_converter.convert_claude_to_openai(previous, model_manager)
+        start = time.perf_counter()
+        result = request_converter.convert_claude_to_openai(request, model_manager)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>10}: {len(request.messages)} messages converted in {best * 1000:.2f} ms")
+    return best, result
+
+
+def main():
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 201
+    request = build_session(num_messages)
+    previous = build_session(num_messages - 2)
+
+    uncached_time, uncached = run("no cache", MessageConversionCache(0), previous, request)
+    cached_time, cached = run("warm cache", MessageConversionCache(), previous, request)
+
+    assert cached == uncached, "cached conversion differs from uncached conversion"
+    print(f"speedup: {uncached_time / cached_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: cost of the conversion debug log on a large request.
+
+Converts a long conversation with base64 screenshots at LOG_LEVEL=INFO and
+compares the old eager `json.dumps(..., indent=2)` f-string with `trace_payload`,
+then shows the size of a DEBUG trace line with and without redaction.
+
+Usage: python benchmarks/bench_debug_logging.py [messages] [image_mb]
+"""
+
+import base64
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from src.conversion.request_converter import convert_claude_to_openai
+from src.conversion.tracing import LazyPayload, trace_payload
+from src.core.model_manager import model_manager
+from src.models.claude import ClaudeMessagesRequest
+
+
+def build_request(num_messages: int, image_mb: float) -> ClaudeMessagesRequest:
+    image = base64.b64encode(os.urandom(int(image_mb * 1024 * 1024))).decode()
+    messages = []
+    for i in range(num_messages):
+        if i % 2 == 0:
+            content = [{"type": "text", "text": f"Step {i}: please look at this. " * 20}]
+            if i % 20 == 0:
+                content.append({"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": image}})
+            messages.append({"role": "user", "content": content})
+        else:
+            messages.append({"role": "assistant", "content": f"Done with step {i}. " * 40})
+    return ClaudeMessagesRequest(model="claude-3-5-sonnet-20241022", max_tokens=1024, messages=messages)
+
+
+def time_per_call(fn, rounds: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+if __name__ == "__main__":
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    image_mb = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    logging.disable(logging.NOTSET)
+    logger = logging.getLogger("bench.conversion")
+    logger.setLevel(logging.INFO)
+    openai_request = convert_claude_to_openai(build_request(num_messages, image_mb), model_manager)
+
+    def eager():
+        logger.debug(f"Converted Claude request to OpenAI format: {json.dumps(openai_request, indent=2, ensure_ascii=False)}")
+
+    def lazy():
+        trace_payload(logger, "Converted Claude request to OpenAI format", openai_request)
+
+    eager_s = time_per_call(eager)
+    lazy_s = time_per_call(lazy, rounds=10000)
+    print(f"{num_messages} messages, {image_mb} MB images every 20 messages, LOG_LEVEL=INFO")
+    print(f"  eager f-string: {eager_s * 1000:.2f} ms/request")
+    print(f"   trace_payload: {lazy_s * 1e6:.2f} us/request")
+
+    full = len(json.dumps(openai_request, indent=2, ensure_ascii=False))
+    redacted = len(str(LazyPayload(openai_request, 2000)))
+    print(f"DEBUG line size: {full / 1e6:.1f} MB unredacted -> {redacted / 1e3:.1f} KB redacted")
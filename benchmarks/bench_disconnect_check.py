@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-chunk client-disconnect check under concurrent streams.
+
+Runs N concurrent simulated streams against a Starlette Request whose receive()
+blocks like uvicorn's does while the client is connected, and compares:
+  poll    - `await http_request.is_disconnected()` once per chunk (old behaviour)
+  watcher - one DisconnectWatcher task per request, flag read per chunk
+against a baseline loop with no check. Reports the added cost per chunk.
+
+Usage: python benchmarks/bench_disconnect_check.py [streams] [chunks_per_stream]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from starlette.requests import Request
+
+from src.core.disconnect import DisconnectWatcher
+
+
+def make_request(connected: asyncio.Event) -> Request:
+    async def receive():
+        await connected.wait()
+        return {"type": "http.disconnect"}
+
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+async def stream_baseline(request, chunks):
+    for _ in range(chunks):
+        await asyncio.sleep(0)
+
+
+async def stream_poll(request, chunks):
+    for _ in range(chunks):
+        await asyncio.sleep(0)
+        if await request.is_disconnected():
+            break
+
+
+async def stream_watcher(request, chunks):
+    watcher = DisconnectWatcher(request).start()
+    try:
+        for _ in range(chunks):
+            await asyncio.sleep(0)
+            if watcher.disconnected:
+                break
+    finally:
+        watcher.stop()
+
+
+async def run_concurrent(fn, streams, chunks) -> float:
+    never = asyncio.Event()
+    requests = [make_request(never) for _ in range(streams)]
+    start = time.perf_counter()
+    await asyncio.gather(*(fn(request, chunks) for request in requests))
+    return time.perf_counter() - start
+
+
+def best_of(fn, streams, chunks, rounds=3) -> float:
+    return min(asyncio.run(run_concurrent(fn, streams, chunks)) for _ in range(rounds))
+
+
+if __name__ == "__main__":
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    total = streams * chunks
+
+    baseline = best_of(stream_baseline, streams, chunks)
+    poll = best_of(stream_poll, streams, chunks)
+    watcher = best_of(stream_watcher, streams, chunks)
+
+    print(f"{streams} concurrent streams x {chunks} chunks")
+    print(f" baseline: {baseline * 1000:.1f} ms")
+    print(f"     poll: {poll * 1000:.1f} ms  (+{(poll - baseline) / total * 1e6:.2f} us/chunk)")
+    print(f"  watcher: {watcher * 1000:.1f} ms  (+{(watcher - baseline) / total * 1e6:.2f} us/chunk)")
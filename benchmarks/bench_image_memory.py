@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: screenshot-heavy sessions through parsing, conversion and upstream encoding.
+
+Simulates a Claude Code session where a screenshot is added every few turns and
+every turn resends the whole history. Each turn's body goes through
+`model_validate_json` -> `convert_claude_to_openai` -> the upstream httpx
+client's `build_request` (where the JSON body is encoded), like a buffered request.
+
+Every configuration runs in a fresh subprocess and reports the largest
+per-request allocation peak (tracemalloc) and the process peak RSS:
+
+  before:  no image interning, stdlib JSON encoding of the upstream body
+  after:   image data URLs interned by content, orjson encoding (if installed)
+
+Both run with and without the per-message conversion cache.
+
+Usage: python benchmarks/bench_image_memory.py [turns] [screenshot_kib]
+"""
+
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+CONFIGS = {
+    "before": {"IMAGE_CACHE_MAX_BYTES": "0", "BENCH_STDLIB_JSON": "1"},
+    "after": {},
+}
+
+
+def build_body(turn: int, screenshots: list) -> bytes:
+    messages = []
+    for index in range(turn + 1):
+        content = [{"type": "text", "text": f"Turn {index}: what changed?"}]
+        if index % 3 == 0:
+            shot = screenshots[(index // 3) % len(screenshots)]
+            content.append({"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": shot}})
+        messages.append({"role": "user", "content": content})
+        messages.append({"role": "assistant", "content": f"Looked at turn {index}."})
+    messages.append({"role": "user", "content": "Continue."})
+    return json.dumps({"model": "claude-3-5-sonnet", "max_tokens": 1024, "messages": messages}).encode()
+
+
+def child(turns: int, screenshot_kib: int) -> None:
+    from src.conversion.request_converter import convert_claude_to_openai
+    from src.core import http_pool
+    from src.core.model_manager import model_manager
+    from src.models.claude import ClaudeMessagesRequest
+
+    if os.environ.get("BENCH_STDLIB_JSON"):
+        http_pool.orjson = None
+    client = http_pool.build_http_client("bench")
+
+    screenshots = [base64.b64encode(os.urandom(screenshot_kib * 1024)).decode() for _ in range(4)]
+    tracemalloc.start()
+    worst_peak = 0
+    for turn in range(turns):
+        body = build_body(turn, screenshots)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        request = ClaudeMessagesRequest.model_validate_json(body)
+        openai_request = convert_claude_to_openai(request, model_manager)
+        upstream = client.build_request("POST", "http://upstream.invalid/v1/chat/completions", json=openai_request)
+        _, peak = tracemalloc.get_traced_memory()
+        worst_peak = max(worst_peak, peak - baseline)
+        del body, request, openai_request, upstream
+    tracemalloc.stop()
+    rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"peak": worst_peak, "rss": rss_kib * 1024}))
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    screenshot_kib = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    print(f"{turns} turns, screenshot every 3 turns ({screenshot_kib} KiB raw, 4 distinct images)")
+    for cache_size in ("0", "4096"):
+        for name, overrides in CONFIGS.items():
+            env = dict(os.environ, CONVERSION_CACHE_SIZE=cache_size, **overrides)
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", str(turns), str(screenshot_kib)],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            label = f"{name} (conversion cache {'on' if cache_size != '0' else 'off'})"
+            print(
+                f"{label:>34}: per-request peak {result['peak'] / 2**20:7.1f} MiB, "
+                f"process peak RSS {result['rss'] / 2**20:7.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: buffered throughput against a per-key rate-limited upstream.
+
+The stub upstream admits at most `per_key` concurrent requests per API key
+(answering 429 with a short Retry-After above that) and takes `latency` seconds
+per completion. A fixed number of concurrent callers run for `duration` seconds
+through OpenAIClient with 1, 2, 4 and 8 pooled keys; completed requests per
+second should grow roughly linearly with the key count.
+
+Usage: python benchmarks/bench_key_pool.py [per_key] [latency_ms] [duration_s]
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+
+from src.core.client import OpenAIClient
+from src.core.logging import logger
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 1,
+    "model": "gpt-4o",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def make_upstream(per_key: int, latency: float):
+    in_flight = Counter()
+
+    async def handler(request):
+        key = request.headers["authorization"]
+        if in_flight[key] >= per_key:
+            return httpx.Response(429, json={"error": {"message": "rate limited"}}, headers={"retry-after-ms": "50"})
+        in_flight[key] += 1
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            in_flight[key] -= 1
+        return httpx.Response(200, json=COMPLETION)
+
+    return handler
+
+
+async def run(keys: int, per_key: int, latency: float, duration: float, callers: int) -> float:
+    api_keys = [f"sk-bench-key-{i:04d}" for i in range(keys)]
+    client = OpenAIClient(api_keys[0], "http://stub/v1", api_keys=api_keys)
+    transport = httpx.MockTransport(make_upstream(per_key, latency))
+    for pooled in client.key_pool.keys:
+        pooled.client = AsyncOpenAI(
+            api_key=pooled.api_key,
+            base_url="http://stub/v1",
+            http_client=httpx.AsyncClient(transport=transport),
+            max_retries=0,
+        )
+
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async def caller(n: int):
+        nonlocal completed
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            try:
+                await client.create_chat_completion({"model": "gpt-4o", "messages": []}, f"bench-{n}-{i}")
+                completed += 1
+            except HTTPException:
+                # Every key benched: back off like the endpoint retry loop would
+                await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(caller(n) for n in range(callers)))
+    return completed / duration
+
+
+if __name__ == "__main__":
+    per_key = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+    callers = 64
+    logger.setLevel(logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(f"{callers} callers, {per_key} concurrent requests allowed per key, {latency * 1000:.0f} ms upstream latency")
+    baseline = None
+    for keys in (1, 2, 4, 8):
+        rate = asyncio.run(run(keys, per_key, latency, duration, callers))
+        baseline = baseline or rate
+        print(f" {keys} key(s): {rate:8.1f} req/s  ({rate / baseline:.2f}x)")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: /v1/messages body parsing + conversion, pydantic vs fast dict path.
+
+Serializes a synthetic Claude Code session (see bench_conversion_cache.py) with
+a few base64 screenshots, then times bytes -> OpenAI request both ways with the
+conversion cache disabled, so the numbers isolate parsing and validation.
+Also checks that both paths produce identical OpenAI requests.
+
+Usage: python benchmarks/bench_request_parsing.py [messages] [images]
+"""
+
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from bench_conversion_cache import build_session
+
+import src.conversion.dict_converter as dict_converter
+import src.conversion.request_converter as request_converter
+from src.conversion.message_cache import MessageConversionCache
+from src.core.model_manager import model_manager
+from src.models.claude import ClaudeMessagesRequest
+
+
+def build_body(num_messages: int, num_images: int) -> bytes:
+    payload = build_session(num_messages).model_dump(exclude_none=True)
+    screenshot = base64.b64encode(os.urandom(256 * 1024)).decode()
+    for index in range(num_images):
+        payload["messages"].insert(
+            1 + index * 2,
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": f"Screenshot {index}"},
+                    {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": screenshot}},
+                ],
+            },
+        )
+    return json.dumps(payload).encode()
+
+
+def pydantic_path(body: bytes):
+    return request_converter.convert_claude_to_openai(ClaudeMessagesRequest.model_validate_json(body), model_manager)
+
+
+def fast_path(body: bytes):
+    return dict_converter.convert_claude_dict_to_openai(dict_converter.parse_messages_request(body), model_manager)
+
+
+def run(label: str, convert, body: bytes, rounds: int = 20):
+    best = float("inf")
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = convert(body)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>9}: {len(body) / 1024:,.0f} KiB body in {best * 1000:.2f} ms")
+    return best, result
+
+
+def main():
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 201
+    num_images = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    body = build_body(num_messages, num_images)
+    request_converter.message_cache = dict_converter.message_cache = MessageConversionCache(0)
+    print(f"JSON decoder: {'orjson' if dict_converter.orjson is not None else 'json'}")
+
+    pydantic_time, expected = run("pydantic", pydantic_path, body)
+    fast_time, result = run("fast path", fast_path, body)
+
+    assert result == expected, "fast path output differs from the pydantic path"
+    print(f"speedup: {pydantic_time / fast_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: Claude SSE event encoding, f-string + json.dumps vs sse_encoder.
+
+Replays a recorded-style stream (text deltas followed by a streamed tool call) and
+encodes every event both ways, including the str -> bytes step StreamingResponse
+performs for the old path. Also checks that both produce identical bytes.
+
+Usage: python benchmarks/bench_sse_encoding.py [text_events]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from src.conversion import sse_encoder
+from src.core.constants import Constants
+
+
+def build_recorded_events(num_text: int) -> list:
+    words = ["The", " quick", " brown", " fox", " — ", "jumps", " over", ' "lazy"', " dogs\n", " 世界"]
+    events = [("text", 0, words[i % len(words)]) for i in range(num_text)]
+    events.append(("stop", 0, None))
+    args = json.dumps({"file_path": "/tmp/example.py", "content": "print('hello')\n" * 200})
+    events.extend(("json", 1, args[i:i + 24]) for i in range(0, len(args), 24))
+    events.append(("stop", 1, None))
+    return events
+
+
+def encode_fstring(kind, index, payload) -> bytes:
+    if kind == "text":
+        out = f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': index, 'delta': {'type': Constants.DELTA_TEXT, 'text': payload}}, ensure_ascii=False)}\n\n"
+    elif kind == "json":
+        out = f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': index, 'delta': {'type': Constants.DELTA_INPUT_JSON, 'partial_json': payload}}, ensure_ascii=False)}\n\n"
+    else:
+        out = f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': index}, ensure_ascii=False)}\n\n"
+    return out.encode("utf-8")
+
+
+def encode_precompiled(kind, index, payload) -> bytes:
+    if kind == "text":
+        return sse_encoder.text_delta(index, payload)
+    if kind == "json":
+        return sse_encoder.input_json_delta(index, payload)
+    return sse_encoder.content_block_stop(index)
+
+
+def run(label: str, encode, events, rounds: int = 5) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for event in events:
+            encode(*event)
+        best = min(best, time.perf_counter() - start)
+    rate = len(events) / best
+    print(f"{label:>12}: {len(events)} events in {best * 1000:.1f} ms -> {rate:,.0f} events/sec")
+    return rate
+
+
+if __name__ == "__main__":
+    num_text = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    events = build_recorded_events(num_text)
+    assert all(encode_fstring(*e) == encode_precompiled(*e) for e in events), "encoders disagree"
+    old_rate = run("f-string", encode_fstring, events)
+    new_rate = run("sse_encoder", encode_precompiled, events)
+    print(f"     speedup: {new_rate / old_rate:.1f}x")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: upstream SSE chunk handling before/after the raw streaming path.
+
+"before" replays what the SDK stream + proxy used to do per chunk:
+  json.loads -> ChatCompletionChunk -> model_dump -> json.dumps -> json.loads
+"after" is `iter_sse_chunks`, which decodes each SSE event exactly once.
+
+Usage: python benchmarks/bench_stream_parsing.py [chunks]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from openai._models import construct_type
+from openai.types.chat import ChatCompletionChunk
+
+from src.core.client import iter_sse_chunks
+
+
+def build_recorded_stream(num_chunks: int) -> list:
+    """Build SSE lines shaped like a typical gpt-4o text stream."""
+    base = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 1700000000,
+        "model": "gpt-4o-2024-08-06",
+        "system_fingerprint": "fp_bench",
+    }
+    lines = []
+
+    def emit(choices, usage=None):
+        event = dict(base, choices=choices, usage=usage)
+        lines.append(f"data: {json.dumps(event)}")
+        lines.append("")
+
+    emit([{"index": 0, "delta": {"role": "assistant", "content": ""}, "logprobs": None, "finish_reason": None}])
+    for i in range(num_chunks):
+        emit([{"index": 0, "delta": {"content": f" token{i % 97}"}, "logprobs": None, "finish_reason": None}])
+    emit([{"index": 0, "delta": {}, "logprobs": None, "finish_reason": "stop"}])
+    emit([], usage={"prompt_tokens": 1200, "completion_tokens": num_chunks, "total_tokens": 1200 + num_chunks})
+    lines.append("data: [DONE]")
+    lines.append("")
+    return lines
+
+
+async def _aiter(lines):
+    for line in lines:
+        yield line
+
+
+async def before(lines) -> int:
+    count = 0
+    async for line in _aiter(lines):
+        if not line.startswith("data: "):
+            continue
+        data = line[6:]
+        if data == "[DONE]":
+            break
+        # SDK stream decoding
+        chunk = construct_type(type_=ChatCompletionChunk, value=json.loads(data))
+        # OpenAIClient.create_chat_completion_stream
+        sse = f"data: {json.dumps(chunk.model_dump(), ensure_ascii=False)}"
+        # convert_openai_streaming_to_claude_with_cancellation
+        json.loads(sse[6:])
+        count += 1
+    return count
+
+
+async def after(lines) -> int:
+    count = 0
+    async for _ in iter_sse_chunks(_aiter(lines)):
+        count += 1
+    return count
+
+
+def run(label: str, fn, lines, rounds: int = 5) -> float:
+    best = float("inf")
+    count = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        count = asyncio.run(fn(lines))
+        best = min(best, time.perf_counter() - start)
+    rate = count / best
+    print(f"{label:>8}: {count} chunks in {best * 1000:.1f} ms -> {rate:,.0f} chunks/sec")
+    return rate
+
+
+if __name__ == "__main__":
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    lines = build_recorded_stream(num_chunks)
+    before_rate = run("before", before, lines)
+    after_rate = run("after", after, lines)
+    print(f" speedup: {after_rate / before_rate:.1f}x")
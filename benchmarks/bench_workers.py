@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: buffered /v1/messages requests/sec by number of workers.
+
+Starts a canned OpenAI-compatible upstream (a minimal asyncio HTTP server that
+answers every chat completion instantly), then for each worker count starts the
+proxy (`WORKERS=<n>`, optionally `REUSE_PORT=true`) and drives it with several
+load-generator processes for a fixed time. The request carries a mid-sized
+Claude Code session, so the proxy's conversion and JSON work dominates.
+
+The upstream and load generators use CPU too; scaling flattens out once the
+machine runs out of cores for all of them.
+
+Usage: python benchmarks/bench_workers.py [seconds] [worker counts, e.g. 1,2,4] [--reuse-port]
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+COMPLETION = json.dumps(
+    {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "Done."}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": 2, "total_tokens": 1002},
+    }
+).encode()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _handle_upstream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                b"content-length: " + str(len(COMPLETION)).encode() + b"\r\n\r\n" + COMPLETION
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+
+def run_upstream(port: int) -> None:
+    async def serve():
+        server = await asyncio.start_server(_handle_upstream, "127.0.0.1", port, reuse_port=True)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def run_load(port: int, body: bytes, seconds: float, concurrency: int, results) -> None:
+    import httpx
+
+    async def drive():
+        done = 0
+        deadline = time.perf_counter() + seconds
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+
+            async def loop():
+                nonlocal done
+                while time.perf_counter() < deadline:
+                    response = await client.post(
+                        "/v1/messages", content=body, headers={"content-type": "application/json"}
+                    )
+                    response.raise_for_status()
+                    done += 1
+
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return done
+
+    results.put(asyncio.run(drive()))
+
+
+def wait_ready(port: int, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("proxy did not become ready")
+
+
+def measure(workers: int, reuse_port: bool, upstream_port: int, body: bytes, seconds: float) -> float:
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="sk-benchmark",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{upstream_port}/v1",
+        HOST="127.0.0.1",
+        PORT=str(port),
+        LOG_LEVEL="error",
+        WORKERS=str(workers),
+        REUSE_PORT="true" if reuse_port else "false",
+        STATE_SOCKET_PATH=f"/tmp/claude-code-proxy-bench-{port}.sock",
+    )
+    env.pop("ANTHROPIC_API_KEY", None)
+    proxy = subprocess.Popen(
+        [sys.executable, "-c", "from src.main import main; main()"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        # Warm every worker's caches and connection pools before measuring
+        run_load_processes(port, body, 1.0)
+        return run_load_processes(port, body, seconds) / seconds
+    finally:
+        proxy.terminate()
+        proxy.wait(timeout=30)
+
+
+def run_load_processes(port: int, body: bytes, seconds: float, processes: int = 2, concurrency: int = 16) -> int:
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=run_load, args=(port, body, seconds, concurrency, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    total = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    return total
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    reuse_port = "--reuse-port" in sys.argv
+    seconds = float(args[0]) if args else 5.0
+    counts = [int(n) for n in args[1].split(",")] if len(args) > 1 else sorted({1, 2, max(1, os.cpu_count() // 2)})
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from bench_conversion_cache import build_session
+
+    body = json.dumps(build_session(41).model_dump(exclude_none=True)).encode()
+    upstream_port = free_port()
+    upstream = multiprocessing.Process(target=run_upstream, args=(upstream_port,), daemon=True)
+    upstream.start()
+
+    print(f"{os.cpu_count()} CPUs, {len(body) / 1024:.0f} KiB request body, {seconds:.0f}s per run")
+    baseline = None
+    for workers in counts:
+        rps = measure(workers, reuse_port, upstream_port, body, seconds)
+        baseline = baseline or rps
+        mode = "SO_REUSEPORT" if reuse_port and workers > 1 else "shared socket"
+        print(f"{workers:>3} worker(s) ({mode}): {rps:8.1f} req/s  ({rps / baseline:.2f}x)")
+    upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,45 @@
 import asyncio
 import contextlib
 from fastapi import APIRouter, HTTPException, Request, Header, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from datetime import datetime
 import uuid
-from typing import Optional
+from typing import AsyncIterator, List, Optional
+from pydantic import ValidationError
 
 from src.core.config import config
 from src.core.logging import logger
-from src.core.client import OpenAIClient
-from src.core.context import set_current_api_key
+from src.core.context import get_current_api_key, set_current_api_key
+from src.core.disconnect import DisconnectWatcher
+from src.core.hedging import hedge_policy, run_hedged
+from src.core.metrics import RequestTimer, metrics_registry
+from src.core.admission import Ticket, admission
+from src.core.response_cache import ResponseCache, response_cache
+from src.core.single_flight import Flight, single_flight
 from src.models.claude import ClaudeMessagesRequest, ClaudeTokenCountRequest
+from src.conversion.dict_converter import convert_claude_dict_to_openai, parse_messages_request
+from src.conversion.image_policy import image_policy
+from src.conversion.message_cache import message_cache
 from src.conversion.request_converter import convert_claude_to_openai
 from src.conversion.response_converter import (
     convert_openai_to_claude_response,
     convert_openai_streaming_to_claude_with_cancellation,
 )
 from src.core.model_manager import model_manager
+from src.core.token_counter import token_counter
+from src.core.upstream_router import UpstreamRouter
 
 router = APIRouter()
 
-openai_client = OpenAIClient(
-    config.api_key,
-    config.openai_base_url,
-    config.request_timeout,
-    api_version=config.azure_api_version,
+# Routes each request to one of the configured upstreams (a single OPENAI_BASE_URL by default)
+openai_client = UpstreamRouter.from_config(config)
+openai_client.register_metrics(metrics_registry)
+
+model_fallbacks_total = metrics_registry.counter(
+    "claude_proxy_model_fallbacks_total",
+    "Requests moved on to the next model of their tier's fallback chain, per model and reason.",
+    ("model", "fallback", "reason"),
 )
 
 async def validate_api_key(x_api_key: Optional[str] = Header(None), authorization: Optional[str] = Header(None)):
@@ -58,7 +73,31 @@ async def validate_api_key(x_api_key: Optional[str] = Header(None), authorizatio
         logger.info(f"API Key authenticated: {masked_key}, Models: BIG={models_config['big_model']}, MIDDLE={models_config['middle_model']}, SMALL={models_config['small_model']}, IgnoreTemp={models_config['ignore_temperature']}")
 
 @router.post("/v1/messages")
-async def create_message(request: ClaudeMessagesRequest, http_request: Request, _: None = Depends(validate_api_key)):
+async def create_message(http_request: Request, _: None = Depends(validate_api_key)):
+    timer = RequestTimer(getattr(http_request.state, "request_start", None))
+    # Body parsing is done here rather than by FastAPI so FAST_REQUEST_PARSING can skip the pydantic tree
+    body = await http_request.body()
+    request_data = None
+    if config.fast_request_parsing:
+        request_data = parse_messages_request(body)
+        request = ClaudeMessagesRequest.model_construct(**request_data)
+    else:
+        try:
+            request = ClaudeMessagesRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            )
+    # Auth, body parsing and validation ran between arrival and here
+    timer.mark_since("validation", timer.start)
+    # Per-client-key concurrency / rate limits; waits in the fair queue or raises 429
+    client_limits = config.get_models_for_api_key(get_current_api_key())
+    ticket = Ticket(None)
+    if admission.applies_to(client_limits):
+        with timer.stage("admission"):
+            ticket = await admission.admit(client_limits.get("key_id", "default"), client_limits)
+    # Streaming responses release the ticket when the stream ends instead
+    release_ticket = True
     try:
         logger.debug(
             f"Processing Claude request: model={request.model}, stream={request.stream}"
@@ -68,8 +107,19 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
         request_id = str(uuid.uuid4())
 
         # Convert Claude request to OpenAI format
-        openai_request = convert_claude_to_openai(request, model_manager)
+        with timer.stage("convert"):
+            if request_data is not None:
+                openai_request = convert_claude_dict_to_openai(request_data, model_manager)
+            else:
+                openai_request = convert_claude_to_openai(request, model_manager)
+        # Fallback models get their own image policy applied to the unprocessed request
+        converted_request = openai_request
+        if image_policy.enabled:
+            with timer.stage("image_policy"):
+                openai_request = await image_policy.apply(openai_request)
         openai_model = openai_request.get("model", "")
+        # The mapped model first, then its fallback chain for this client key
+        models = [openai_model] + model_manager.fallback_models_for(request.model)
         streaming_mode = config.get_streaming_mode_for_model(openai_model)
         effective_stream = bool(request.stream and streaming_mode == "stream")
 
@@ -82,24 +132,70 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
             f"Request {request_id}: model={openai_model}, streaming_mode={streaming_mode}, client_stream={request.stream}, effective_stream={effective_stream}"
         )
 
+        cache_mode = "stream" if effective_stream else "buffered"
+        cache_key = None
+        cached = None
+        flight_key = None
+        if config.request_coalescing:
+            flight_key = ResponseCache.key_for(openai_request, cache_mode, get_current_api_key())
+        if response_cache.enabled and response_cache.cacheable(openai_request):
+            cache_key = flight_key or ResponseCache.key_for(openai_request, cache_mode, get_current_api_key())
+            cached = response_cache.get(cache_key, cache_mode)
+            if cached is not None:
+                logger.info(f"Request {request_id}: served from response cache")
+        cache_headers = {"X-Proxy-Cache": "HIT" if cached is not None else "MISS"} if cache_key else {}
+
         # Check if client disconnected before processing
         if await http_request.is_disconnected():
             raise HTTPException(status_code=499, detail="Client disconnected")
 
+        # One watcher per request: cancels the in-flight upstream call as soon as the client leaves
+        disconnect_watcher = DisconnectWatcher(http_request, request_id)
+        disconnect_watcher.add_callback(lambda: openai_client.cancel_request(request_id))
+        disconnect_watcher.start()
+
+        def open_stream(upstream_id: str, watcher):
+            stream = _stream_openai_response_with_fallbacks(
+                openai_request, models, upstream_id, watcher, timer, base_request=converted_request
+            )
+            return response_cache.record_stream(cache_key, stream) if cache_key else stream
+
+        async def fetch(upstream_id: str, watcher):
+            response = await _gather_openai_response_with_fallbacks(
+                openai_request, models, upstream_id, watcher, streaming_mode, timer, base_request=converted_request
+            )
+            if cache_key:
+                response_cache.put(cache_key, response)
+            return response
+
         if effective_stream:
             # Streaming response - wrap in error handling
             try:
-                openai_stream = openai_client.create_chat_completion_stream(
-                    openai_request, request_id
-                )
-                return StreamingResponse(
-                    convert_openai_streaming_to_claude_with_cancellation(
-                        openai_stream,
-                        request,
-                        logger,
-                        http_request,
-                        openai_client,
+                if cached is not None:
+                    openai_stream = response_cache.replay(cached)
+                elif flight_key:
+                    openai_stream = single_flight.stream(
+                        flight_key,
                         request_id,
+                        disconnect_watcher,
+                        lambda flight: open_stream(flight.request_id, _shared_watcher(flight)),
+                    )
+                else:
+                    openai_stream = open_stream(request_id, disconnect_watcher)
+                disconnect_watcher.add_callback(ticket.release)
+                release_ticket = False
+                return StreamingResponse(
+                    _release_when_done(
+                        convert_openai_streaming_to_claude_with_cancellation(
+                            openai_stream,
+                            request,
+                            logger,
+                            disconnect_watcher,
+                            openai_client,
+                            request_id,
+                            timer,
+                        ),
+                        ticket,
                     ),
                     media_type="text/event-stream",
                     headers={
@@ -107,9 +203,11 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
                         "Connection": "keep-alive",
                         "Access-Control-Allow-Origin": "*",
                         "Access-Control-Allow-Headers": "*",
+                        **cache_headers,
                     },
                 )
             except HTTPException as e:
+                disconnect_watcher.stop()
                 # Convert to proper error response for streaming
                 logger.error(f"Streaming error: {e.detail}")
                 import traceback
@@ -123,17 +221,30 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
                 return JSONResponse(status_code=e.status_code, content=error_response)
         else:
             # Buffered response with retries
-            openai_response = await _gather_openai_response_with_retries(
-                openai_request,
-                openai_model,
-                request_id,
-                http_request,
-                streaming_mode,
-            )
-            claude_response = convert_openai_to_claude_response(
-                openai_response, request
+            try:
+                if cached is not None:
+                    openai_response = cached
+                elif flight_key:
+                    openai_response = await single_flight.call(
+                        flight_key,
+                        request_id,
+                        disconnect_watcher,
+                        lambda flight: fetch(flight.request_id, _shared_watcher(flight)),
+                    )
+                else:
+                    openai_response = await fetch(request_id, disconnect_watcher)
+            finally:
+                disconnect_watcher.stop()
+            with timer.stage("response_convert"):
+                claude_response = convert_openai_to_claude_response(
+                    openai_response, request
+                )
+            timer.finish()
+            timer.publish("buffered")
+            return JSONResponse(
+                content=claude_response,
+                headers={"Server-Timing": timer.server_timing(), **cache_headers},
             )
-            return claude_response
     except HTTPException:
         raise
     except Exception as e:
@@ -143,53 +254,114 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
         logger.error(traceback.format_exc())
         error_message = openai_client.classify_openai_error(str(e))
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        if release_ticket:
+            ticket.release()
+
+
+async def _release_when_done(stream: AsyncIterator[str], ticket: Ticket) -> AsyncIterator[str]:
+    try:
+        async for event in stream:
+            yield event
+    finally:
+        ticket.release()
+
+
+def _shared_watcher(flight: Flight) -> Flight:
+    """Cancel a coalesced upstream call once its last waiter has disconnected."""
+    flight.add_callback(lambda: openai_client.cancel_request(flight.request_id))
+    return flight
+
+
+async def _gather_openai_response_with_fallbacks(
+    openai_request: dict,
+    models: List[str],
+    request_id: str,
+    disconnect_watcher: DisconnectWatcher,
+    streaming_mode: str,
+    timer: Optional[RequestTimer] = None,
+    base_request: Optional[dict] = None,
+):
+    """Fetch a full completion from the first model of `models` that answers in time.
+
+    Every model but the last gets one attempt: a failure `_should_fall_back` accepts,
+    or no response within the model's MODEL_TTFT_BUDGETS entry, moves the request
+    on to the next model. The last model gets the usual retries. Fallback requests
+    are built from `base_request` (the request before image policies) by
+    `_request_for_model`.
+    """
+    base_request = base_request or openai_request
+    for index, model in enumerate(models):
+        if index > 0:
+            openai_request = await _request_for_model(base_request, model, timer)
+            streaming_mode = config.get_streaming_mode_for_model(model)
+        if index == len(models) - 1:
+            return await _gather_openai_response_with_retries(
+                openai_request, model, request_id, disconnect_watcher, streaming_mode, timer
+            )
+        try:
+            # Without streaming the first token arrives with the whole response
+            return await asyncio.wait_for(
+                _gather_openai_response_with_retries(
+                    openai_request, model, request_id, disconnect_watcher, streaming_mode, timer, max_attempts=1
+                ),
+                config.model_ttft_budgets.get(model),
+            )
+        except asyncio.TimeoutError:
+            openai_client.cancel_request(request_id)
+            _fall_back(request_id, model, models[index + 1], "ttft_budget")
+        except HTTPException as exc:
+            if not _should_fall_back(exc):
+                raise
+            _fall_back(request_id, model, models[index + 1], _fallback_reason(exc))
 
 
 async def _gather_openai_response_with_retries(
     openai_request: dict,
     openai_model: str,
     request_id: str,
-    http_request: Request,
+    disconnect_watcher: DisconnectWatcher,
     streaming_mode: str,
+    timer: Optional[RequestTimer] = None,
+    max_attempts: Optional[int] = None,
 ):
-    """Fetch full completion with transparent retries and cancellation handling."""
+    """Fetch full completion with transparent retries and cancellation handling.
 
-    max_attempts = max(1, config.max_retries + 1)
-    backoff_base = 1.0
-    last_error: Optional[HTTPException] = None
+    The request's `disconnect_watcher` is shared by every attempt: it cancels the
+    in-flight upstream call on disconnect and cuts retry backoff short. For models
+    in HEDGE_MODELS each attempt may be hedged (see `src.core.hedging`).
+    """
 
-    async def monitor_disconnect(stop_event: asyncio.Event):
-        try:
-            while not stop_event.is_set():
-                if await http_request.is_disconnected():
-                    logger.info(f"Request {request_id}: client disconnected, cancelling upstream call")
-                    openai_client.cancel_request(request_id)
-                    break
-                await asyncio.sleep(0.2)
-        except asyncio.CancelledError:
-            pass
+    max_attempts = max_attempts or max(1, config.max_retries + 1)
+    last_error: Optional[HTTPException] = None
 
     for attempt in range(1, max_attempts + 1):
-        if await http_request.is_disconnected():
+        if disconnect_watcher.disconnected:
             logger.info(f"Request {request_id}: client disconnected before attempt {attempt}")
             raise HTTPException(status_code=499, detail="Client disconnected")
 
         if attempt > 1:
-            backoff_seconds = min(backoff_base * (2 ** (attempt - 2)), 8.0)
             logger.info(
-                f"Request {request_id}: retrying model={openai_model} (mode={streaming_mode}), attempt {attempt}/{max_attempts}, waiting {backoff_seconds:.1f}s"
+                f"Request {request_id}: retrying model={openai_model} (mode={streaming_mode}), attempt {attempt}/{max_attempts}"
             )
-            await asyncio.sleep(backoff_seconds)
-
-        stop_event = asyncio.Event()
-        monitor_task = asyncio.create_task(monitor_disconnect(stop_event))
+            await _retry_backoff(attempt, request_id, disconnect_watcher)
 
         try:
             logger.info(
                 f"Request {request_id}: invoking OpenAI completion (attempt {attempt}/{max_attempts}, mode={streaming_mode}, model={openai_model})"
             )
-            response = await openai_client.create_chat_completion(
-                openai_request, request_id
+            response = await run_hedged(
+                lambda attempt_id: openai_client.create_chat_completion(
+                    dict(openai_request), attempt_id, timer if attempt_id == request_id else None
+                ),
+                request_id,
+                openai_model,
+                hedge_policy,
+                openai_client.cancel_request,
+                # A disconnect must cancel the hedge as well as the primary call
+                on_hedge=lambda hedge_id: disconnect_watcher.add_callback(
+                    lambda: openai_client.cancel_request(hedge_id)
+                ),
             )
             logger.info(
                 f"Request {request_id}: OpenAI completion success on attempt {attempt}/{max_attempts}"
@@ -211,18 +383,211 @@ async def _gather_openai_response_with_retries(
                     f"Request {request_id}: OpenAI completion giving up (status={exc.status_code}, attempt {attempt}/{max_attempts}, detail={detail}{suffix})"
                 )
                 raise
-        finally:
-            stop_event.set()
-            monitor_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await monitor_task
 
     if last_error:
         raise last_error
     raise HTTPException(status_code=500, detail="Failed to obtain completion")
 
 
+async def _stream_openai_response_with_fallbacks(
+    openai_request: dict,
+    models: List[str],
+    request_id: str,
+    disconnect_watcher: DisconnectWatcher,
+    timer: Optional[RequestTimer] = None,
+    base_request: Optional[dict] = None,
+):
+    """Stream from the first model of `models` that starts answering in time.
+
+    Same chain as `_gather_openai_response_with_fallbacks`, decided before the first
+    content chunk: chunks without output are held back until one with content, tool
+    calls or a finish reason arrives, so nothing reaches the client from a model
+    that is then abandoned. A fallback model whose streaming mode is "buffered" is
+    fetched whole and replayed as chunks.
+    """
+    loop = asyncio.get_running_loop()
+    base_request = base_request or openai_request
+    for index, model in enumerate(models):
+        last = index == len(models) - 1
+        max_attempts = None if last else 1
+        request = openai_request
+        if index > 0:
+            request = await _request_for_model(base_request, model, timer)
+        if index > 0 and config.get_streaming_mode_for_model(model) == "buffered":
+            stream = _replay_completion(request, model, request_id, disconnect_watcher, timer, max_attempts)
+        else:
+            stream = _stream_openai_response_with_retries(
+                request, model, request_id, disconnect_watcher, timer, max_attempts=max_attempts
+            )
+        if last:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        budget = config.model_ttft_budgets.get(model)
+        deadline = loop.time() + budget if budget else None
+        head = []
+        try:
+            while not head or not _has_output(head[-1]):
+                timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+                head.append(await asyncio.wait_for(stream.__anext__(), timeout))
+        except StopAsyncIteration:
+            pass
+        except asyncio.TimeoutError:
+            openai_client.cancel_request(request_id)
+            await stream.aclose()
+            _fall_back(request_id, model, models[index + 1], "ttft_budget")
+            continue
+        except HTTPException as exc:
+            if not _should_fall_back(exc):
+                raise
+            _fall_back(request_id, model, models[index + 1], _fallback_reason(exc))
+            continue
+
+        for chunk in head:
+            yield chunk
+        async for chunk in stream:
+            yield chunk
+        return
+
+
+async def _request_for_model(base_request: dict, model: str, timer: Optional[RequestTimer] = None) -> dict:
+    """`base_request` addressed to fallback `model`, with that model's image policy applied."""
+    request = {**base_request, "model": model}
+    # The stream flag is set per call by the client
+    request.pop("stream", None)
+    if image_policy.enabled:
+        with timer.stage("image_policy") if timer is not None else contextlib.nullcontext():
+            request = await image_policy.apply(request)
+    return request
+
+
+async def _replay_completion(
+    openai_request: dict,
+    openai_model: str,
+    request_id: str,
+    disconnect_watcher: DisconnectWatcher,
+    timer: Optional[RequestTimer] = None,
+    max_attempts: Optional[int] = None,
+):
+    """Fetch a buffered completion and yield it as the stream chunks an upstream would have sent."""
+    response = await _gather_openai_response_with_retries(
+        openai_request, openai_model, request_id, disconnect_watcher, "buffered", timer, max_attempts
+    )
+    for choice in response.get("choices") or []:
+        message = choice.get("message") or {}
+        delta = {"role": "assistant", "content": message.get("content")}
+        if message.get("tool_calls"):
+            delta["tool_calls"] = [{**call, "index": index} for index, call in enumerate(message["tool_calls"])]
+        yield {"choices": [{"index": choice.get("index", 0), "delta": delta, "finish_reason": None}]}
+        yield {"choices": [{"index": choice.get("index", 0), "delta": {}, "finish_reason": choice.get("finish_reason") or "stop"}]}
+    if response.get("usage"):
+        yield {"choices": [], "usage": response["usage"]}
+
+
+def _has_output(chunk: dict) -> bool:
+    return any(
+        (choice.get("delta") or {}).get("content")
+        or (choice.get("delta") or {}).get("tool_calls")
+        or choice.get("finish_reason")
+        for choice in chunk.get("choices") or []
+    )
+
+
+async def _stream_openai_response_with_retries(
+    openai_request: dict,
+    openai_model: str,
+    request_id: str,
+    disconnect_watcher: DisconnectWatcher,
+    timer: Optional[RequestTimer] = None,
+    max_attempts: Optional[int] = None,
+):
+    """Stream completion chunks, retrying upstream failures transparently.
+
+    Failures before any content was streamed are retried with the same `_should_retry`
+    policy and backoff as buffered mode. With STREAM_RESUME enabled, a text-only
+    stream that breaks mid-way is re-issued with the text received so far as an
+    assistant prefix, and the continuation's chunks are passed on as if nothing
+    happened, so the converter keeps writing to the same content blocks.
+    A failure after the finish reason was seen just ends the stream.
+    """
+
+    max_attempts = max_attempts or max(1, config.max_retries + 1)
+    partial_text: List[str] = []
+    has_tool_calls = False
+    finished = False
+    request = openai_request
+
+    for attempt in range(1, max_attempts + 1):
+        if disconnect_watcher.disconnected:
+            raise HTTPException(status_code=499, detail="Client disconnected")
+        if attempt > 1:
+            await _retry_backoff(attempt, request_id, disconnect_watcher)
+
+        try:
+            async for chunk in openai_client.create_chat_completion_stream(dict(request), request_id, timer):
+                for choice in chunk.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    if delta.get("content"):
+                        partial_text.append(delta["content"])
+                    if delta.get("tool_calls"):
+                        has_tool_calls = True
+                    if choice.get("finish_reason"):
+                        finished = True
+                yield chunk
+            return
+        except HTTPException as exc:
+            detail = exc.detail if isinstance(exc.detail, str) else str(exc.detail)
+            # Role-only or empty chunks produce no client output, so they do not count as streamed
+            streamed = bool(partial_text) or has_tool_calls
+            if finished:
+                logger.warning(f"Request {request_id}: stream failed after finish reason, ending it ({detail})")
+                return
+            resumable = config.stream_resume and not has_tool_calls
+            if attempt == max_attempts or not _should_retry(exc) or (streamed and not resumable):
+                logger.error(
+                    f"Request {request_id}: OpenAI stream giving up (status={exc.status_code}, attempt {attempt}/{max_attempts}, detail={detail})"
+                )
+                raise
+            if streamed:
+                logger.warning(
+                    f"Request {request_id}: stream broke after {sum(map(len, partial_text))} chars (status={exc.status_code}), resuming"
+                )
+                request = _resume_request(openai_request, "".join(partial_text))
+            else:
+                logger.warning(
+                    f"Request {request_id}: stream failed before first chunk (status={exc.status_code}, attempt {attempt}/{max_attempts}, detail={detail})"
+                )
+
+
+def _resume_request(openai_request: dict, partial_text: str) -> dict:
+    """Copy of `openai_request` asking the model to continue `partial_text`."""
+    if not partial_text:
+        return openai_request
+    resumed = dict(openai_request)
+    resumed["messages"] = list(openai_request["messages"]) + [
+        {"role": "assistant", "content": partial_text}
+    ]
+    if config.stream_resume_extra_body:
+        resumed["extra_body"] = {**openai_request.get("extra_body", {}), **config.stream_resume_extra_body}
+    return resumed
+
+
+async def _retry_backoff(attempt: int, request_id: str, disconnect_watcher: DisconnectWatcher) -> None:
+    """Exponential backoff before `attempt`, cut short (with 499) by a client disconnect."""
+    backoff_seconds = min(1.0 * (2 ** (attempt - 2)), 8.0)
+    logger.info(f"Request {request_id}: waiting {backoff_seconds:.1f}s before attempt {attempt}")
+    with contextlib.suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(disconnect_watcher.event.wait(), timeout=backoff_seconds)
+    if disconnect_watcher.disconnected:
+        logger.info(f"Request {request_id}: client disconnected during retry backoff")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
+
 def _should_retry(exc: HTTPException) -> bool:
+    # An open circuit fails fast; retrying would only wait out the backoff for the same answer
+    if exc.headers and exc.headers.get("X-Circuit-Breaker") == "open":
+        return False
     if exc.status_code in {400, 401, 403, 404, 422, 499}:
         return False
     if exc.status_code == 429:
@@ -238,38 +603,44 @@ def _should_retry(exc: HTTPException) -> bool:
     return False
 
 
+def _should_fall_back(exc: HTTPException) -> bool:
+    # Unlike a retry, moving to another model is exactly what an open circuit calls for
+    if exc.headers and exc.headers.get("X-Circuit-Breaker") == "open":
+        return True
+    return _should_retry(exc)
+
+
+def _fallback_reason(exc: HTTPException) -> str:
+    if exc.headers and exc.headers.get("X-Circuit-Breaker") == "open":
+        return "circuit_open"
+    if exc.status_code == 429:
+        return "rate_limited"
+    if exc.status_code >= 500:
+        return "server_error"
+    return "timeout"
+
+
+def _fall_back(request_id: str, model: str, fallback: str, reason: str) -> None:
+    model_fallbacks_total.inc(model=model, fallback=fallback, reason=reason)
+    logger.warning(f"Request {request_id}: model {model} failed ({reason}), falling back to {fallback}")
+
+
 @router.post("/v1/messages/count_tokens")
 async def count_tokens(request: ClaudeTokenCountRequest, _: None = Depends(validate_api_key)):
     try:
-        # For token counting, we'll use a simple estimation
-        # In a real implementation, you might want to use tiktoken or similar
-
-        total_chars = 0
-
-        # Count system message characters
-        if request.system:
-            if isinstance(request.system, str):
-                total_chars += len(request.system)
-            elif isinstance(request.system, list):
-                for block in request.system:
-                    if hasattr(block, "text"):
-                        total_chars += len(block.text)
-
-        # Count message characters
-        for msg in request.messages:
-            if msg.content is None:
-                continue
-            elif isinstance(msg.content, str):
-                total_chars += len(msg.content)
-            elif isinstance(msg.content, list):
-                for block in msg.content:
-                    if hasattr(block, "text") and block.text is not None:
-                        total_chars += len(block.text)
-
-        # Rough estimation: 4 characters per token
-        estimated_tokens = max(1, total_chars // 4)
-
-        return {"input_tokens": estimated_tokens}
+        # Count the exact payload we would send upstream, including tools and tool results
+        claude_request = ClaudeMessagesRequest(
+            model=request.model,
+            max_tokens=config.max_tokens_limit,
+            messages=request.messages,
+            system=request.system,
+            tools=request.tools,
+            tool_choice=request.tool_choice,
+            thinking=request.thinking,
+        )
+        openai_request = convert_claude_to_openai(claude_request, model_manager)
+
+        return {"input_tokens": token_counter.count_request(openai_request)}
 
     except Exception as e:
         logger.error(f"Error counting tokens: {e}")
@@ -285,9 +656,22 @@ async def health_check():
         "openai_api_configured": bool(config.api_key),
         "api_key_valid": config.validate_api_key(),
         "client_api_key_validation": bool(config.anthropic_api_key),
+        "token_count_cache": token_counter.cache_stats(),
+        "conversion_cache": message_cache.stats(),
+        "admission": admission.stats(),
+        "upstreams": openai_client.stats(),
     }
 
 
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics in text exposition format"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @router.get("/test-connection")
 async def test_connection():
     """Test API connectivity to OpenAI"""
@@ -345,6 +729,7 @@ async def root():
             "messages": "/v1/messages",
             "count_tokens": "/v1/messages/count_tokens",
             "health": "/health",
+            "metrics": "/metrics",
             "test_connection": "/test-connection",
         },
     }
@@ -0,0 +1,247 @@
+"""
+Fast path for `/v1/messages`: parse the raw body and convert it from plain dicts.
+
+The regular path builds a pydantic tree for every message and content block and
+then walks it again in `request_converter`. Here the body is decoded once (with
+orjson when installed), only the fields the converter reads are type-checked,
+and messages are converted in a single pass over the dicts. Content blocks and
+system blocks are checked against the same literals and required fields as the
+pydantic models, so bodies they reject get a 422 here too; for every request the
+pydantic model accepts, output is identical to `convert_claude_to_openai`.
+"""
+
+import json
+from typing import Any, Dict, List
+
+from fastapi.exceptions import RequestValidationError
+
+from src.conversion.image_cache import image_cache
+from src.conversion.message_cache import message_cache
+from src.conversion.request_converter import build_openai_request, convert_system_prompt, parse_tool_result_content
+from src.core.constants import Constants
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_ROLES = (Constants.ROLE_USER, Constants.ROLE_ASSISTANT)
+
+# Required fields of each content block type, mirroring src/models/claude.py
+_BLOCK_FIELDS = {
+    Constants.CONTENT_TEXT: (("text", str, "string_type", "Input should be a valid string"),),
+    Constants.CONTENT_IMAGE: (("source", dict, "dict_type", "Input should be a valid dictionary"),),
+    Constants.CONTENT_TOOL_USE: (
+        ("id", str, "string_type", "Input should be a valid string"),
+        ("name", str, "string_type", "Input should be a valid string"),
+        ("input", dict, "dict_type", "Input should be a valid dictionary"),
+    ),
+    Constants.CONTENT_TOOL_RESULT: (
+        ("tool_use_id", str, "string_type", "Input should be a valid string"),
+        ("content", (str, list, dict), "union_type", "Input should be a string, a list of objects or an object"),
+    ),
+}
+_SYSTEM_BLOCK_FIELDS = {Constants.CONTENT_TEXT: _BLOCK_FIELDS[Constants.CONTENT_TEXT]}
+
+
+def _invalid(loc: tuple, msg: str, error_type: str = "value_error") -> RequestValidationError:
+    return RequestValidationError([{"type": error_type, "loc": ("body",) + loc, "msg": msg, "input": None}])
+
+
+def _number(body: Dict[str, Any], field: str, default=None):
+    value = body.get(field, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise _invalid((field,), "Input should be a valid number", "float_type")
+    return float(value)
+
+
+def _check_block(block: Any, loc: tuple, fields_by_type: Dict[str, tuple]) -> None:
+    if not isinstance(block, dict):
+        raise _invalid(loc, "Input should be a valid dictionary", "dict_type")
+    fields = fields_by_type.get(block.get("type"))
+    if fields is None:
+        expected = " or ".join(f"'{block_type}'" for block_type in fields_by_type)
+        raise _invalid(loc + ("type",), f"Input should be {expected}", "literal_error")
+    for field, field_type, error_type, msg in fields:
+        if field not in block:
+            raise _invalid(loc + (field,), "Field required", "missing")
+        if not isinstance(block[field], field_type):
+            raise _invalid(loc + (field,), msg, error_type)
+    content = block.get("content")
+    if (
+        block["type"] == Constants.CONTENT_TOOL_RESULT
+        and isinstance(content, list)
+        and not all(isinstance(item, dict) for item in content)
+    ):
+        raise _invalid(loc + ("content",), "Input should be a list of objects", "list_type")
+
+
+def parse_messages_request(body: bytes) -> Dict[str, Any]:
+    """Decode a Messages API body and check the fields the dict converter relies on.
+
+    Raises `RequestValidationError` (a 422 response, like FastAPI's own
+    validation) on malformed input.
+    """
+    try:
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as e:
+        raise _invalid((), f"Invalid JSON: {e}", "json_invalid")
+    if not isinstance(data, dict):
+        raise _invalid((), "Input should be a valid dictionary", "dict_type")
+
+    if not isinstance(data.get("model"), str):
+        raise _invalid(("model",), "Field required (string)", "missing")
+    max_tokens = data.get("max_tokens")
+    if isinstance(max_tokens, float) and max_tokens.is_integer():
+        max_tokens = data["max_tokens"] = int(max_tokens)
+    if isinstance(max_tokens, bool) or not isinstance(max_tokens, int):
+        raise _invalid(("max_tokens",), "Field required (integer)", "missing")
+    data["temperature"] = _number(data, "temperature", 1.0)
+    data["top_p"] = _number(data, "top_p")
+
+    messages = data.get("messages")
+    if not isinstance(messages, list):
+        raise _invalid(("messages",), "Field required (list)", "missing")
+    for index, msg in enumerate(messages):
+        if not isinstance(msg, dict) or msg.get("role") not in _ROLES:
+            raise _invalid(("messages", index, "role"), "Input should be 'user' or 'assistant'", "literal_error")
+        content = msg.get("content")
+        if isinstance(content, list):
+            for block_index, block in enumerate(content):
+                _check_block(block, ("messages", index, "content", block_index), _BLOCK_FIELDS)
+        elif not isinstance(content, str):
+            raise _invalid(("messages", index, "content"), "Input should be a string or a list of blocks")
+
+    system = data.get("system")
+    if isinstance(system, list):
+        for block_index, block in enumerate(system):
+            _check_block(block, ("system", block_index), _SYSTEM_BLOCK_FIELDS)
+    elif system is not None and not isinstance(system, str):
+        raise _invalid(("system",), "Input should be a string or a list of text blocks")
+    tools = data.get("tools")
+    if tools is not None:
+        if not isinstance(tools, list):
+            raise _invalid(("tools",), "Input should be a valid list", "list_type")
+        for index, tool in enumerate(tools):
+            if not isinstance(tool, dict) or not isinstance(tool.get("name"), str) or not isinstance(
+                tool.get("input_schema"), dict
+            ):
+                raise _invalid(("tools", index), "Tool needs a name and an input_schema object")
+    tool_choice = data.get("tool_choice")
+    if tool_choice is not None and not isinstance(tool_choice, dict):
+        raise _invalid(("tool_choice",), "Input should be a valid dictionary", "dict_type")
+    return data
+
+
+def convert_claude_dict_to_openai(data: Dict[str, Any], model_manager) -> Dict[str, Any]:
+    """`convert_claude_to_openai` for a body checked by `parse_messages_request`."""
+    openai_messages: List[Dict[str, Any]] = []
+    system_message = convert_system_prompt(data.get("system"))
+    if system_message:
+        openai_messages.append(system_message)
+
+    messages = data["messages"]
+    i = 0
+    while i < len(messages):
+        msg = messages[i]
+        if msg["role"] == Constants.ROLE_USER:
+            openai_messages.extend(message_cache.convert("user", msg, _convert_user))
+        else:
+            openai_messages.extend(message_cache.convert("assistant", msg, _convert_assistant))
+            # Tool results in the next user message become OpenAI tool messages
+            if i + 1 < len(messages):
+                next_msg = messages[i + 1]
+                next_content = next_msg["content"]
+                if (
+                    next_msg["role"] == Constants.ROLE_USER
+                    and isinstance(next_content, list)
+                    and any(block["type"] == Constants.CONTENT_TOOL_RESULT for block in next_content)
+                ):
+                    i += 1
+                    openai_messages.extend(message_cache.convert("tool_results", next_msg, _convert_tool_results))
+        i += 1
+
+    return build_openai_request(
+        model_manager.map_claude_model_to_openai(data["model"]),
+        openai_messages,
+        max_tokens=data["max_tokens"],
+        temperature=data["temperature"],
+        stream=data.get("stream", False),
+        stop_sequences=data.get("stop_sequences"),
+        top_p=data["top_p"],
+        tools=[(tool["name"], tool.get("description"), tool["input_schema"]) for tool in data.get("tools") or ()],
+        tool_choice=data.get("tool_choice"),
+    )
+
+
+def _convert_user(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    content = msg["content"]
+    if isinstance(content, str):
+        return [{"role": Constants.ROLE_USER, "content": content}]
+
+    openai_content = []
+    for block in content:
+        block_type = block["type"]
+        if block_type == Constants.CONTENT_TEXT:
+            openai_content.append({"type": "text", "text": block.get("text", "")})
+        elif block_type == Constants.CONTENT_IMAGE:
+            source = block.get("source")
+            if (
+                isinstance(source, dict)
+                and source.get("type") == "base64"
+                and "media_type" in source
+                and "data" in source
+            ):
+                openai_content.append(
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": image_cache.data_url(source["media_type"], source["data"])},
+                    }
+                )
+
+    if len(openai_content) == 1 and openai_content[0]["type"] == "text":
+        return [{"role": Constants.ROLE_USER, "content": openai_content[0]["text"]}]
+    return [{"role": Constants.ROLE_USER, "content": openai_content}]
+
+
+def _convert_assistant(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    content = msg["content"]
+    if isinstance(content, str):
+        return [{"role": Constants.ROLE_ASSISTANT, "content": content}]
+
+    text_parts = []
+    tool_calls = []
+    for block in content:
+        block_type = block["type"]
+        if block_type == Constants.CONTENT_TEXT:
+            text_parts.append(block.get("text", ""))
+        elif block_type == Constants.CONTENT_TOOL_USE:
+            tool_calls.append(
+                {
+                    "id": block.get("id"),
+                    "type": Constants.TOOL_FUNCTION,
+                    Constants.TOOL_FUNCTION: {
+                        "name": block.get("name"),
+                        "arguments": json.dumps(block.get("input", {}), ensure_ascii=False),
+                    },
+                }
+            )
+
+    openai_message = {"role": Constants.ROLE_ASSISTANT, "content": "".join(text_parts) if text_parts else None}
+    if tool_calls:
+        openai_message["tool_calls"] = tool_calls
+    return [openai_message]
+
+
+def _convert_tool_results(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": Constants.ROLE_TOOL,
+            "tool_call_id": block.get("tool_use_id"),
+            "content": parse_tool_result_content(block.get("content")),
+        }
+        for block in msg["content"]
+        if block["type"] == Constants.CONTENT_TOOL_RESULT
+    ]
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from src.core.config import config
+from src.core.metrics import metrics_registry
+
+
+class ImageUrlCache:
+    """Interns base64 image data URLs by content, bounded by total size.
+
+    Claude Code resends every screenshot of a session on each turn, and building
+    `data:<media type>;base64,<data>` copies the whole payload every time. Here the
+    URL is built once per distinct image and the same string object is handed out
+    for every repeat, across turns and requests, so converted requests share one
+    buffer per image. Entries are found by the payload's hash and confirmed with an
+    exact comparison against the cached URL, so only the URL itself is retained.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._buckets: Dict[int, List[str]] = {}
+        # id(url) -> (payload hash, url), least recently used first
+        self._lru: "OrderedDict[int, Tuple[int, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def data_url(self, media_type: str, data: str) -> str:
+        prefix = f"data:{media_type};base64,"
+        url_length = len(prefix) + len(data)
+        if self.max_bytes <= 0 or url_length > self.max_bytes:
+            return prefix + data
+
+        data_hash = hash(data)
+        for url in self._buckets.get(data_hash, ()):
+            if len(url) == url_length and url.startswith(prefix) and url.endswith(data):
+                self.hits += 1
+                self._lru.move_to_end(id(url))
+                return url
+
+        self.misses += 1
+        url = prefix + data
+        self._buckets.setdefault(data_hash, []).append(url)
+        self._lru[id(url)] = (data_hash, url)
+        self.total_bytes += url_length
+        while self.total_bytes > self.max_bytes:
+            self._evict()
+        return url
+
+    def _evict(self) -> None:
+        _, (data_hash, url) = self._lru.popitem(last=False)
+        bucket = self._buckets[data_hash]
+        bucket.remove(url)
+        if not bucket:
+            del self._buckets[data_hash]
+        self.total_bytes -= len(url)
+
+
+image_cache = ImageUrlCache(config.image_cache_max_bytes)
+
+metrics_registry.gauge(
+    "claude_proxy_image_cache_hits_total",
+    "Image data URLs reused from the image cache.",
+    callback=lambda: image_cache.hits,
+    type_name="counter",
+)
+metrics_registry.gauge(
+    "claude_proxy_image_cache_misses_total",
+    "Image data URLs built because the image was not cached.",
+    callback=lambda: image_cache.misses,
+    type_name="counter",
+)
+metrics_registry.gauge(
+    "claude_proxy_image_cache_bytes",
+    "Characters of image data URLs held by the image cache.",
+    callback=lambda: image_cache.total_bytes,
+)
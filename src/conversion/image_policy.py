@@ -0,0 +1,220 @@
+"""
+Per-model image policy: downscale / recompress base64 images before they go upstream.
+
+IMAGE_POLICIES maps mapped (OpenAI-side) model names, or `*` for any model, to
+`{"max_dimension": 1024, "format": "jpeg", "quality": 80}`. Images of requests
+for such a model are decoded and resized in a process pool so the event loop is
+never blocked, and results are cached by a sha256 digest of the image and the
+policy, so a screenshot resent on every turn is only processed once. The worker
+processes are started with forkserver (spawn where unavailable): the server has
+threads, which a forked child would inherit in an undefined state.
+
+Requires Pillow (`pip install Pillow`); without it images are forwarded as-is.
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.core.config import config
+from src.core.logging import logger
+from src.core.metrics import metrics_registry
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+_FORMATS = {"jpeg": "JPEG", "jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+images_processed_total = metrics_registry.counter(
+    "claude_proxy_image_policy_images_total",
+    "Images seen by the image policy stage, by result.",
+    ("result",),
+)
+
+
+class ImagePolicy(NamedTuple):
+    max_dimension: Optional[int] = None
+    format: Optional[str] = None
+    quality: int = 85
+
+    @classmethod
+    def from_dict(cls, name: str, raw: Dict[str, Any]) -> "ImagePolicy":
+        image_format = raw.get("format")
+        if image_format is not None and image_format.lower() not in _FORMATS:
+            raise ValueError(f"image policy '{name}': unsupported format '{image_format}'")
+        max_dimension = raw.get("max_dimension")
+        return cls(
+            max_dimension=int(max_dimension) if max_dimension else None,
+            format=_FORMATS[image_format.lower()] if image_format else None,
+            quality=int(raw.get("quality", 85)),
+        )
+
+
+def process_image(
+    data: str, max_dimension: Optional[int], image_format: Optional[str], quality: int
+) -> Optional[Tuple[str, str]]:
+    """Apply a policy to base64 image `data`; returns (media type, base64 data), or None to keep the original.
+
+    Runs in a worker process, so it only takes and returns picklable values.
+    """
+    raw = base64.b64decode(data)
+    with Image.open(io.BytesIO(raw)) as image:
+        image.load()
+        source_format = (image.format or "PNG").upper()
+        target_format = image_format or source_format
+        width, height = image.size
+        scale = min(1.0, max_dimension / max(width, height)) if max_dimension else 1.0
+        if scale == 1.0 and target_format == source_format:
+            return None
+
+        if scale < 1.0:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+        if target_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        options = {"quality": quality} if target_format in ("JPEG", "WEBP") else {"optimize": True}
+        output = io.BytesIO()
+        image.save(output, format=target_format, **options)
+
+    encoded = output.getvalue()
+    # Recompressing at full size is only worth it when it saves bytes
+    if scale == 1.0 and len(encoded) >= len(raw):
+        return None
+    return f"image/{target_format.lower()}", base64.b64encode(encoded).decode("ascii")
+
+
+class ImagePolicyStage:
+    def __init__(
+        self,
+        policies: Dict[str, Dict[str, Any]],
+        workers: int = 2,
+        cache_size: int = 256,
+        cache_max_bytes: int = 64 * 1024 * 1024,
+        processor: Callable[..., Optional[Tuple[str, str]]] = process_image,
+        executor: Optional[Executor] = None,
+    ):
+        self.policies: Dict[str, ImagePolicy] = {}
+        for name, raw in policies.items():
+            try:
+                self.policies[name.lower()] = ImagePolicy.from_dict(name, raw)
+            except (TypeError, ValueError, AttributeError) as e:
+                logger.warning(f"Ignoring invalid image policy: {e}")
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_bytes = 0
+        self.processor = processor
+        self._executor = executor
+        # (policy, sha256 of the base64 data) -> processed data URL, or None if the original is kept
+        self._cache: "OrderedDict[Tuple[ImagePolicy, bytes], Optional[str]]" = OrderedDict()
+        if self.policies and Image is None and processor is process_image:
+            logger.warning("IMAGE_POLICIES is set but Pillow is not installed, images are forwarded unchanged")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.policies) and (Image is not None or self.processor is not process_image)
+
+    def policy_for(self, model: str) -> Optional[ImagePolicy]:
+        return self.policies.get(model.lower()) or self.policies.get("*")
+
+    async def apply(self, openai_request: Dict[str, Any]) -> Dict[str, Any]:
+        """Return `openai_request` with its images processed by the model's policy.
+
+        Messages and content lists that change are copied, never modified in place:
+        converted messages are shared with the conversion cache.
+        """
+        policy = self.policy_for(openai_request.get("model", "")) if self.enabled else None
+        if policy is None:
+            return openai_request
+
+        messages: List[Dict[str, Any]] = openai_request["messages"]
+        new_messages = None
+        for index, message in enumerate(messages):
+            content = message.get("content")
+            if not isinstance(content, list):
+                continue
+            new_content = None
+            for part_index, part in enumerate(content):
+                url = part.get("image_url", {}).get("url", "") if part.get("type") == "image_url" else ""
+                if not url.startswith("data:"):
+                    continue
+                processed = await self._process(policy, url)
+                if processed is not url:
+                    if new_content is None:
+                        new_content = list(content)
+                    new_content[part_index] = {**part, "image_url": {**part["image_url"], "url": processed}}
+            if new_content is not None:
+                if new_messages is None:
+                    new_messages = list(messages)
+                new_messages[index] = {**message, "content": new_content}
+
+        if new_messages is None:
+            return openai_request
+        return {**openai_request, "messages": new_messages}
+
+    async def _process(self, policy: ImagePolicy, url: str) -> str:
+        header, _, data = url.partition(",")
+        key = (policy, hashlib.sha256(data.encode()).digest())
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            images_processed_total.inc(result="cached")
+            return self._cache[key] or url
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), self.processor, data, policy.max_dimension, policy.format, policy.quality
+            )
+        except Exception as e:
+            logger.warning(f"Image policy processing failed, forwarding original image: {e}")
+            images_processed_total.inc(result="failed")
+            return url
+
+        if result is None:
+            processed = None
+            images_processed_total.inc(result="unchanged")
+        else:
+            media_type, encoded = result
+            processed = f"data:{media_type};base64,{encoded}"
+            images_processed_total.inc(result="processed")
+            logger.debug(f"Image policy: {header} {len(url)} -> {media_type} {len(processed)} chars")
+
+        self._store(key, processed)
+        return processed or url
+
+    def _store(self, key: Tuple[ImagePolicy, bytes], processed: Optional[str]) -> None:
+        size = len(processed) if processed is not None else 0
+        if self.cache_size <= 0 or (self.cache_max_bytes > 0 and size > self.cache_max_bytes):
+            return
+        self._cache[key] = processed
+        self.cache_bytes += size
+        while len(self._cache) > self.cache_size or 0 < self.cache_max_bytes < self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self.cache_bytes -= len(evicted) if evicted is not None else 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(start_method)
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_policy = ImagePolicyStage(
+    config.image_policies,
+    workers=config.image_policy_workers,
+    cache_size=config.image_policy_cache_size,
+    cache_max_bytes=config.image_policy_cache_max_bytes,
+)
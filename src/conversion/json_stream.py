@@ -0,0 +1,61 @@
+import re
+
+# Characters that can change nesting state outside / inside a JSON string
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JsonCompletenessTracker:
+    """Track when a JSON value streamed in fragments becomes complete.
+
+    Each fragment is scanned once, so the cost over a whole tool call is linear in
+    the argument size instead of re-parsing the accumulated buffer on every delta.
+    `feed` returns the part of the fragment that belongs to the value; anything
+    after the value closes (e.g. a provider re-sending the full arguments) is dropped.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape_pending = False
+        self.complete = False
+
+    def feed(self, fragment: str) -> str:
+        if self.complete or not fragment:
+            return ""
+
+        pos = 0
+        length = len(fragment)
+
+        while pos < length:
+            if self.in_string:
+                if self.escape_pending:
+                    self.escape_pending = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(fragment, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    self.escape_pending = True
+                else:
+                    self.in_string = False
+                continue
+
+            match = _STRUCTURAL.search(fragment, pos)
+            if match is None:
+                break
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth <= 0:
+                    self.complete = True
+                    return fragment[:pos]
+
+        return fragment
@@ -0,0 +1,171 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from src.core.config import config
+from src.core.constants import Constants
+from src.core.metrics import metrics_registry
+from src.models.claude import ClaudeMessage
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable copy of a JSON value that only equals the copy of an identical value.
+
+    Containers and non-string scalars are tagged with their type: `True == 1 == 1.0`
+    and a dict equals nothing but a dict, yet each of them serializes differently.
+    """
+    if isinstance(value, dict):
+        return (dict, tuple([(key, item if isinstance(item, str) else _freeze(item)) for key, item in value.items()]))
+    if isinstance(value, list):
+        return (list, tuple([item if isinstance(item, str) else _freeze(item) for item in value]))
+    if isinstance(value, str) or value is None:
+        return value
+    return (type(value), value)
+
+
+def _image_key(source: Any) -> Any:
+    """Key of an image source with its base64 payload replaced by a sha256 digest.
+
+    Keys are retained by the cache, and a key holding the payload would keep every
+    screenshot of a session alive outside the size limit of the image URL cache.
+    """
+    if isinstance(source, dict) and isinstance(source.get("data"), str):
+        return _freeze({**source, "data": hashlib.sha256(source["data"].encode()).digest()})
+    return _freeze(source)
+
+
+def _dict_message_key(msg: Dict[str, Any]) -> tuple:
+    content = msg.get("content")
+    if not isinstance(content, list):
+        return _freeze(msg)
+    blocks = [
+        (Constants.CONTENT_IMAGE, _image_key(block.get("source")))
+        if isinstance(block, dict) and block.get("type") == Constants.CONTENT_IMAGE
+        else _freeze(block)
+        for block in content
+    ]
+    return (_freeze({key: value for key, value in msg.items() if key != "content"}), tuple(blocks))
+
+
+def _entry_size(value: Any) -> int:
+    """Characters held by a converted message, dominated by image data URLs."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum([_entry_size(item) for item in value.values()])
+    if isinstance(value, list):
+        return sum([_entry_size(item) for item in value])
+    return 0
+
+
+def message_key(msg: Union[ClaudeMessage, Dict[str, Any]]) -> tuple:
+    """Hashable, exact-match key of a Claude message's content.
+
+    A tuple of the message's own strings: hashing it runs at C speed over data the
+    request already holds, where serializing the message would cost about as much
+    as converting it. Lookups compare keys for equality and `_freeze` keeps the
+    JSON types apart, so a hash collision cannot return another message's
+    conversion. Raw message dicts (fast request parsing) are keyed by their
+    frozen contents. Image payloads are keyed by digest, see `_image_key`.
+    """
+    if isinstance(msg, dict):
+        return _dict_message_key(msg)
+    content = msg.content
+    if not isinstance(content, list):
+        return (msg.role, content)
+    parts: List[Any] = [msg.role]
+    for block in content:
+        if block.type == Constants.CONTENT_TEXT:
+            parts.append((block.type, block.text))
+        elif block.type == Constants.CONTENT_TOOL_USE:
+            parts.append((block.type, block.id, block.name, _freeze(block.input)))
+        elif block.type == Constants.CONTENT_TOOL_RESULT:
+            parts.append((block.type, block.tool_use_id, _freeze(block.content)))
+        else:
+            parts.append((block.type, _image_key(block.source)))
+    return tuple(parts)
+
+
+class MessageConversionCache:
+    """Content-addressed LRU of converted OpenAI messages.
+
+    Conversations resend the whole history every turn, so converted messages are
+    memoized by `message_key` and only messages not seen before are converted.
+    Cached message dicts are shared between requests and must not be mutated.
+    Bounded by entry count and by the characters the converted messages hold,
+    since a message with screenshots carries their full data URLs.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # key -> (converted messages, size)
+        self._entries: "OrderedDict[tuple, Tuple[List[Dict[str, Any]], int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def convert(self, kind: str, msg: Any, convert_fn: Callable[[Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Return `convert_fn(msg)`, reusing the result for an identical message of the same `kind`."""
+        if self.max_entries <= 0:
+            return convert_fn(msg)
+
+        key = (kind, message_key(msg))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        self.misses += 1
+        converted = convert_fn(msg)
+        size = _entry_size(converted)
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return converted
+        self._entries[key] = (converted, size)
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self.total_bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+        return converted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+message_cache = MessageConversionCache(config.conversion_cache_size, config.conversion_cache_max_bytes)
+
+metrics_registry.gauge(
+    "claude_proxy_conversion_cache_hits_total",
+    "Converted messages served from the conversion cache.",
+    callback=lambda: message_cache.hits,
+    type_name="counter",
+)
+metrics_registry.gauge(
+    "claude_proxy_conversion_cache_misses_total",
+    "Messages converted because they were not in the conversion cache.",
+    callback=lambda: message_cache.misses,
+    type_name="counter",
+)
+metrics_registry.gauge(
+    "claude_proxy_conversion_cache_entries",
+    "Entries in the conversion cache.",
+    callback=lambda: len(message_cache),
+)
+metrics_registry.gauge(
+    "claude_proxy_conversion_cache_bytes",
+    "Characters of converted messages held by the conversion cache.",
+    callback=lambda: message_cache.total_bytes,
+)
@@ -1,10 +1,12 @@
 import json
-from typing import Dict, Any, List
-from venv import logger
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from src.core.constants import Constants
 from src.models.claude import ClaudeMessagesRequest, ClaudeMessage
 from src.core.config import config
 from src.core.context import get_current_api_key
+from src.conversion.image_cache import image_cache
+from src.conversion.message_cache import message_cache
+from src.conversion.tracing import trace_payload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,38 +24,19 @@ def convert_claude_to_openai(
     openai_messages = []
 
     # Add system message if present
-    if claude_request.system:
-        system_text = ""
-        if isinstance(claude_request.system, str):
-            system_text = claude_request.system
-        elif isinstance(claude_request.system, list):
-            text_parts = []
-            for block in claude_request.system:
-                if hasattr(block, "type") and block.type == Constants.CONTENT_TEXT:
-                    text_parts.append(block.text)
-                elif (
-                    isinstance(block, dict)
-                    and block.get("type") == Constants.CONTENT_TEXT
-                ):
-                    text_parts.append(block.get("text", ""))
-            system_text = "\n\n".join(text_parts)
-
-        if system_text.strip():
-            openai_messages.append(
-                {"role": Constants.ROLE_SYSTEM, "content": system_text.strip()}
-            )
+    system_message = convert_system_prompt(claude_request.system)
+    if system_message:
+        openai_messages.append(system_message)
 
-    # Process Claude messages
+    # Process Claude messages (unchanged history comes from the conversion cache)
     i = 0
     while i < len(claude_request.messages):
         msg = claude_request.messages[i]
 
         if msg.role == Constants.ROLE_USER:
-            openai_message = convert_claude_user_message(msg)
-            openai_messages.append(openai_message)
+            openai_messages.extend(message_cache.convert("user", msg, _convert_user))
         elif msg.role == Constants.ROLE_ASSISTANT:
-            openai_message = convert_claude_assistant_message(msg)
-            openai_messages.append(openai_message)
+            openai_messages.extend(message_cache.convert("assistant", msg, _convert_assistant))
 
             # Check if next message contains tool results
             if i + 1 < len(claude_request.messages):
@@ -69,21 +52,74 @@ def convert_claude_to_openai(
                 ):
                     # Process tool results
                     i += 1  # Skip to tool result message
-                    tool_results = convert_claude_tool_results(next_msg)
-                    openai_messages.extend(tool_results)
+                    openai_messages.extend(
+                        message_cache.convert("tool_results", next_msg, convert_claude_tool_results)
+                    )
 
         i += 1
 
+    return build_openai_request(
+        openai_model,
+        openai_messages,
+        max_tokens=claude_request.max_tokens,
+        temperature=claude_request.temperature,
+        stream=claude_request.stream,
+        stop_sequences=claude_request.stop_sequences,
+        top_p=claude_request.top_p,
+        tools=[(tool.name, tool.description, tool.input_schema) for tool in claude_request.tools or ()],
+        tool_choice=claude_request.tool_choice,
+    )
+
+
+def convert_system_prompt(system) -> Optional[Dict[str, Any]]:
+    """Convert a Claude `system` prompt (string or text blocks) to an OpenAI system message."""
+    if not system:
+        return None
+    system_text = ""
+    if isinstance(system, str):
+        system_text = system
+    elif isinstance(system, list):
+        text_parts = []
+        for block in system:
+            if hasattr(block, "type") and block.type == Constants.CONTENT_TEXT:
+                text_parts.append(block.text)
+            elif (
+                isinstance(block, dict)
+                and block.get("type") == Constants.CONTENT_TEXT
+            ):
+                text_parts.append(block.get("text", ""))
+        system_text = "\n\n".join(text_parts)
+
+    if system_text.strip():
+        return {"role": Constants.ROLE_SYSTEM, "content": system_text.strip()}
+    return None
+
+
+def build_openai_request(
+    openai_model: str,
+    openai_messages: List[Dict[str, Any]],
+    max_tokens: int,
+    temperature: Optional[float],
+    stream: Optional[bool],
+    stop_sequences: Optional[List[str]] = None,
+    top_p: Optional[float] = None,
+    tools: Iterable[Tuple[str, Optional[str], Dict[str, Any]]] = (),
+    tool_choice: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Assemble the OpenAI request around already converted messages.
+
+    `tools` are `(name, description, input_schema)` triples.
+    """
     # Build OpenAI request
     openai_request = {
         "model": openai_model,
         "messages": openai_messages,
         "max_tokens": min(
-            max(claude_request.max_tokens, config.min_tokens_limit),
+            max(max_tokens, config.min_tokens_limit),
             config.max_tokens_limit,
         ),
-        "temperature": claude_request.temperature,
-        "stream": claude_request.stream,
+        "temperature": temperature,
+        "stream": stream,
     }
     # Check ignore temperature setting for current API key
     current_api_key = get_current_api_key()
@@ -96,51 +132,56 @@ def convert_claude_to_openai(
             masked_key = f"{current_api_key[:8]}...{current_api_key[-4:]}" if len(current_api_key) > 12 else "****"
         logger.info(f"Temperature ignored for API {masked_key}: {original_temp} -> None")
 
-    logger.debug(
-        f"Converted Claude request to OpenAI format: {json.dumps(openai_request, indent=2, ensure_ascii=False)}"
-    )
     # Add optional parameters
-    if claude_request.stop_sequences:
-        openai_request["stop"] = claude_request.stop_sequences
-    if claude_request.top_p is not None:
-        openai_request["top_p"] = claude_request.top_p
+    if stop_sequences:
+        openai_request["stop"] = stop_sequences
+    if top_p is not None:
+        openai_request["top_p"] = top_p
 
     # Convert tools
-    if claude_request.tools:
-        openai_tools = []
-        for tool in claude_request.tools:
-            if tool.name and tool.name.strip():
-                openai_tools.append(
-                    {
-                        "type": Constants.TOOL_FUNCTION,
-                        Constants.TOOL_FUNCTION: {
-                            "name": tool.name,
-                            "description": tool.description or "",
-                            "parameters": tool.input_schema,
-                        },
-                    }
-                )
-        if openai_tools:
-            openai_request["tools"] = openai_tools
+    openai_tools = []
+    for name, description, input_schema in tools:
+        if name and name.strip():
+            openai_tools.append(
+                {
+                    "type": Constants.TOOL_FUNCTION,
+                    Constants.TOOL_FUNCTION: {
+                        "name": name,
+                        "description": description or "",
+                        "parameters": input_schema,
+                    },
+                }
+            )
+    if openai_tools:
+        openai_request["tools"] = openai_tools
 
     # Convert tool choice
-    if claude_request.tool_choice:
-        choice_type = claude_request.tool_choice.get("type")
+    if tool_choice:
+        choice_type = tool_choice.get("type")
         if choice_type == "auto":
             openai_request["tool_choice"] = "auto"
         elif choice_type == "any":
             openai_request["tool_choice"] = "auto"
-        elif choice_type == "tool" and "name" in claude_request.tool_choice:
+        elif choice_type == "tool" and "name" in tool_choice:
             openai_request["tool_choice"] = {
                 "type": Constants.TOOL_FUNCTION,
-                Constants.TOOL_FUNCTION: {"name": claude_request.tool_choice["name"]},
+                Constants.TOOL_FUNCTION: {"name": tool_choice["name"]},
             }
         else:
             openai_request["tool_choice"] = "auto"
 
+    trace_payload(logger, "Converted Claude request to OpenAI format", openai_request)
     return openai_request
 
 
+def _convert_user(msg: ClaudeMessage) -> List[Dict[str, Any]]:
+    return [convert_claude_user_message(msg)]
+
+
+def _convert_assistant(msg: ClaudeMessage) -> List[Dict[str, Any]]:
+    return [convert_claude_assistant_message(msg)]
+
+
 def convert_claude_user_message(msg: ClaudeMessage) -> Dict[str, Any]:
     """Convert Claude user message to OpenAI format."""
     if msg.content is None:
@@ -166,7 +207,7 @@ def convert_claude_user_message(msg: ClaudeMessage) -> Dict[str, Any]:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:{block.source['media_type']};base64,{block.source['data']}"
+                            "url": image_cache.data_url(block.source["media_type"], block.source["data"])
                         },
                     }
                 )
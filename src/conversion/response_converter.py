@@ -1,15 +1,27 @@
 import json
+import logging
+import time
 import uuid
-from fastapi import HTTPException, Request
+from typing import Optional
+from fastapi import HTTPException
 from src.core.constants import Constants
+from src.core.disconnect import DisconnectWatcher
+from src.core.metrics import RequestTimer
+from src.conversion import sse_encoder
+from src.conversion.json_stream import JsonCompletenessTracker
+from src.conversion.tracing import trace_payload
 from src.models.claude import ClaudeMessagesRequest
 
+logger = logging.getLogger(__name__)
+
 
 def convert_openai_to_claude_response(
     openai_response: dict, original_request: ClaudeMessagesRequest
 ) -> dict:
     """Convert OpenAI response to Claude format."""
 
+    trace_payload(logger, "Received OpenAI response", openai_response)
+
     # Extract response data
     choices = openai_response.get("choices", [])
     if not choices:
@@ -75,22 +87,23 @@ def convert_openai_to_claude_response(
         },
     }
 
+    trace_payload(logger, "Converted OpenAI response to Claude format", claude_response)
     return claude_response
 
 
 async def convert_openai_streaming_to_claude(
     openai_stream, original_request: ClaudeMessagesRequest, logger
 ):
-    """Convert OpenAI streaming response to Claude streaming format."""
+    """Convert OpenAI streaming chunks (parsed dicts) to Claude streaming format."""
 
     message_id = f"msg_{uuid.uuid4().hex[:24]}"
 
     # Send initial SSE events
-    yield f"event: {Constants.EVENT_MESSAGE_START}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_START, 'message': {'id': message_id, 'type': 'message', 'role': Constants.ROLE_ASSISTANT, 'model': original_request.model, 'content': [], 'stop_reason': None, 'stop_sequence': None, 'usage': {'input_tokens': 0, 'output_tokens': 0}}}, ensure_ascii=False)}\n\n"
+    yield sse_encoder.message_start(message_id, original_request.model)
 
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': 0, 'content_block': {'type': Constants.CONTENT_TEXT, 'text': ''}}, ensure_ascii=False)}\n\n"
+    yield sse_encoder.text_block_start(0)
 
-    yield f"event: {Constants.EVENT_PING}\ndata: {json.dumps({'type': Constants.EVENT_PING}, ensure_ascii=False)}\n\n"
+    yield sse_encoder.PING
 
     # Process streaming chunks
     text_block_index = 0
@@ -99,94 +112,79 @@ async def convert_openai_streaming_to_claude(
     final_stop_reason = Constants.STOP_END_TURN
 
     try:
-        async for line in openai_stream:
-            if line.strip():
-                if line.startswith("data: "):
-                    chunk_data = line[6:]
-                    if chunk_data.strip() == "[DONE]":
-                        break
-
-                    try:
-                        chunk = json.loads(chunk_data)
-                        choices = chunk.get("choices", [])
-                        if not choices:
-                            continue
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"Failed to parse chunk: {chunk_data}, error: {e}"
-                        )
-                        continue
-
-                    choice = choices[0]
-                    delta = choice.get("delta", {})
-                    finish_reason = choice.get("finish_reason")
-
-                    # Handle text delta
-                    if delta and "content" in delta and delta["content"] is not None:
-                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': text_block_index, 'delta': {'type': Constants.DELTA_TEXT, 'text': delta['content']}}, ensure_ascii=False)}\n\n"
-
-                    # Handle tool call deltas with improved incremental processing
-                    if "tool_calls" in delta:
-                        for tc_delta in delta["tool_calls"]:
-                            tc_index = tc_delta.get("index", 0)
-                            
-                            # Initialize tool call tracking by index if not exists
-                            if tc_index not in current_tool_calls:
-                                current_tool_calls[tc_index] = {
-                                    "id": None,
-                                    "name": None,
-                                    "args_buffer": "",
-                                    "json_sent": False,
-                                    "claude_index": None,
-                                    "started": False
-                                }
-                            
-                            tool_call = current_tool_calls[tc_index]
-                            
-                            # Update tool call ID if provided
-                            if tc_delta.get("id"):
-                                tool_call["id"] = tc_delta["id"]
-                            
-                            # Update function name and start content block if we have both id and name
-                            function_data = tc_delta.get(Constants.TOOL_FUNCTION, {})
-                            if function_data.get("name"):
-                                tool_call["name"] = function_data["name"]
-                            
-                            # Start content block when we have complete initial data
-                            if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
-                                tool_block_counter += 1
-                                claude_index = text_block_index + tool_block_counter
-                                tool_call["claude_index"] = claude_index
-                                tool_call["started"] = True
-                                
-                                yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': claude_index, 'content_block': {'type': Constants.CONTENT_TOOL_USE, 'id': tool_call['id'], 'name': tool_call['name'], 'input': {}}}, ensure_ascii=False)}\n\n"
-                            
-                            # Handle function arguments
-                            if "arguments" in function_data and tool_call["started"] and function_data["arguments"] is not None:
-                                tool_call["args_buffer"] += function_data["arguments"]
-                                
-                                # Try to parse complete JSON and send delta when we have valid JSON
-                                try:
-                                    json.loads(tool_call["args_buffer"])
-                                    # If parsing succeeds and we haven't sent this JSON yet
-                                    if not tool_call["json_sent"]:
-                                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': tool_call['claude_index'], 'delta': {'type': Constants.DELTA_INPUT_JSON, 'partial_json': tool_call['args_buffer']}}, ensure_ascii=False)}\n\n"
-                                        tool_call["json_sent"] = True
-                                except json.JSONDecodeError:
-                                    # JSON is incomplete, continue accumulating
-                                    pass
-
-                    # Handle finish reason
-                    if finish_reason:
-                        if finish_reason == "length":
-                            final_stop_reason = Constants.STOP_MAX_TOKENS
-                        elif finish_reason in ["tool_calls", "function_call"]:
-                            final_stop_reason = Constants.STOP_TOOL_USE
-                        elif finish_reason == "stop":
-                            final_stop_reason = Constants.STOP_END_TURN
-                        else:
-                            final_stop_reason = Constants.STOP_END_TURN
-                        break
+        async for chunk in openai_stream:
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+
+            choice = choices[0]
+            delta = choice.get("delta") or {}
+            finish_reason = choice.get("finish_reason")
+
+            # Handle text delta
+            if delta and "content" in delta and delta["content"] is not None:
+                yield sse_encoder.text_delta(text_block_index, delta["content"])
+
+            # Handle tool call deltas with improved incremental processing
+            if delta.get("tool_calls"):
+                for tc_delta in delta["tool_calls"]:
+                    tc_index = tc_delta.get("index", 0)
+
+                    # Initialize tool call tracking by index if not exists
+                    if tc_index not in current_tool_calls:
+                        current_tool_calls[tc_index] = {
+                            "id": None,
+                            "name": None,
+                            "pending_args": [],
+                            "json_tracker": JsonCompletenessTracker(),
+                            "claude_index": None,
+                            "started": False
+                        }
+
+                    tool_call = current_tool_calls[tc_index]
+
+                    # Update tool call ID if provided
+                    if tc_delta.get("id"):
+                        tool_call["id"] = tc_delta["id"]
+
+                    # Update function name and start content block if we have both id and name
+                    function_data = tc_delta.get(Constants.TOOL_FUNCTION) or {}
+                    if function_data.get("name"):
+                        tool_call["name"] = function_data["name"]
+
+                    # Start content block when we have complete initial data
+                    if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
+                        tool_block_counter += 1
+                        claude_index = text_block_index + tool_block_counter
+                        tool_call["claude_index"] = claude_index
+                        tool_call["started"] = True
+
+                        yield sse_encoder.tool_use_block_start(claude_index, tool_call["id"], tool_call["name"])
+
+                    # Handle function arguments
+                    if function_data.get("arguments"):
+                        tool_call["pending_args"].append(function_data["arguments"])
+
+                    # Forward argument fragments as soon as the block is open, until the JSON closes
+                    if tool_call["started"] and tool_call["pending_args"]:
+                        fragment = "".join(tool_call["pending_args"])
+                        tool_call["pending_args"].clear()
+                        partial_json = tool_call["json_tracker"].feed(fragment)
+                        if partial_json:
+                            yield sse_encoder.input_json_delta(tool_call["claude_index"], partial_json)
+
+            # Handle finish reason
+            if finish_reason:
+                if finish_reason == "length":
+                    final_stop_reason = Constants.STOP_MAX_TOKENS
+                elif finish_reason in ["tool_calls", "function_call"]:
+                    final_stop_reason = Constants.STOP_TOOL_USE
+                elif finish_reason == "stop":
+                    final_stop_reason = Constants.STOP_END_TURN
+                else:
+                    final_stop_reason = Constants.STOP_END_TURN
+                break
+
 
     except Exception as e:
         # Handle any streaming errors gracefully
@@ -194,192 +192,187 @@ async def convert_openai_streaming_to_claude(
         import traceback
 
         logger.error(traceback.format_exc())
-        error_event = {
-            "type": "error",
-            "error": {"type": "api_error", "message": f"Streaming error: {str(e)}"},
-        }
-        yield f"event: error\ndata: {json.dumps(error_event, ensure_ascii=False)}\n\n"
+        yield sse_encoder.error("api_error", f"Streaming error: {str(e)}")
         return
 
     # Send final SSE events
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': text_block_index}, ensure_ascii=False)}\n\n"
+    yield sse_encoder.content_block_stop(text_block_index)
 
     for tool_data in current_tool_calls.values():
         if tool_data.get("started") and tool_data.get("claude_index") is not None:
-            yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': tool_data['claude_index']}, ensure_ascii=False)}\n\n"
+            yield sse_encoder.content_block_stop(tool_data["claude_index"])
 
     usage_data = {"input_tokens": 0, "output_tokens": 0}
-    yield f"event: {Constants.EVENT_MESSAGE_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_DELTA, 'delta': {'stop_reason': final_stop_reason, 'stop_sequence': None}, 'usage': usage_data}, ensure_ascii=False)}\n\n"
-    yield f"event: {Constants.EVENT_MESSAGE_STOP}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_STOP}, ensure_ascii=False)}\n\n"
+    yield sse_encoder.message_delta(final_stop_reason, usage_data)
+    yield sse_encoder.MESSAGE_STOP
 
 
 async def convert_openai_streaming_to_claude_with_cancellation(
     openai_stream,
     original_request: ClaudeMessagesRequest,
     logger,
-    http_request: Request,
+    disconnect_watcher: DisconnectWatcher,
     openai_client,
     request_id: str,
+    timer: Optional[RequestTimer] = None,
 ):
-    """Convert OpenAI streaming response to Claude streaming format with cancellation support."""
-
-    message_id = f"msg_{uuid.uuid4().hex[:24]}"
-
-    # Send initial SSE events
-    yield f"event: {Constants.EVENT_MESSAGE_START}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_START, 'message': {'id': message_id, 'type': 'message', 'role': Constants.ROLE_ASSISTANT, 'model': original_request.model, 'content': [], 'stop_reason': None, 'stop_sequence': None, 'usage': {'input_tokens': 0, 'output_tokens': 0}}}, ensure_ascii=False)}\n\n"
+    """Convert OpenAI streaming chunks (parsed dicts) to Claude streaming format with cancellation support.
 
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': 0, 'content_block': {'type': Constants.CONTENT_TEXT, 'text': ''}}, ensure_ascii=False)}\n\n"
-
-    yield f"event: {Constants.EVENT_PING}\ndata: {json.dumps({'type': Constants.EVENT_PING}, ensure_ascii=False)}\n\n"
-
-    # Process streaming chunks
-    text_block_index = 0
-    tool_block_counter = 0
-    current_tool_calls = {}
-    final_stop_reason = Constants.STOP_END_TURN
-    usage_data = {"input_tokens": 0, "output_tokens": 0}
+    Client disconnects are detected by `disconnect_watcher` in the background, so the
+    per-chunk check is a flag read rather than an ASGI receive poll. Events produced
+    by one upstream chunk are written in a single send; when `timer` is given the
+    conversion time is recorded as `stream_convert` and the stage breakdown is sent
+    as a final `: server-timing` SSE comment.
+    """
 
     try:
-        async for line in openai_stream:
-            # Check if client disconnected
-            if await http_request.is_disconnected():
-                logger.info(f"Client disconnected, cancelling request {request_id}")
-                openai_client.cancel_request(request_id)
-                break
-
-            if line.strip():
-                if line.startswith("data: "):
-                    chunk_data = line[6:]
-                    if chunk_data.strip() == "[DONE]":
-                        break
-
-                    try:
-                        chunk = json.loads(chunk_data)
-                        # logger.info(f"OpenAI chunk: {chunk}")
-                        usage = chunk.get("usage", None)
-                        if usage:
-                            cache_read_input_tokens = 0
-                            prompt_tokens_details = usage.get('prompt_tokens_details', {})
-                            if prompt_tokens_details:
-                                cache_read_input_tokens = prompt_tokens_details.get('cached_tokens', 0)
-                            usage_data = {
-                                'input_tokens': usage.get('prompt_tokens', 0),
-                                'output_tokens': usage.get('completion_tokens', 0),
-                                'cache_read_input_tokens': cache_read_input_tokens
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+
+        # Send initial SSE events
+        yield (
+            sse_encoder.message_start(message_id, original_request.model)
+            + sse_encoder.text_block_start(0)
+            + sse_encoder.PING
+        )
+
+        # Process streaming chunks
+        text_block_index = 0
+        tool_block_counter = 0
+        current_tool_calls = {}
+        final_stop_reason = Constants.STOP_END_TURN
+        usage_data = {"input_tokens": 0, "output_tokens": 0}
+
+        try:
+            async for chunk in openai_stream:
+                # Check if client disconnected
+                if disconnect_watcher.disconnected:
+                    logger.info(f"Client disconnected, cancelling request {request_id}")
+                    openai_client.cancel_request(request_id)
+                    break
+
+                chunk_started = time.perf_counter()
+                events = []
+
+                usage = chunk.get("usage", None)
+                if usage:
+                    cache_read_input_tokens = 0
+                    prompt_tokens_details = usage.get('prompt_tokens_details', {})
+                    if prompt_tokens_details:
+                        cache_read_input_tokens = prompt_tokens_details.get('cached_tokens', 0)
+                    usage_data = {
+                        'input_tokens': usage.get('prompt_tokens', 0),
+                        'output_tokens': usage.get('completion_tokens', 0),
+                        'cache_read_input_tokens': cache_read_input_tokens
+                    }
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+
+                choice = choices[0]
+                delta = choice.get("delta") or {}
+                finish_reason = choice.get("finish_reason")
+
+                # Handle text delta
+                if delta and "content" in delta and delta["content"] is not None:
+                    events.append(sse_encoder.text_delta(text_block_index, delta["content"]))
+
+                # Handle tool call deltas with improved incremental processing
+                if delta.get("tool_calls"):
+                    for tc_delta in delta["tool_calls"]:
+                        tc_index = tc_delta.get("index", 0)
+
+                        # Initialize tool call tracking by index if not exists
+                        if tc_index not in current_tool_calls:
+                            current_tool_calls[tc_index] = {
+                                "id": None,
+                                "name": None,
+                                "pending_args": [],
+                                "json_tracker": JsonCompletenessTracker(),
+                                "claude_index": None,
+                                "started": False
                             }
-                        choices = chunk.get("choices", [])
-                        if not choices:
-                            continue
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"Failed to parse chunk: {chunk_data}, error: {e}"
-                        )
-                        continue
-
-                    choice = choices[0]
-                    delta = choice.get("delta", {})
-                    finish_reason = choice.get("finish_reason")
-
-                    # Handle text delta
-                    if delta and "content" in delta and delta["content"] is not None:
-                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': text_block_index, 'delta': {'type': Constants.DELTA_TEXT, 'text': delta['content']}}, ensure_ascii=False)}\n\n"
-
-                    # Handle tool call deltas with improved incremental processing
-                    if "tool_calls" in delta and delta["tool_calls"]:
-                        for tc_delta in delta["tool_calls"]:
-                            tc_index = tc_delta.get("index", 0)
-                            
-                            # Initialize tool call tracking by index if not exists
-                            if tc_index not in current_tool_calls:
-                                current_tool_calls[tc_index] = {
-                                    "id": None,
-                                    "name": None,
-                                    "args_buffer": "",
-                                    "json_sent": False,
-                                    "claude_index": None,
-                                    "started": False
-                                }
-                            
-                            tool_call = current_tool_calls[tc_index]
-                            
-                            # Update tool call ID if provided
-                            if tc_delta.get("id"):
-                                tool_call["id"] = tc_delta["id"]
-                            
-                            # Update function name and start content block if we have both id and name
-                            function_data = tc_delta.get(Constants.TOOL_FUNCTION, {})
-                            if function_data.get("name"):
-                                tool_call["name"] = function_data["name"]
-                            
-                            # Start content block when we have complete initial data
-                            if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
-                                tool_block_counter += 1
-                                claude_index = text_block_index + tool_block_counter
-                                tool_call["claude_index"] = claude_index
-                                tool_call["started"] = True
-                                
-                                yield f"event: {Constants.EVENT_CONTENT_BLOCK_START}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_START, 'index': claude_index, 'content_block': {'type': Constants.CONTENT_TOOL_USE, 'id': tool_call['id'], 'name': tool_call['name'], 'input': {}}}, ensure_ascii=False)}\n\n"
-                            
-                            # Handle function arguments
-                            if "arguments" in function_data and tool_call["started"] and function_data["arguments"] is not None:
-                                tool_call["args_buffer"] += function_data["arguments"]
-                                
-                                # Try to parse complete JSON and send delta when we have valid JSON
-                                try:
-                                    json.loads(tool_call["args_buffer"])
-                                    # If parsing succeeds and we haven't sent this JSON yet
-                                    if not tool_call["json_sent"]:
-                                        yield f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': tool_call['claude_index'], 'delta': {'type': Constants.DELTA_INPUT_JSON, 'partial_json': tool_call['args_buffer']}}, ensure_ascii=False)}\n\n"
-                                        tool_call["json_sent"] = True
-                                except json.JSONDecodeError:
-                                    # JSON is incomplete, continue accumulating
-                                    pass
-
-                    # Handle finish reason
-                    if finish_reason:
-                        if finish_reason == "length":
-                            final_stop_reason = Constants.STOP_MAX_TOKENS
-                        elif finish_reason in ["tool_calls", "function_call"]:
-                            final_stop_reason = Constants.STOP_TOOL_USE
-                        elif finish_reason == "stop":
-                            final_stop_reason = Constants.STOP_END_TURN
-                        else:
-                            final_stop_reason = Constants.STOP_END_TURN
-
-    except HTTPException as e:
-        # Handle cancellation
-        if e.status_code == 499:
-            logger.info(f"Request {request_id} was cancelled")
-            error_event = {
-                "type": "error",
-                "error": {
-                    "type": "cancelled",
-                    "message": "Request was cancelled by client",
-                },
-            }
-            yield f"event: error\ndata: {json.dumps(error_event, ensure_ascii=False)}\n\n"
-            return
-        else:
-            raise
-    except Exception as e:
-        # Handle any streaming errors gracefully
-        logger.error(f"Streaming error: {e}")
-        import traceback
 
-        logger.error(traceback.format_exc())
-        error_event = {
-            "type": "error",
-            "error": {"type": "api_error", "message": f"Streaming error: {str(e)}"},
-        }
-        yield f"event: error\ndata: {json.dumps(error_event, ensure_ascii=False)}\n\n"
-        return
-
-    # Send final SSE events
-    yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': text_block_index}, ensure_ascii=False)}\n\n"
-
-    for tool_data in current_tool_calls.values():
-        if tool_data.get("started") and tool_data.get("claude_index") is not None:
-            yield f"event: {Constants.EVENT_CONTENT_BLOCK_STOP}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_STOP, 'index': tool_data['claude_index']}, ensure_ascii=False)}\n\n"
+                        tool_call = current_tool_calls[tc_index]
+
+                        # Update tool call ID if provided
+                        if tc_delta.get("id"):
+                            tool_call["id"] = tc_delta["id"]
+
+                        # Update function name and start content block if we have both id and name
+                        function_data = tc_delta.get(Constants.TOOL_FUNCTION) or {}
+                        if function_data.get("name"):
+                            tool_call["name"] = function_data["name"]
+
+                        # Start content block when we have complete initial data
+                        if (tool_call["id"] and tool_call["name"] and not tool_call["started"]):
+                            tool_block_counter += 1
+                            claude_index = text_block_index + tool_block_counter
+                            tool_call["claude_index"] = claude_index
+                            tool_call["started"] = True
+
+                            events.append(sse_encoder.tool_use_block_start(claude_index, tool_call["id"], tool_call["name"]))
+
+                        # Handle function arguments
+                        if function_data.get("arguments"):
+                            tool_call["pending_args"].append(function_data["arguments"])
+
+                        # Forward argument fragments as soon as the block is open, until the JSON closes
+                        if tool_call["started"] and tool_call["pending_args"]:
+                            fragment = "".join(tool_call["pending_args"])
+                            tool_call["pending_args"].clear()
+                            partial_json = tool_call["json_tracker"].feed(fragment)
+                            if partial_json:
+                                events.append(sse_encoder.input_json_delta(tool_call["claude_index"], partial_json))
+
+                # Handle finish reason
+                if finish_reason:
+                    if finish_reason == "length":
+                        final_stop_reason = Constants.STOP_MAX_TOKENS
+                    elif finish_reason in ["tool_calls", "function_call"]:
+                        final_stop_reason = Constants.STOP_TOOL_USE
+                    elif finish_reason == "stop":
+                        final_stop_reason = Constants.STOP_END_TURN
+                    else:
+                        final_stop_reason = Constants.STOP_END_TURN
+
+                if timer is not None:
+                    timer.mark_since("stream_convert", chunk_started)
+                if events:
+                    yield events[0] if len(events) == 1 else b"".join(events)
+
+        except HTTPException as e:
+            # Handle cancellation
+            if e.status_code == 499:
+                logger.info(f"Request {request_id} was cancelled")
+                yield sse_encoder.error("cancelled", "Request was cancelled by client")
+                return
+            else:
+                raise
+        except Exception as e:
+            # Handle any streaming errors gracefully
+            logger.error(f"Streaming error: {e}")
+            import traceback
+
+            logger.error(traceback.format_exc())
+            yield sse_encoder.error("api_error", f"Streaming error: {str(e)}")
+            return
 
-    yield f"event: {Constants.EVENT_MESSAGE_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_DELTA, 'delta': {'stop_reason': final_stop_reason, 'stop_sequence': None}, 'usage': usage_data}, ensure_ascii=False)}\n\n"
-    yield f"event: {Constants.EVENT_MESSAGE_STOP}\ndata: {json.dumps({'type': Constants.EVENT_MESSAGE_STOP}, ensure_ascii=False)}\n\n"
+        # Send final SSE events
+        closing = [sse_encoder.content_block_stop(text_block_index)]
+
+        for tool_data in current_tool_calls.values():
+            if tool_data.get("started") and tool_data.get("claude_index") is not None:
+                closing.append(sse_encoder.content_block_stop(tool_data["claude_index"]))
+
+        closing.append(sse_encoder.message_delta(final_stop_reason, usage_data))
+        closing.append(sse_encoder.MESSAGE_STOP)
+        if timer is not None:
+            timer.finish()
+            closing.append(sse_encoder.comment(f"server-timing {timer.server_timing()}"))
+        yield b"".join(closing)
+    finally:
+        disconnect_watcher.stop()
+        if timer is not None:
+            if "total" not in timer.stages:
+                timer.finish()
+            timer.publish("stream")
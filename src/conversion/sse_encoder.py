@@ -0,0 +1,128 @@
+"""
+Byte-level encoder for Claude SSE stream events.
+
+The JSON envelope of every event is constant except for a few fields, so the
+prefix/suffix bytes are built once per event type and block index and only the
+variable payload is escaped per event. Output is `bytes`, which StreamingResponse
+passes through without re-encoding. Layout matches `json.dumps` defaults, so the
+bytes are identical to the previous f-string encoding.
+"""
+
+import json
+from functools import lru_cache
+from json.encoder import encode_basestring
+from typing import Any, Dict, Optional
+
+from src.core.constants import Constants
+
+
+def _event(event_type: str, payload: Dict[str, Any]) -> bytes:
+    data = json.dumps(payload, ensure_ascii=False)
+    return f"event: {event_type}\ndata: {data}\n\n".encode("utf-8")
+
+
+@lru_cache(maxsize=256)
+def _delta_prefix(delta_type: str, field: str, index: int) -> bytes:
+    return (
+        f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\n"
+        f'data: {{"type": "{Constants.EVENT_CONTENT_BLOCK_DELTA}", "index": {index}, '
+        f'"delta": {{"type": "{delta_type}", "{field}": '
+    ).encode("utf-8")
+
+
+_DELTA_SUFFIX = b"}}\n\n"
+
+
+def text_delta(index: int, text: str) -> bytes:
+    return (
+        _delta_prefix(Constants.DELTA_TEXT, "text", index)
+        + encode_basestring(text).encode("utf-8")
+        + _DELTA_SUFFIX
+    )
+
+
+def input_json_delta(index: int, partial_json: str) -> bytes:
+    return (
+        _delta_prefix(Constants.DELTA_INPUT_JSON, "partial_json", index)
+        + encode_basestring(partial_json).encode("utf-8")
+        + _DELTA_SUFFIX
+    )
+
+
+@lru_cache(maxsize=256)
+def content_block_stop(index: int) -> bytes:
+    return _event(
+        Constants.EVENT_CONTENT_BLOCK_STOP,
+        {"type": Constants.EVENT_CONTENT_BLOCK_STOP, "index": index},
+    )
+
+
+@lru_cache(maxsize=256)
+def text_block_start(index: int) -> bytes:
+    return _event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": index,
+            "content_block": {"type": Constants.CONTENT_TEXT, "text": ""},
+        },
+    )
+
+
+def tool_use_block_start(index: int, tool_id: str, name: str) -> bytes:
+    return _event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": index,
+            "content_block": {
+                "type": Constants.CONTENT_TOOL_USE,
+                "id": tool_id,
+                "name": name,
+                "input": {},
+            },
+        },
+    )
+
+
+def message_start(message_id: str, model: str) -> bytes:
+    return _event(
+        Constants.EVENT_MESSAGE_START,
+        {
+            "type": Constants.EVENT_MESSAGE_START,
+            "message": {
+                "id": message_id,
+                "type": "message",
+                "role": Constants.ROLE_ASSISTANT,
+                "model": model,
+                "content": [],
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": {"input_tokens": 0, "output_tokens": 0},
+            },
+        },
+    )
+
+
+def message_delta(stop_reason: str, usage: Dict[str, Any], stop_sequence: Optional[str] = None) -> bytes:
+    return _event(
+        Constants.EVENT_MESSAGE_DELTA,
+        {
+            "type": Constants.EVENT_MESSAGE_DELTA,
+            "delta": {"stop_reason": stop_reason, "stop_sequence": stop_sequence},
+            "usage": usage,
+        },
+    )
+
+
+def error(error_type: str, message: str) -> bytes:
+    return _event("error", {"type": "error", "error": {"type": error_type, "message": message}})
+
+
+def comment(text: str) -> bytes:
+    """SSE comment line; clients ignore it, so it can carry out-of-band diagnostics."""
+    return f": {text}\n\n".encode("utf-8")
+
+
+PING = _event(Constants.EVENT_PING, {"type": Constants.EVENT_PING})
+MESSAGE_STOP = _event(Constants.EVENT_MESSAGE_STOP, {"type": Constants.EVENT_MESSAGE_STOP})
@@ -0,0 +1,56 @@
+"""
+Lazy request/response tracing for the conversion layer.
+
+Payloads are only serialized when DEBUG is enabled for the logger, and the
+serialized form is redacted: base64 image data is replaced by its size and any
+other long string is truncated, so tracing a screenshot-heavy conversation
+never dumps megabytes into the log.
+"""
+
+import json
+import logging
+from typing import Any
+
+from src.core.config import config
+
+_BASE64_MARKER = ";base64,"
+
+
+def redact_payload(value: Any, max_chars: int) -> Any:
+    """Return a copy of `value` that is safe and small enough to log."""
+    if isinstance(value, str):
+        if value.startswith("data:") and _BASE64_MARKER in value[:100]:
+            header, _, data = value.partition(_BASE64_MARKER)
+            return f"{header}{_BASE64_MARKER}<{len(data)} chars redacted>"
+        if len(value) > max_chars:
+            return f"{value[:max_chars]}...<{len(value) - max_chars} more chars>"
+        return value
+    if isinstance(value, dict):
+        if value.get("type") == "base64" and isinstance(value.get("data"), str):
+            redacted = dict(value)
+            redacted["data"] = f"<{len(value['data'])} chars redacted>"
+            return redacted
+        return {key: redact_payload(item, max_chars) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact_payload(item, max_chars) for item in value]
+    return value
+
+
+class LazyPayload:
+    """Defers redaction and JSON serialization until the log record is formatted."""
+
+    __slots__ = ("payload", "max_chars")
+
+    def __init__(self, payload: Any, max_chars: int):
+        self.payload = payload
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        redacted = redact_payload(self.payload, self.max_chars)
+        return json.dumps(redacted, indent=2, ensure_ascii=False, default=str)
+
+
+def trace_payload(logger: logging.Logger, label: str, payload: Any) -> None:
+    """Log `payload` at DEBUG under `label`; costs one level check otherwise."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", label, LazyPayload(payload, config.trace_max_string_chars))
@@ -0,0 +1,163 @@
+"""
+Adaptive (AIMD) concurrency limit for one upstream model.
+
+Instead of every request independently retrying into a rate-limited upstream,
+requests for a model first take a slot from its limiter:
+
+- success: the limit grows additively, by about one slot per full window of
+  successful requests
+- 429 / 5xx, or time to first token above `latency_tolerance` x the no-load
+  baseline: the limit shrinks multiplicatively, once per overload: requests
+  that started before the last decrease cannot shrink it again
+- `Retry-After`: no new request for the model starts before it expires
+
+so the number of requests in flight settles just under what the upstream
+accepts, and aggregate goodput stays near its limit instead of oscillating
+between bursts of 429s and idle backoff.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+
+class AdaptiveLimit:
+    def __init__(
+        self,
+        initial: float = 16,
+        min_limit: float = 1,
+        max_limit: float = 256,
+        backoff: float = 0.7,
+        latency_tolerance: float = 2.0,
+        alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.alpha = alpha
+        self._clock = clock
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.overloads = 0
+        self._last_decrease = float("-inf")
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _can_start(self) -> bool:
+        return self.in_flight < int(self.limit) and self._clock() >= self.blocked_until
+
+    async def acquire(self, cancel_event: Optional[asyncio.Event] = None, timeout: Optional[float] = None) -> float:
+        """Wait for a slot and return when it was granted (pass it back on release).
+
+        Raises 499 if `cancel_event` fires first and 429 after `timeout`.
+        """
+        if not self._waiters and self._can_start():
+            self.in_flight += 1
+            return self._clock()
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._schedule()
+        waits = [future]
+        cancel_task = asyncio.ensure_future(cancel_event.wait()) if cancel_event is not None else None
+        if cancel_task is not None:
+            waits.append(cancel_task)
+        try:
+            await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            self._give_up(future)
+            raise
+        finally:
+            if cancel_task is not None:
+                cancel_task.cancel()
+        if cancel_event is not None and cancel_event.is_set():
+            self._give_up(future)
+            raise HTTPException(status_code=499, detail="Request cancelled by client")
+        if not future.done():
+            self._give_up(future)
+            raise HTTPException(
+                status_code=429,
+                detail="Upstream is at its adaptive concurrency limit. Please retry later.",
+            )
+        return self._clock()
+
+    def _give_up(self, future: asyncio.Future) -> None:
+        if future.done() and not future.cancelled():
+            # Granted just as the caller went away: hand the slot on
+            self.on_ignore()
+        else:
+            future.cancel()
+            if future in self._waiters:
+                self._waiters.remove(future)
+
+    def _schedule(self) -> None:
+        """Hand free slots to waiters, or wake up when a Retry-After block ends."""
+        while self._waiters and self._can_start():
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+        now = self._clock()
+        if self._waiters and self.blocked_until > now and self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().call_later(self.blocked_until - now, self._wake)
+
+    def _wake(self) -> None:
+        self._wakeup = None
+        self._schedule()
+
+    def _decrease(self, granted_at: float) -> None:
+        if granted_at < self._last_decrease:
+            return
+        self._last_decrease = self._clock()
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+    def on_success(self, granted_at: float, latency: Optional[float] = None) -> None:
+        """Release after a success; `latency` (time to first token) feeds the latency signal."""
+        self.in_flight -= 1
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+            # The no-load baseline follows the fastest samples and creeps up slowly if the model gets slower
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += 0.01 * (self.latency - self.baseline)
+        if self.latency is not None and self.latency > self.latency_tolerance * self.baseline:
+            self._decrease(granted_at)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._schedule()
+
+    def on_overload(self, granted_at: float, retry_after: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        self.overloads += 1
+        self._decrease(granted_at)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, self._clock() + retry_after)
+        self._schedule()
+
+    def on_ignore(self) -> None:
+        """Release a slot without learning from it (client errors, cancellations)."""
+        self.in_flight -= 1
+        self._schedule()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "ewma_latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "blocked_for": round(max(0.0, self.blocked_until - self._clock()), 2),
+            "overloads": self.overloads,
+        }
@@ -0,0 +1,233 @@
+"""
+Admission control per client key: concurrency caps, token-bucket rate limits
+and a weighted-fair queue in front of the upstream.
+
+Limits come from the `API_KEY_MODEL_MAPPING_<ID>_*` settings:
+
+  MAX_CONCURRENCY  requests of this key in flight at once
+  RATE_LIMIT_RPM   sustained requests per minute (token bucket)
+  BURST            bucket size (default: 10 seconds' worth of RATE_LIMIT_RPM)
+  WEIGHT           share of MAX_CONCURRENT_REQUESTS when keys compete (default 1)
+
+A request over its key's limits, or arriving while the proxy is at
+MAX_CONCURRENT_REQUESTS, waits instead of being forwarded into an upstream 429.
+Waiting keys are served in start-time fair queuing order: each admission
+advances the key's virtual time by 1/weight, and the key with the smallest
+virtual time goes next, so a tenant running many parallel agents cannot starve
+one with a single request. Requests still waiting after ADMISSION_QUEUE_TIMEOUT
+get a 429 with Retry-After.
+
+Rate-limit buckets live in the shared state backend (global across workers);
+concurrency and queues are per worker.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from src.core.config import config
+from src.core.logging import logger
+from src.core.metrics import metrics_registry
+from src.core.state import StateBackend, state_backend
+
+admission_wait_seconds = metrics_registry.histogram(
+    "claude_proxy_admission_wait_seconds",
+    "Time requests waited for admission, per client key.",
+    ("key",),
+)
+admission_rejected_total = metrics_registry.counter(
+    "claude_proxy_admission_rejected_total",
+    "Requests rejected after waiting too long for admission, per client key and limit.",
+    ("key", "reason"),
+)
+
+
+class _KeyState:
+    __slots__ = ("in_flight", "waiters", "virtual_time", "admitted")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.virtual_time = 0.0
+        self.admitted = 0
+
+
+class Ticket:
+    """An admitted request; `release()` (idempotent) frees its slot."""
+
+    __slots__ = ("_release",)
+
+    def __init__(self, release: Optional[Callable[[], None]]):
+        self._release = release
+
+    def release(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int = 0,
+        queue_timeout: float = 30.0,
+        state: Optional[StateBackend] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.state = state
+        self._clock = clock
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._keys: Dict[str, _KeyState] = {}
+        self._limits: Dict[str, Dict[str, Any]] = {}
+        # Keys waiting on their token bucket, for the queue depth gauge
+        self._rate_waiting: Dict[str, int] = {}
+
+    def _key(self, key_id: str) -> _KeyState:
+        state = self._keys.get(key_id)
+        if state is None:
+            state = self._keys[key_id] = _KeyState()
+        return state
+
+    def applies_to(self, limits: Dict[str, Any]) -> bool:
+        return bool(self.max_concurrency or limits.get("max_concurrency") or limits.get("rate_limit_rpm"))
+
+    async def admit(self, key_id: str, limits: Dict[str, Any]) -> Ticket:
+        """Wait until `key_id` may send another request; raises a 429 HTTPException on timeout."""
+        if not self.applies_to(limits):
+            return Ticket(None)
+        rate_limit_rpm = limits.get("rate_limit_rpm")
+
+        started = self._clock()
+        deadline = started + self.queue_timeout
+        if rate_limit_rpm:
+            await self._take_token(key_id, rate_limit_rpm, limits.get("burst"), deadline)
+
+        self._limits[key_id] = limits
+        key = self._key(key_id)
+        future = asyncio.get_running_loop().create_future()
+        key.waiters.append(future)
+        self._dispatch()
+        if not future.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - self._clock()))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if not future.done():
+                    future.cancel()
+                    key.waiters.remove(future)
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    self._reject(key_id, "concurrency", 1.0)
+                elif isinstance(e, asyncio.CancelledError):
+                    # Admitted just as the client went away
+                    self._release(key_id)
+                    raise
+
+        waited = self._clock() - started
+        admission_wait_seconds.observe(waited, key=key_id)
+        if waited > 0.001:
+            logger.debug(f"Client key {key_id} admitted after waiting {waited * 1000:.0f}ms")
+        return Ticket(lambda: self._release(key_id))
+
+    async def _take_token(self, key_id: str, rate_limit_rpm: float, burst: Optional[float], deadline: float) -> None:
+        rate = rate_limit_rpm / 60.0
+        size = burst or max(1.0, rate * 10)
+        self._rate_waiting[key_id] = self._rate_waiting.get(key_id, 0) + 1
+        try:
+            while True:
+                wait = await self._take(f"rate:{key_id}", rate, size)
+                if wait <= 0:
+                    return
+                if self._clock() + wait > deadline:
+                    self._reject(key_id, "rate_limit", wait)
+                await asyncio.sleep(wait)
+        finally:
+            self._rate_waiting[key_id] -= 1
+
+    async def _take(self, bucket: str, rate: float, size: float) -> float:
+        if self.state is None:
+            return 0.0
+        if self.state.shared:
+            # A round trip to the shared state server must not block the event loop
+            return await asyncio.to_thread(self.state.take, bucket, rate, size)
+        return self.state.take(bucket, rate, size)
+
+    def _reject(self, key_id: str, reason: str, retry_after: float) -> None:
+        admission_rejected_total.inc(key=key_id, reason=reason)
+        logger.warning(f"Client key {key_id} over its {reason} limit, rejecting request")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests for this API key ({reason.replace('_', ' ')} limit). Please retry later.",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+    def _eligible(self, key_id: str, key: _KeyState) -> bool:
+        if not key.waiters:
+            return False
+        max_concurrency = self._limits.get(key_id, {}).get("max_concurrency")
+        return not max_concurrency or key.in_flight < max_concurrency
+
+    def _dispatch(self) -> None:
+        """Admit waiters while there is capacity, smallest virtual start time first."""
+        while not self.max_concurrency or self.in_flight < self.max_concurrency:
+            candidates = [(key_id, key) for key_id, key in self._keys.items() if self._eligible(key_id, key)]
+            if not candidates:
+                return
+            key_id, key = min(candidates, key=lambda item: max(item[1].virtual_time, self.virtual_time))
+            future = key.waiters.popleft()
+            if future.done():
+                continue
+            start = max(key.virtual_time, self.virtual_time)
+            self.virtual_time = start
+            key.virtual_time = start + 1.0 / max(self._limits[key_id].get("weight") or 1.0, 0.001)
+            key.in_flight += 1
+            key.admitted += 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _release(self, key_id: str) -> None:
+        key = self._keys[key_id]
+        key.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    def queue_depth(self) -> Dict[tuple, int]:
+        depth = {(key_id,): count for key_id, count in self._rate_waiting.items()}
+        for key_id, key in self._keys.items():
+            depth[(key_id,)] = depth.get((key_id,), 0) + len(key.waiters)
+        return depth
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency or None,
+            "keys": {
+                key_id: {"in_flight": key.in_flight, "queued": len(key.waiters), "admitted": key.admitted}
+                for key_id, key in self._keys.items()
+            },
+        }
+
+
+admission = AdmissionController(
+    max_concurrency=config.max_concurrent_requests,
+    queue_timeout=config.admission_queue_timeout,
+    state=state_backend,
+)
+
+metrics_registry.gauge(
+    "claude_proxy_admission_queue_depth",
+    "Requests waiting for admission, per client key.",
+    ("key",),
+    callback=admission.queue_depth,
+)
+metrics_registry.gauge(
+    "claude_proxy_admission_in_flight",
+    "Admitted requests in flight, per client key.",
+    ("key",),
+    callback=lambda: {(key_id,): key.in_flight for key_id, key in admission._keys.items()},
+)
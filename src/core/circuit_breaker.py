@@ -0,0 +1,101 @@
+"""
+Circuit breaker for one (upstream, model) route.
+
+  closed     requests flow; `failure_threshold` consecutive outage-type failures
+             (5xx, timeouts, connection errors) open the circuit
+  open       requests fail fast (or go to the route's fallback model) for
+             `open_seconds`, instead of each spending retries and timeouts on a
+             model that is down
+  half-open  after that, `half_open_probes` requests are let through; a success
+             closes the circuit, a failure opens it again
+
+429s are not outages (see `AdaptiveLimit`), and client errors or cancellations
+leave the breaker untouched.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def is_outage(status_code: int) -> bool:
+    return status_code >= 500 or status_code == 408
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.probes_in_flight = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self.opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self.probes_in_flight = 0
+        return self._state
+
+    def available(self) -> bool:
+        """Whether a request may be sent now (does not reserve a half-open probe)."""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and self.probes_in_flight < self.half_open_probes)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - self._clock()) if self.state == OPEN else 0.0
+
+    def begin(self) -> bool:
+        """Count a request that is being sent; returns True if it is a half-open probe."""
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+            return True
+        return False
+
+    def record_success(self, probe: bool = False) -> None:
+        if probe:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+        self.failures = 0
+        if self._state == HALF_OPEN:
+            self._state = CLOSED
+
+    def record_failure(self, probe: bool = False) -> None:
+        if probe:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+        self.failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self.failures >= self.failure_threshold):
+            self._open()
+
+    def record_ignored(self, probe: bool = False) -> None:
+        """A request that says nothing about the route's health finished."""
+        if probe:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self.opened_at = self._clock()
+        self.opens += 1
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            "state": state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "retry_after": round(self.retry_after(), 2) if state == OPEN else None,
+        }
@@ -1,51 +1,195 @@
 import asyncio
 import json
+import time
 import uuid
+import httpx
 from fastapi import HTTPException
-from typing import Optional, AsyncGenerator, Dict, Any
+from typing import Optional, AsyncGenerator, AsyncIterator, Dict, Any, List, Tuple
 from openai import AsyncOpenAI, AsyncAzureOpenAI
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
-from openai._exceptions import APIError, RateLimitError, AuthenticationError, BadRequestError
+from openai._exceptions import (
+    APIConnectionError,
+    APIError,
+    APITimeoutError,
+    AuthenticationError,
+    BadRequestError,
+    RateLimitError,
+)
+from src.core.adaptive_limit import AdaptiveLimit
+from src.core.key_pool import KeyPool, PooledKey, parse_retry_after
 from src.core.logging import logger
+from src.core.metrics import RequestTimer
+from src.core.state import StateBackend
+from src.models.openai import OpenAIStreamChunk
+
+
+async def iter_sse_chunks(
+    lines: AsyncIterator[str], http_request: Optional[httpx.Request] = None
+) -> AsyncGenerator[OpenAIStreamChunk, None]:
+    """Parse raw OpenAI SSE lines into chunk dicts, decoding each event's JSON once.
+
+    Stops at the `[DONE]` sentinel and raises `APIError` for in-band error events,
+    mirroring what the SDK's own stream decoder does.
+    """
+    data_lines: List[str] = []
+
+    async for line in lines:
+        if line:
+            if line.startswith("data:"):
+                data = line[5:]
+                data_lines.append(data[1:] if data.startswith(" ") else data)
+            # `event:`, `id:`, `retry:` fields and `:` comments carry nothing we use
+            continue
+
+        if not data_lines:
+            continue
+        data = data_lines[0] if len(data_lines) == 1 else "\n".join(data_lines)
+        data_lines = []
+
+        if data == "[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Failed to parse chunk: {data}, error: {e}")
+            continue
+        if isinstance(chunk, dict) and chunk.get("error"):
+            error = chunk["error"]
+            message = error.get("message") if isinstance(error, dict) else str(error)
+            raise APIError(message=message or "An error occurred during streaming", request=http_request, body=error)
+        yield chunk
+
+    # Flush a trailing event that was not terminated by a blank line
+    if data_lines:
+        data = "\n".join(data_lines)
+        if data != "[DONE]":
+            try:
+                yield json.loads(data)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Failed to parse chunk: {data}, error: {e}")
+
+
+class _NoRateLimitRetries:
+    """SDK client mixin that leaves 429s of pooled keys to the key pool.
+
+    The SDK still retries connection errors, timeouts, 408/409 and 5xx, but a 429
+    fails over to another key instead of sleeping on this one. This overrides the
+    SDK's private retry predicate; if a release renames it, 429s are retried on
+    the same key again, as with a single key.
+    """
+
+    def _should_retry(self, response: httpx.Response) -> bool:
+        if response.status_code == 429:
+            return False
+        return super()._should_retry(response)
+
+
+class _PooledAsyncOpenAI(_NoRateLimitRetries, AsyncOpenAI):
+    pass
+
+
+class _PooledAsyncAzureOpenAI(_NoRateLimitRetries, AsyncAzureOpenAI):
+    pass
+
 
 class OpenAIClient:
-    """Async OpenAI client with cancellation support."""
+    """Async OpenAI client with cancellation support.
+
+    Requests are spread over a `KeyPool` of upstream API keys; a 429 benches the
+    key and the request fails over to the next usable key.
+    """
     
-    def __init__(self, api_key: str, base_url: str, timeout: int = 90, api_version: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        timeout: int = 90,
+        api_version: Optional[str] = None,
+        api_keys: Optional[List[str]] = None,
+        key_bench_seconds: float = 20.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        state: Optional[StateBackend] = None,
+        name: Optional[str] = None,
+        adaptive_limit: Optional[Dict[str, float]] = None,
+    ):
         self.api_key = api_key
         self.base_url = base_url
+        self.timeout = timeout
+        self.api_version = api_version
+        # Shared by the SDK clients of every pooled key (None: SDK default transport per key)
+        self.http_client = http_client
         self.is_bytedance = "bytedance.net" in base_url or "search.bytedance.net" in base_url
         self.is_ark = "ark-cn-beijing.bytedance.net" in base_url
-        
+
+        keys = list(dict.fromkeys(api_keys or [api_key]))
+        # With several keys a 429 should move to another key instead of the SDK sleeping on this one
+        pooled = len(keys) > 1
+        self.key_pool = KeyPool(
+            [PooledKey(key, self._build_sdk_client(key, pooled)) for key in keys],
+            bench_seconds=key_bench_seconds,
+            state=state,
+            namespace=name or base_url,
+        )
+        self.active_requests: Dict[str, asyncio.Event] = {}
+        # AdaptiveLimit settings (None: disabled) and one limit per model
+        self.adaptive_limit = adaptive_limit
+        self.limits: Dict[str, AdaptiveLimit] = {}
+
+    def _build_sdk_client(self, api_key: str, pooled: bool = False):
+        kwargs: Dict[str, Any] = {"api_key": api_key, "timeout": self.timeout}
+        if self.http_client is not None:
+            kwargs["http_client"] = self.http_client
+
         # Detect if using Azure and instantiate the appropriate client
-        if api_version:
-            self.client = AsyncAzureOpenAI(
-                api_key=api_key,
-                azure_endpoint=base_url,
-                api_version=api_version,
-                timeout=timeout
+        if self.api_version:
+            return (_PooledAsyncAzureOpenAI if pooled else AsyncAzureOpenAI)(
+                azure_endpoint=self.base_url,
+                api_version=self.api_version,
+                **kwargs
             )
-        else:
-            # For ByteDance API, add Api-Key to default headers
-            if self.is_bytedance and not self.is_ark:
-                self.client = AsyncOpenAI(
-                    api_key=api_key,
-                    base_url=base_url,
-                    timeout=timeout,
-                    default_headers={
-                        "Api-Key": api_key,
-                    }
-                )
-            else:
-                self.client = AsyncOpenAI(
-                    api_key=api_key,
-                    base_url=base_url,
-                    timeout=timeout
-                )
-        self.active_requests: Dict[str, asyncio.Event] = {}
-    
-    async def create_chat_completion(self, request: Dict[str, Any], request_id: Optional[str] = None) -> Dict[str, Any]:
-        """Send chat completion to OpenAI API with cancellation support."""
+        # For ByteDance API, add Api-Key to default headers
+        if self.is_bytedance and not self.is_ark:
+            return (_PooledAsyncOpenAI if pooled else AsyncOpenAI)(
+                base_url=self.base_url,
+                default_headers={
+                    "Api-Key": api_key,
+                },
+                **kwargs
+            )
+        return (_PooledAsyncOpenAI if pooled else AsyncOpenAI)(base_url=self.base_url, **kwargs)
+
+    @property
+    def client(self):
+        """SDK client of the first pooled key."""
+        return self.key_pool.keys[0].client
+
+    @client.setter
+    def client(self, sdk_client) -> None:
+        # Replace the pool with a single pre-built SDK client (tests, custom transports)
+        self.key_pool = KeyPool(
+            [PooledKey(getattr(sdk_client, "api_key", self.api_key), sdk_client)],
+            bench_seconds=self.key_pool.bench_seconds,
+            state=self.key_pool.state,
+            namespace=self.key_pool.namespace,
+        )
+
+    def _fail_over(self, key: PooledKey, error: RateLimitError, request_id: Optional[str], attempts_left: int) -> bool:
+        """Bench a rate-limited key; return True if another key should be tried."""
+        response = getattr(error, "response", None)
+        self.key_pool.bench(key, parse_retry_after(getattr(response, "headers", None)))
+        if attempts_left <= 0 or not self.key_pool.has_available():
+            return False
+        logger.info(f"Request {request_id}: upstream key {key.label} rate limited, failing over to another key")
+        return True
+
+    async def create_chat_completion(
+        self, request: Dict[str, Any], request_id: Optional[str] = None, timer: Optional[RequestTimer] = None
+    ) -> Dict[str, Any]:
+        """Send chat completion to OpenAI API with cancellation support.
+
+        Time spent waiting on the upstream is added to `timer` as the `upstream` stage.
+        """
+        started = time.perf_counter()
         
         # Create cancellation token if request_id provided
         if request_id:
@@ -59,39 +203,32 @@ class OpenAIClient:
                     request["extra_headers"] = {}
                 request["extra_headers"]["X-TT-LOGID"] = str(uuid.uuid4())
             
-            # Create task that can be cancelled
-            completion_task = asyncio.create_task(
-                self.client.chat.completions.create(**request)
-            )
-            
-            if request_id:
-                # Wait for either completion or cancellation
-                cancel_task = asyncio.create_task(cancel_event.wait())
-                done, pending = await asyncio.wait(
-                    [completion_task, cancel_task],
-                    return_when=asyncio.FIRST_COMPLETED
-                )
-                
-                # Cancel pending tasks
-                for task in pending:
-                    task.cancel()
+            limit_slot = await self._acquire_limit(request, cancel_event if request_id else None)
+            if limit_slot is not None:
+                # Time queued for the adaptive limit is not upstream latency (and must not feed its TTFT signal)
+                started = timer.mark_since("upstream_limit", started) if timer is not None else time.perf_counter()
+            try:
+                attempts_left = len(self.key_pool)
+                while True:
+                    key = self.key_pool.acquire()
+                    attempts_left -= 1
                     try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
-                
-                # Check if request was cancelled
-                if cancel_task in done:
-                    completion_task.cancel()
-                    raise HTTPException(status_code=499, detail="Request cancelled by client")
-                
-                completion = await completion_task
-            else:
-                completion = await completion_task
-            
-            # Convert to dict format that matches the original interface
-            return completion.model_dump()
+                        response = await self._create_with_key(key, request, cancel_event if request_id else None)
+                        break
+                    except RateLimitError as e:
+                        if not self._fail_over(key, e, request_id, attempts_left):
+                            raise
+                    finally:
+                        self.key_pool.release(key)
+            except BaseException as e:
+                self._release_limit(limit_slot, error=e)
+                raise
+            # A buffered call's latency mostly measures output length, so it only counts as a success
+            self._release_limit(limit_slot)
+            return response
         
+        except HTTPException:
+            raise
         except AuthenticationError as e:
             detail = self.classify_openai_error(str(e))
             log_id = self._extract_tt_logid(e)
@@ -123,12 +260,58 @@ class OpenAIClient:
             raise HTTPException(status_code=500, detail=detail)
         
         finally:
+            if timer is not None:
+                timer.mark_since("upstream", started)
             # Clean up active request tracking
             if request_id and request_id in self.active_requests:
                 del self.active_requests[request_id]
     
-    async def create_chat_completion_stream(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[str, None]:
-        """Send streaming chat completion to OpenAI API with cancellation support."""
+    async def _create_with_key(
+        self, key: PooledKey, request: Dict[str, Any], cancel_event: Optional[asyncio.Event]
+    ) -> Dict[str, Any]:
+        # Create task that can be cancelled
+        completion_task = asyncio.create_task(
+            key.client.chat.completions.with_raw_response.create(**request)
+        )
+        cancel_task = asyncio.create_task(cancel_event.wait()) if cancel_event is not None else None
+        try:
+            if cancel_task is not None:
+                # Wait for either completion or cancellation
+                done, _ = await asyncio.wait(
+                    [completion_task, cancel_task],
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                # Check if request was cancelled
+                if cancel_task in done:
+                    raise HTTPException(status_code=499, detail="Request cancelled by client")
+            raw_response = await completion_task
+        finally:
+            # Also reached when the caller itself is cancelled (e.g. a fallback's TTFT budget ran out):
+            # the upstream call must not outlive it
+            for task in (completion_task, cancel_task):
+                if task is not None and not task.done():
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+        
+        self.key_pool.record_headers(key, raw_response.headers)
+        # Convert to dict format that matches the original interface
+        return raw_response.parse().model_dump()
+
+    async def create_chat_completion_stream(
+        self, request: Dict[str, Any], request_id: Optional[str] = None, timer: Optional[RequestTimer] = None
+    ) -> AsyncGenerator[OpenAIStreamChunk, None]:
+        """Send streaming chat completion to OpenAI API with cancellation support.
+
+        The raw upstream SSE body is read directly and every event is parsed exactly
+        once, so the converter receives plain chunk dicts instead of re-serialized strings.
+        Time to the first chunk is added to `timer` as the `upstream_ttft` stage.
+        """
+        started = time.perf_counter()
+        first_chunk = True
+        ttft = None
         
         # Create cancellation token if request_id provided
         if request_id:
@@ -148,23 +331,46 @@ class OpenAIClient:
                     request["extra_headers"] = {}
                 request["extra_headers"]["X-TT-LOGID"] = str(uuid.uuid4())
             
-            # Create the streaming completion
-            streaming_completion = await self.client.chat.completions.create(**request)
-            
-            async for chunk in streaming_completion:
-                # Check for cancellation before yielding each chunk
-                if request_id and request_id in self.active_requests:
-                    if self.active_requests[request_id].is_set():
-                        raise HTTPException(status_code=499, detail="Request cancelled by client")
-                
-                # Convert chunk to SSE format matching original HTTP client format
-                chunk_dict = chunk.model_dump()
-                chunk_json = json.dumps(chunk_dict, ensure_ascii=False)
-                yield f"data: {chunk_json}"
-            
-            # Signal end of stream
-            yield "data: [DONE]"
+            limit_slot = await self._acquire_limit(request, cancel_event if request_id else None)
+            if limit_slot is not None:
+                # Time queued for the adaptive limit is not upstream latency (and must not feed its TTFT signal)
+                started = timer.mark_since("upstream_limit", started) if timer is not None else time.perf_counter()
+            attempts_left = len(self.key_pool)
+            while True:
+                key = self.key_pool.acquire()
+                attempts_left -= 1
+                try:
+                    # Open the streaming completion without letting the SDK build chunk models
+                    async with key.client.chat.completions.with_streaming_response.create(**request) as response:
+                        self.key_pool.record_headers(key, response.headers)
+                        async for chunk in iter_sse_chunks(response.iter_lines(), response.http_request):
+                            if first_chunk:
+                                first_chunk = False
+                                ttft = time.perf_counter() - started
+                                if timer is not None:
+                                    timer.mark_since("upstream_ttft", started)
+
+                            # Check for cancellation before yielding each chunk
+                            if request_id and request_id in self.active_requests:
+                                if self.active_requests[request_id].is_set():
+                                    raise HTTPException(status_code=499, detail="Request cancelled by client")
+                            
+                            yield chunk
+                    self._release_limit(limit_slot, latency=ttft)
+                    return
+                except RateLimitError as e:
+                    # Rate limits are reported on open, before anything was yielded
+                    if not first_chunk or not self._fail_over(key, e, request_id, attempts_left):
+                        self._release_limit(limit_slot, error=e)
+                        raise
+                except BaseException as e:
+                    self._release_limit(limit_slot, error=e)
+                    raise
+                finally:
+                    self.key_pool.release(key)
                 
+        except HTTPException:
+            raise
         except AuthenticationError as e:
             detail = self.classify_openai_error(str(e))
             log_id = self._extract_tt_logid(e)
@@ -250,6 +456,48 @@ class OpenAIClient:
         # Default: return original message
         return str(error_detail)
     
+    def limit_for(self, model: str) -> Optional[AdaptiveLimit]:
+        """Adaptive concurrency limit of `model` on this upstream (None when disabled)."""
+        if self.adaptive_limit is None:
+            return None
+        limit = self.limits.get(model)
+        if limit is None:
+            limit = self.limits[model] = AdaptiveLimit(**self.adaptive_limit)
+        return limit
+
+    async def _acquire_limit(
+        self, request: Dict[str, Any], cancel_event: Optional[asyncio.Event]
+    ) -> Optional[Tuple[AdaptiveLimit, float]]:
+        limit = self.limit_for(request.get("model", ""))
+        if limit is None:
+            return None
+        return limit, await limit.acquire(cancel_event, timeout=self.timeout)
+
+    @staticmethod
+    def _release_limit(
+        slot: Optional[Tuple[AdaptiveLimit, float]],
+        latency: Optional[float] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Feed the outcome of a call back into its adaptive limit."""
+        if slot is None:
+            return
+        limit, granted_at = slot
+        if error is None:
+            limit.on_success(granted_at, latency)
+            return
+        status_code = getattr(error, "status_code", None)
+        if isinstance(error, RateLimitError):
+            response = getattr(error, "response", None)
+            limit.on_overload(granted_at, parse_retry_after(getattr(response, "headers", None)))
+        elif isinstance(error, (APIConnectionError, APITimeoutError)) or (
+            isinstance(error, APIError) and (status_code or 500) >= 500
+        ):
+            limit.on_overload(granted_at)
+        else:
+            # Cancellations and request errors say nothing about upstream capacity
+            limit.on_ignore()
+
     def cancel_request(self, request_id: str) -> bool:
         """Cancel an active request by request_id."""
         if request_id in self.active_requests:
@@ -9,14 +9,22 @@ class Config:
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
         self.ark_api_key = os.environ.get("ARK_API_KEY")
         
+        # Optional pool of upstream keys (comma-separated), spread by least load
+        self.openai_api_keys = [
+            key.strip() for key in os.environ.get("OPENAI_API_KEYS", "").split(",") if key.strip()
+        ]
+        
         # Use ARK_API_KEY if available and base_url is ARK, otherwise use OPENAI_API_KEY
         base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
         if "ark-cn-beijing.bytedance.net" in base_url and self.ark_api_key:
             self.api_key = self.ark_api_key
         elif self.openai_api_key:
             self.api_key = self.openai_api_key
+        elif self.openai_api_keys:
+            self.api_key = self.openai_api_keys[0]
         else:
             raise ValueError("No valid API key found. Set either OPENAI_API_KEY or ARK_API_KEY")
+        self.upstream_api_keys = self.openai_api_keys or [self.api_key]
         
         # Add Anthropic API key for client validation
         self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
@@ -27,13 +35,95 @@ class Config:
         self.azure_api_version = os.environ.get("AZURE_API_VERSION")  # For Azure OpenAI
         self.host = os.environ.get("HOST", "0.0.0.0")
         self.port = int(os.environ.get("PORT", "8082"))
+        # Worker processes; with REUSE_PORT each binds its own SO_REUSEPORT socket
+        self.workers = max(1, int(os.environ.get("WORKERS", "1")))
+        self.reuse_port = os.environ.get("REUSE_PORT", "false").lower() in ["true", "1"]
+        # Where key benches and client rate-limit (admission) buckets live: "memory" (per process) or "unix" (shared by workers)
+        self.state_backend = os.environ.get("STATE_BACKEND", "unix" if self.workers > 1 else "memory").lower()
+        self.state_socket_path = os.environ.get("STATE_SOCKET_PATH", f"/tmp/claude-code-proxy-{self.port}.sock")
         self.log_level = os.environ.get("LOG_LEVEL", "INFO")
+        # Longest string kept verbatim in DEBUG payload traces (base64 images are always redacted)
+        self.trace_max_string_chars = int(os.environ.get("TRACE_MAX_STRING_CHARS", "2000"))
         self.max_tokens_limit = int(os.environ.get("MAX_TOKENS_LIMIT", "4096"))
         self.min_tokens_limit = int(os.environ.get("MIN_TOKENS_LIMIT", "100"))
 
         # Connection settings
         self.request_timeout = int(os.environ.get("REQUEST_TIMEOUT", "90"))
         self.max_retries = int(os.environ.get("MAX_RETRIES", "2"))
+        # How long a key that got a 429 without Retry-After stays out of the pool
+        self.key_bench_seconds = float(os.environ.get("KEY_BENCH_SECONDS", "20"))
+
+        # AIMD concurrency limit per upstream model, driven by 429/5xx, TTFT and Retry-After
+        self.adaptive_concurrency = os.environ.get("ADAPTIVE_CONCURRENCY", "false").lower() in ["true", "1"]
+        self.adaptive_limit = {
+            "initial": float(os.environ.get("ADAPTIVE_CONCURRENCY_INITIAL", "16")),
+            "min_limit": float(os.environ.get("ADAPTIVE_CONCURRENCY_MIN", "1")),
+            "max_limit": float(os.environ.get("ADAPTIVE_CONCURRENCY_MAX", "256")),
+            "latency_tolerance": float(os.environ.get("ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE", "2.0")),
+        } if self.adaptive_concurrency else None
+
+        # Circuit breaker per upstream and mapped model: fail fast (or use the fallback model) while open
+        self.circuit_breaker = {
+            "failure_threshold": int(os.environ.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5")),
+            "open_seconds": float(os.environ.get("CIRCUIT_BREAKER_OPEN_SECONDS", "30")),
+        } if os.environ.get("CIRCUIT_BREAKER", "false").lower() in ["true", "1"] else None
+        # Mapped model -> fallback model, for models without a <TIER>_MODEL_FALLBACKS chain
+        self.circuit_breaker_fallbacks = self._load_json_object("CIRCUIT_BREAKER_FALLBACKS")
+
+        # Upstream HTTP connection pool (one per upstream, shared by its keys)
+        self.upstream_max_connections = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", "100"))
+        self.upstream_max_keepalive_connections = int(os.environ.get("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.upstream_keepalive_expiry = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+        self.upstream_http2 = os.environ.get("UPSTREAM_HTTP2", "false").lower() in ["true", "1"]
+        self.upstream_prewarm_connections = int(os.environ.get("UPSTREAM_PREWARM_CONNECTIONS", "0"))
+
+        # Token counting settings (tiktoken vocabularies are read from disk only)
+        self.tokenizer_vocab_dir = os.environ.get(
+            "TOKENIZER_VOCAB_DIR",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tokenizers"),
+        )
+        self.tokenizer_encoding = os.environ.get("TOKENIZER_ENCODING", "o200k_base")
+        self.token_count_cache_size = int(os.environ.get("TOKEN_COUNT_CACHE_SIZE", "4096"))
+
+        # Converted messages memoized by content hash, so each turn only converts new messages
+        self.conversion_cache_size = int(os.environ.get("CONVERSION_CACHE_SIZE", "4096"))
+        self.conversion_cache_max_bytes = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        # Image data URLs interned by content so repeated screenshots share one string
+        self.image_cache_max_bytes = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+        # Per-model image downscaling / recompression (JSON object, see src/conversion/image_policy.py)
+        self.image_policies = self._load_json_object("IMAGE_POLICIES")
+        self.image_policy_workers = int(os.environ.get("IMAGE_POLICY_WORKERS", "2"))
+        self.image_policy_cache_size = int(os.environ.get("IMAGE_POLICY_CACHE_SIZE", "256"))
+        self.image_policy_cache_max_bytes = int(os.environ.get("IMAGE_POLICY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+        # Parse /v1/messages bodies with a light dict-based validator instead of the pydantic models
+        self.fast_request_parsing = os.environ.get("FAST_REQUEST_PARSING", "false").lower() in ["true", "1"]
+
+        # Resume streams that break mid-way by re-issuing them with the partial text as prefix
+        self.stream_resume = os.environ.get("STREAM_RESUME", "false").lower() in ["true", "1"]
+        self.stream_resume_extra_body = self._load_json_object("STREAM_RESUME_EXTRA_BODY")
+
+        # Hedged requests for buffered mode (opt-in per model, "*" for all)
+        self.hedge_models = [
+            model.strip() for model in os.environ.get("HEDGE_MODELS", "").split(",") if model.strip()
+        ]
+        self.hedge_percentile = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+        self.hedge_min_delay = float(os.environ.get("HEDGE_MIN_DELAY", "0.5"))
+        self.hedge_min_samples = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+
+        # Exact-match cache for deterministic (temperature 0) responses, scoped per client key
+        self.response_cache_enabled = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() in ["true", "1"]
+        self.response_cache_max_entries = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+        self.response_cache_ttl = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+
+        # Admission control: requests in flight across all client keys (0 = unlimited) and
+        # how long an over-limit request may wait in the fair queue before it gets a 429
+        self.max_concurrent_requests = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "0"))
+        self.admission_queue_timeout = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+        # Share one upstream call among identical concurrent requests
+        self.request_coalescing = os.environ.get("REQUEST_COALESCING", "false").lower() in ["true", "1"]
 
         # Streaming mode settings
         self.default_streaming_mode = self._load_default_streaming_mode()
@@ -43,9 +133,22 @@ class Config:
         self.big_model = os.environ.get("BIG_MODEL", "gpt-4o")
         self.middle_model = os.environ.get("MIDDLE_MODEL", self.big_model)
         self.small_model = os.environ.get("SMALL_MODEL", "gpt-4o-mini")
+
+        # Ordered fallback chains per tier (comma-separated) and per-model time-to-first-token budgets
+        self.big_fallbacks = self._load_model_list("BIG_MODEL_FALLBACKS")
+        self.middle_fallbacks = self._load_model_list("MIDDLE_MODEL_FALLBACKS", self.big_fallbacks)
+        self.small_fallbacks = self._load_model_list("SMALL_MODEL_FALLBACKS")
+        self.model_ttft_budgets = {
+            model: float(seconds) for model, seconds in self._load_json_object("MODEL_TTFT_BUDGETS").items()
+        }
         
         # Multi-API-Key to model mapping
         self.api_key_model_mapping = self._load_api_key_model_mapping()
+
+        # Upstream backends and latency-aware routing between them
+        self.upstreams = self._load_upstreams()
+        self.router_ewma_alpha = float(os.environ.get("ROUTER_EWMA_ALPHA", "0.3"))
+        self.router_probe_interval = float(os.environ.get("ROUTER_PROBE_INTERVAL", "30"))
         
     def _load_api_key_model_mapping(self):
         """
@@ -56,6 +159,17 @@ class Config:
         API_KEY_MODEL_MAPPING_<KEY_ID>_MIDDLE="model-name"  
         API_KEY_MODEL_MAPPING_<KEY_ID>_SMALL="model-name"
         API_KEY_MODEL_MAPPING_<KEY_ID>_API_KEY="actual-api-key"
+
+        Optional admission control per key (see src/core/admission.py):
+        API_KEY_MODEL_MAPPING_<KEY_ID>_MAX_CONCURRENCY="4"
+        API_KEY_MODEL_MAPPING_<KEY_ID>_RATE_LIMIT_RPM="120"
+        API_KEY_MODEL_MAPPING_<KEY_ID>_BURST="20"
+        API_KEY_MODEL_MAPPING_<KEY_ID>_WEIGHT="2"
+
+        Optional fallback chains per tier (default: <TIER>_MODEL_FALLBACKS):
+        API_KEY_MODEL_MAPPING_<KEY_ID>_BIG_FALLBACKS="model-a,model-b"
+        API_KEY_MODEL_MAPPING_<KEY_ID>_MIDDLE_FALLBACKS="model-a"
+        API_KEY_MODEL_MAPPING_<KEY_ID>_SMALL_FALLBACKS="model-c"
         
         Returns a dict mapping API keys to model configurations.
         """
@@ -76,15 +190,125 @@ class Config:
                 # Get ignore temperature setting for this API key
                 ignore_temperature = os.environ.get(f"API_KEY_MODEL_MAPPING_{key_id}_IGNORE_TEMPERATURE", "")
                 
+                max_concurrency = os.environ.get(f"API_KEY_MODEL_MAPPING_{key_id}_MAX_CONCURRENCY")
+                rate_limit_rpm = os.environ.get(f"API_KEY_MODEL_MAPPING_{key_id}_RATE_LIMIT_RPM")
+                burst = os.environ.get(f"API_KEY_MODEL_MAPPING_{key_id}_BURST")
+
+                big_fallbacks = self._load_model_list(f"API_KEY_MODEL_MAPPING_{key_id}_BIG_FALLBACKS", self.big_fallbacks)
+                middle_fallbacks = self._load_model_list(f"API_KEY_MODEL_MAPPING_{key_id}_MIDDLE_FALLBACKS", big_fallbacks)
+                small_fallbacks = self._load_model_list(f"API_KEY_MODEL_MAPPING_{key_id}_SMALL_FALLBACKS", self.small_fallbacks)
+                
                 mapping[api_key] = {
+                    "key_id": key_id,
                     "big_model": big_model,
                     "middle_model": middle_model,
                     "small_model": small_model,
-                    "ignore_temperature": ignore_temperature.lower() in ["true", "1"]
+                    "big_fallbacks": big_fallbacks,
+                    "middle_fallbacks": middle_fallbacks,
+                    "small_fallbacks": small_fallbacks,
+                    "ignore_temperature": ignore_temperature.lower() in ["true", "1"],
+                    "max_concurrency": int(max_concurrency) if max_concurrency else None,
+                    "rate_limit_rpm": float(rate_limit_rpm) if rate_limit_rpm else None,
+                    "burst": float(burst) if burst else None,
+                    "weight": float(os.environ.get(f"API_KEY_MODEL_MAPPING_{key_id}_WEIGHT", "1")),
                 }
 
         return mapping
 
+    def _load_model_list(self, name: str, default: list = None) -> list:
+        raw = os.environ.get(name)
+        if raw is None:
+            return list(default or [])
+        return [model.strip() for model in raw.split(",") if model.strip()]
+
+    def _load_json_object(self, name: str) -> dict:
+        raw = os.environ.get(name)
+        if not raw:
+            return {}
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as exc:
+            print(f"Warning: Failed to parse {name} as JSON: {exc}")
+            return {}
+        if not isinstance(data, dict):
+            print(f"Warning: {name} must be a JSON object.")
+            return {}
+        return data
+
+    def _load_upstreams(self) -> list:
+        """
+        Load upstream backends from the UPSTREAMS environment variable.
+
+        UPSTREAMS is a JSON list of objects:
+        {"name": "azure-east", "base_url": "https://...", "api_key_env": "AZURE_EAST_KEY",
+         "api_version": "2024-06-01", "models": ["gpt-4o"]}
+
+        `api_key` / `api_keys` may be given inline instead of `api_key_env`; without
+        any, the default OPENAI_API_KEY(S) are used. `models` is a list of mapped
+        model names or an object renaming them for that upstream (Azure deployment,
+        ARK endpoint id); omit it to serve every model.
+
+        Without UPSTREAMS a single upstream is built from OPENAI_BASE_URL.
+        """
+        default = {
+            "name": "default",
+            "base_url": self.openai_base_url,
+            "api_keys": self.upstream_api_keys,
+            "api_version": self.azure_api_version,
+            "models": None,
+        }
+
+        raw = os.environ.get("UPSTREAMS")
+        if not raw:
+            return [default]
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as exc:
+            print(f"Warning: Failed to parse UPSTREAMS as JSON: {exc}. Using OPENAI_BASE_URL only.")
+            return [default]
+        if not isinstance(data, list):
+            print("Warning: UPSTREAMS must be a JSON list of upstream objects. Using OPENAI_BASE_URL only.")
+            return [default]
+
+        upstreams = []
+        for index, entry in enumerate(data):
+            if not isinstance(entry, dict) or not entry.get("base_url"):
+                print(f"Warning: UPSTREAMS entry {index} has no base_url, skipping.")
+                continue
+
+            api_keys = entry.get("api_keys") or []
+            if isinstance(api_keys, str):
+                api_keys = [key.strip() for key in api_keys.split(",") if key.strip()]
+            if entry.get("api_key"):
+                api_keys = [entry["api_key"]] + list(api_keys)
+            if entry.get("api_key_env"):
+                env_key = os.environ.get(entry["api_key_env"])
+                if env_key:
+                    api_keys = [env_key] + list(api_keys)
+                else:
+                    print(f"Warning: {entry['api_key_env']} referenced by UPSTREAMS entry {index} is not set.")
+
+            models = entry.get("models")
+            if models is not None and not isinstance(models, (list, dict)):
+                print(f"Warning: 'models' of UPSTREAMS entry {index} must be a list or object, serving all models.")
+                models = None
+
+            upstreams.append(
+                {
+                    "name": entry.get("name") or f"upstream-{index}",
+                    "base_url": entry["base_url"],
+                    "api_keys": list(api_keys) or self.upstream_api_keys,
+                    "api_version": entry.get("api_version"),
+                    "models": models,
+                }
+            )
+
+        if not upstreams:
+            print("Warning: UPSTREAMS has no valid entries. Using OPENAI_BASE_URL only.")
+            return [default]
+        print("Upstreams loaded: " + ", ".join(f"{u['name']}={u['base_url']}" for u in upstreams))
+        return upstreams
+
     def _load_default_streaming_mode(self) -> str:
         mode = os.environ.get("DEFAULT_STREAMING_MODE", "stream").strip().lower()
         if mode not in {"stream", "buffered"}:
@@ -173,6 +397,9 @@ class Config:
             "big_model": self.big_model,
             "middle_model": self.middle_model,
             "small_model": self.small_model,
+            "big_fallbacks": self.big_fallbacks,
+            "middle_fallbacks": self.middle_fallbacks,
+            "small_fallbacks": self.small_fallbacks,
             "ignore_temperature": default_ignore_temp
         }
         
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Callable, List, Optional
+
+from fastapi import Request
+
+from src.core.logging import logger
+
+
+class DisconnectWatcher:
+    """Watch one request's ASGI receive channel for `http.disconnect`.
+
+    A single background task blocks on `receive()` for the life of the request,
+    so hot loops only read the `disconnected` flag instead of polling
+    `Request.is_disconnected()` per chunk. Registered callbacks (typically
+    `OpenAIClient.cancel_request`) run once when the client goes away.
+    """
+
+    def __init__(self, http_request: Request, request_id: Optional[str] = None):
+        self._receive = http_request.receive
+        self.request_id = request_id
+        self.event = asyncio.Event()
+        self._callbacks: List[Callable[[], object]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def disconnected(self) -> bool:
+        return self.event.is_set()
+
+    def add_callback(self, callback: Callable[[], object]) -> None:
+        """Run `callback` on disconnect (immediately if already disconnected)."""
+        if self.disconnected:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def start(self) -> "DisconnectWatcher":
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+        return self
+
+    def stop(self) -> None:
+        """Stop watching. Safe to call from `finally` blocks of cancelled tasks."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _watch(self) -> None:
+        try:
+            while True:
+                message = await self._receive()
+                if message.get("type") == "http.disconnect":
+                    break
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            # A broken receive channel means nobody is listening anymore
+            logger.debug(f"Request {self.request_id}: receive channel failed ({e}), treating as disconnect")
+
+        logger.info(f"Request {self.request_id}: client disconnected")
+        self.event.set()
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Request {self.request_id}: disconnect callback failed: {e}")
+        self._callbacks.clear()
@@ -0,0 +1,151 @@
+"""
+Hedged upstream requests for buffered mode.
+
+For opted-in models, a buffered completion that has not answered within the
+model's observed latency percentile gets a duplicate request under its own
+request id. The key pool / upstream router place the duplicate on the
+least-loaded key or backend, the first successful result wins, and the loser is
+cancelled through `OpenAIClient.cancel_request`.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from src.core.config import config
+from src.core.logging import logger
+from src.core.metrics import metrics_registry
+
+T = TypeVar("T")
+
+hedged_requests_total = metrics_registry.counter(
+    "claude_proxy_hedged_requests_total",
+    "Buffered requests that fired a hedge request.",
+    ("model",),
+)
+hedge_wins_total = metrics_registry.counter(
+    "claude_proxy_hedge_wins_total",
+    "Hedged requests answered first by the hedge.",
+    ("model",),
+)
+
+
+class LatencyTracker:
+    """Sliding window of successful upstream latencies per model."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, model: str) -> int:
+        return len(self._samples.get(model, ()))
+
+    def percentile(self, model: str, percentile: float) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(0, math.ceil(percentile / 100.0 * len(ordered)) - 1)
+        return ordered[min(rank, len(ordered) - 1)]
+
+
+class HedgePolicy:
+    def __init__(self, config, tracker: Optional[LatencyTracker] = None):
+        self.models = {model.lower() for model in config.hedge_models}
+        self.percentile = config.hedge_percentile
+        self.min_delay = config.hedge_min_delay
+        self.min_samples = config.hedge_min_samples
+        self.tracker = tracker or LatencyTracker()
+
+    def enabled_for(self, model: str) -> bool:
+        return "*" in self.models or model.lower() in self.models
+
+    def delay_for(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is off or still learning."""
+        if not self.enabled_for(model) or self.tracker.count(model) < self.min_samples:
+            return None
+        return max(self.min_delay, self.tracker.percentile(model, self.percentile))
+
+
+async def run_hedged(
+    call: Callable[[str], Awaitable[T]],
+    request_id: str,
+    model: str,
+    policy: HedgePolicy,
+    cancel: Callable[[str], Any],
+    on_hedge: Optional[Callable[[str], None]] = None,
+) -> T:
+    """Run `call(request_id)`, firing `call(<request_id>-hedge)` if it is slower than the policy allows.
+
+    Successful latencies feed the policy. The first success wins and every other
+    attempt is cancelled via `cancel(attempt_id)`; if all attempts fail the last
+    error is raised.
+    """
+
+    async def timed(attempt_id: str) -> T:
+        started = time.perf_counter()
+        result = await call(attempt_id)
+        policy.tracker.record(model, time.perf_counter() - started)
+        return result
+
+    if not policy.enabled_for(model):
+        return await call(request_id)
+
+    delay = policy.delay_for(model)
+    primary = asyncio.create_task(timed(request_id))
+    if delay is None:
+        return await primary
+
+    attempts: Dict[asyncio.Task, str] = {primary: request_id}
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if not done:
+            hedge_id = f"{request_id}-hedge"
+            logger.info(f"Request {request_id}: no response after {delay:.2f}s, hedging as {hedge_id}")
+            hedged_requests_total.inc(model=model)
+            if on_hedge is not None:
+                on_hedge(hedge_id)
+            attempts[asyncio.create_task(timed(hedge_id))] = hedge_id
+
+        pending = set(attempts)
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        hedge_wins_total.inc(model=model)
+                        logger.info(f"Request {request_id}: hedge {attempts[task]} answered first")
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        await _cancel_losers(attempts, cancel)
+
+
+async def _cancel_losers(attempts: Dict[asyncio.Task, str], cancel: Callable[[str], Any]) -> None:
+    losers: List[asyncio.Task] = [task for task in attempts if not task.done()]
+    for task in losers:
+        # An attempt that has not registered its cancel event yet is cancelled outright
+        if not cancel(attempts[task]):
+            task.cancel()
+    for task in losers:
+        try:
+            await task
+        except (HTTPException, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.debug(f"Cancelled hedge attempt {attempts[task]} ended with: {e}")
+
+
+hedge_policy = HedgePolicy(config)
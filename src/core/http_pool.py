@@ -0,0 +1,173 @@
+"""
+Shared, tunable HTTP connection pool for upstream calls.
+
+One `httpx.AsyncClient` is built per upstream and shared by the SDK clients of
+all its API keys, so connection limits, keep-alive expiry and HTTP/2 apply to
+the upstream as a whole. The transport is instrumented to report:
+
+  - pool wait: time a request spends queued before it gets a connection
+  - new connections: TCP/TLS setups that happened on the request path
+  - active / idle connections and queued requests, read from the pool on scrape
+
+`prewarm()` opens connections at startup so the first burst does not pay for
+handshakes. When orjson is installed, JSON request bodies are encoded straight
+to bytes, skipping the intermediate `str` copy of (image-heavy) payloads.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+import httpx
+
+from src.core.logging import logger
+from src.core.metrics import metrics_registry
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+except ImportError:  # optional dependency
+    h2 = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+pool_wait_seconds = metrics_registry.histogram(
+    "claude_proxy_upstream_pool_wait_seconds",
+    "Time upstream requests wait for a pooled connection.",
+    ("upstream",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+new_connections_total = metrics_registry.counter(
+    "claude_proxy_upstream_pool_new_connections_total",
+    "Upstream connections opened on the request path (TCP/TLS handshakes).",
+    ("upstream",),
+)
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """`AsyncHTTPTransport` that measures connection-pool wait through httpcore trace events.
+
+    httpcore only emits connection events once the pool has assigned a
+    connection to the request, so the first event marks the end of the wait.
+    """
+
+    def __init__(self, upstream: str, max_connections: int, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+        self.max_connections = max_connections
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        queued_at = time.perf_counter()
+        acquired = False
+        upstream = self.upstream
+        inner_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired:
+                acquired = True
+                pool_wait_seconds.observe(time.perf_counter() - queued_at, upstream=upstream)
+            if event_name == "connection.connect_tcp.complete":
+                new_connections_total.inc(upstream=upstream)
+            if inner_trace is not None:
+                await inner_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        return await super().handle_async_request(request)
+
+    def pool_state(self):
+        """(active connections, idle connections, queued requests) of the underlying pool.
+
+        Reads private httpx/httpcore attributes, so returns None instead of failing
+        /metrics and /health when a release renames them.
+        """
+        pool = getattr(self, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        pool_requests = getattr(pool, "_requests", None)
+        if connections is None or pool_requests is None:
+            return None
+        try:
+            connections = list(connections)
+            idle = sum(1 for connection in connections if connection.is_idle())
+            queued = sum(1 for pool_request in list(pool_requests) if pool_request.is_queued())
+        except AttributeError:
+            return None
+        return len(connections) - idle, idle, queued
+
+
+class UpstreamHTTPClient(httpx.AsyncClient):
+    """`AsyncClient` that serializes `json=` bodies with orjson when it is available."""
+
+    def build_request(self, method, url, *, content=None, json=None, headers=None, **kwargs) -> httpx.Request:
+        if json is not None and content is None and orjson is not None:
+            try:
+                content = orjson.dumps(json)
+            except TypeError:
+                pass  # not plain JSON data, let httpx encode it
+            else:
+                json = None
+                headers = httpx.Headers(headers)
+                headers.setdefault("Content-Type", "application/json")
+        return super().build_request(method, url, content=content, json=json, headers=headers, **kwargs)
+
+
+def build_http_client(
+    upstream: str,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    http2: bool = False,
+) -> httpx.AsyncClient:
+    if http2 and h2 is None:
+        logger.warning(f"HTTP/2 requested for upstream '{upstream}' but 'h2' is not installed, using HTTP/1.1")
+        http2 = False
+    transport = InstrumentedTransport(
+        upstream,
+        max_connections,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+    )
+    # Same redirect behaviour as the SDK's default client
+    return UpstreamHTTPClient(transport=transport, follow_redirects=True)
+
+
+def _instrumented_transport(http_client: Optional[httpx.AsyncClient]) -> Optional[InstrumentedTransport]:
+    transport = getattr(http_client, "_transport", None)
+    return transport if isinstance(transport, InstrumentedTransport) else None
+
+
+def pool_state(http_client: Optional[httpx.AsyncClient]):
+    transport = _instrumented_transport(http_client)
+    return transport.pool_state() if transport is not None else None
+
+
+def pool_max_connections(http_client: Optional[httpx.AsyncClient]) -> Optional[int]:
+    transport = _instrumented_transport(http_client)
+    return transport.max_connections if transport is not None else None
+
+
+async def prewarm(http_client: httpx.AsyncClient, base_url: str, connections: int, timeout: float = 10.0) -> int:
+    """Open up to `connections` keep-alive connections to `base_url`; returns how many requests succeeded.
+
+    Concurrent HEAD requests force separate HTTP/1.1 connections (HTTP/2 multiplexes
+    them over one). Any response, even an error status, leaves a warm connection.
+    """
+    if connections <= 0:
+        return 0
+
+    async def touch() -> bool:
+        try:
+            await http_client.head(base_url, timeout=timeout)
+            return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Pre-warming connection to {base_url} failed: {e}")
+            return False
+
+    results = await asyncio.gather(*(touch() for _ in range(connections)))
+    return sum(results)
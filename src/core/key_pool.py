@@ -0,0 +1,220 @@
+"""
+Pool of upstream API keys for one base URL.
+
+Each key has its own SDK client. Requests go to the key with the fewest
+in-flight requests, ties broken by the most remaining rate-limit budget as last
+reported in the `x-ratelimit-remaining-*` response headers. Keys answering 429
+(or reporting an exhausted budget) are benched until `Retry-After` / the reset
+time passes.
+
+With a shared `StateBackend` (several workers) bench deadlines are published to
+it and other workers' benches are picked up at most every `sync_interval`.
+"""
+
+import hashlib
+import math
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.logging import logger
+from src.core.state import StateBackend
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as `1s`, `6m0s` or `20ms` into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait according to `retry-after-ms` / `retry-after`, if present."""
+    if headers is None:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def mask_key(api_key: str) -> str:
+    return f"{api_key[:8]}...{api_key[-4:]}" if len(api_key) > 12 else "****"
+
+
+class PooledKey:
+    """One upstream credential, its SDK client and its last known rate-limit state."""
+
+    def __init__(self, api_key: str, client: Any):
+        self.api_key = api_key
+        self.client = client
+        self.label = mask_key(api_key)
+        # Names the key in shared state without exposing it
+        self.state_id = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        self.in_flight = 0
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.benched_until = 0.0
+        self.total_requests = 0
+        self.rate_limited = 0
+
+    def is_benched(self, now: float) -> bool:
+        return self.benched_until > now
+
+
+class KeyPool:
+    def __init__(
+        self,
+        keys: List[PooledKey],
+        bench_seconds: float = 20.0,
+        clock: Callable[[], float] = time.monotonic,
+        state: Optional[StateBackend] = None,
+        namespace: str = "",
+        sync_interval: float = 0.25,
+    ):
+        if not keys:
+            raise ValueError("KeyPool needs at least one key")
+        self.keys = keys
+        self.bench_seconds = bench_seconds
+        self._clock = clock
+        self.state = state
+        self.namespace = namespace
+        self.sync_interval = sync_interval
+        self._last_sync = float("-inf")
+
+    def _state_key(self, key: PooledKey) -> str:
+        return f"bench:{self.namespace}:{key.state_id}"
+
+    def _publish_bench(self, key: PooledKey) -> None:
+        remaining = key.benched_until - self._clock()
+        if self.state is not None and self.state.shared and remaining > 0:
+            self.state.set_max(self._state_key(key), time.time() + remaining, ttl=remaining)
+
+    def _sync(self) -> None:
+        """Adopt benches published by other workers."""
+        if self.state is None or not self.state.shared:
+            return
+        now = self._clock()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        deadlines = self.state.get_many([self._state_key(key) for key in self.keys])
+        wall_now = time.time()
+        for key in self.keys:
+            deadline = deadlines.get(self._state_key(key))
+            if deadline is not None:
+                key.benched_until = max(key.benched_until, now + deadline - wall_now)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def _score(key: PooledKey):
+        # Unknown budget (no response seen yet) ranks like an untouched key
+        requests = key.remaining_requests if key.remaining_requests is not None else math.inf
+        tokens = key.remaining_tokens if key.remaining_tokens is not None else math.inf
+        return (key.in_flight, -requests, -tokens)
+
+    def acquire(self) -> PooledKey:
+        """Pick the least-loaded usable key and count the request against it.
+
+        When every key is benched the one that comes back first is used, so a
+        single-key pool behaves exactly like a plain client.
+        """
+        self._sync()
+        now = self._clock()
+        available = [key for key in self.keys if not key.is_benched(now)]
+        if available:
+            key = min(available, key=self._score)
+        else:
+            key = min(self.keys, key=lambda k: k.benched_until)
+        key.in_flight += 1
+        key.total_requests += 1
+        return key
+
+    def release(self, key: PooledKey) -> None:
+        key.in_flight = max(0, key.in_flight - 1)
+
+    def has_available(self) -> bool:
+        self._sync()
+        now = self._clock()
+        return any(not key.is_benched(now) for key in self.keys)
+
+    def record_headers(self, key: PooledKey, headers) -> None:
+        """Update the key's budget from `x-ratelimit-*` headers; bench it if exhausted."""
+        if headers is None:
+            return
+        remaining_requests = _parse_int(headers.get("x-ratelimit-remaining-requests"))
+        remaining_tokens = _parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        if remaining_requests is not None:
+            key.remaining_requests = remaining_requests
+        if remaining_tokens is not None:
+            key.remaining_tokens = remaining_tokens
+
+        if remaining_requests == 0:
+            self._bench_until_reset(key, headers.get("x-ratelimit-reset-requests"))
+        elif remaining_tokens == 0:
+            self._bench_until_reset(key, headers.get("x-ratelimit-reset-tokens"))
+
+    def _bench_until_reset(self, key: PooledKey, reset: Optional[str]) -> None:
+        seconds = parse_reset_duration(reset)
+        if seconds:
+            key.benched_until = max(key.benched_until, self._clock() + seconds)
+            self._publish_bench(key)
+
+    def bench(self, key: PooledKey, retry_after: Optional[float] = None) -> None:
+        """Take `key` out of rotation after a 429."""
+        seconds = retry_after if retry_after is not None else self.bench_seconds
+        key.benched_until = max(key.benched_until, self._clock() + seconds)
+        key.rate_limited += 1
+        self._publish_bench(key)
+        # Budget is unknown until the key answers again
+        key.remaining_requests = None
+        key.remaining_tokens = None
+        logger.warning(f"Upstream key {key.label} rate limited, benched for {seconds:.1f}s")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = self._clock()
+        return [
+            {
+                "key": key.label,
+                "in_flight": key.in_flight,
+                "remaining_requests": key.remaining_requests,
+                "remaining_tokens": key.remaining_tokens,
+                "benched_for": round(max(0.0, key.benched_until - now), 2),
+                "total_requests": key.total_requests,
+                "rate_limited": key.rate_limited,
+            }
+            for key in self.keys
+        ]
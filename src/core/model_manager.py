@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from src.core.config import config
 from src.core.context import get_current_api_key
 import logging
@@ -8,39 +10,36 @@ class ModelManager:
     def __init__(self, config):
         self.config = config
     
+    @staticmethod
+    def _is_passthrough(claude_model: str) -> bool:
+        # OpenAI models and other supported models (ARK/Doubao/DeepSeek) are used as-is
+        return claude_model.startswith(("gpt-", "o1-", "ep-", "doubao-", "deepseek-"))
+
+    @staticmethod
+    def _tier_for(claude_model: str) -> Optional[str]:
+        """Tier of a Claude model name ("small", "middle", "big"); None for unknown names."""
+        model_lower = claude_model.lower()
+        if 'haiku' in model_lower:
+            return "small"
+        if 'sonnet' in model_lower:
+            return "middle"
+        if 'opus' in model_lower:
+            return "big"
+        return None
+
     def map_claude_model_to_openai(self, claude_model: str) -> str:
         """Map Claude model names to OpenAI model names based on BIG/SMALL pattern"""
-        # If it's already an OpenAI model, return as-is
-        if claude_model.startswith("gpt-") or claude_model.startswith("o1-"):
-            return claude_model
-
-        # If it's other supported models (ARK/Doubao/DeepSeek), return as-is
-        if (claude_model.startswith("ep-") or claude_model.startswith("doubao-") or 
-            claude_model.startswith("deepseek-")):
+        if self._is_passthrough(claude_model):
             return claude_model
         
         # Get model configuration based on current API key
         current_api_key = get_current_api_key()
         models_config = self.config.get_models_for_api_key(current_api_key)
         
-        # Map based on model naming patterns
-        model_lower = claude_model.lower()
-        mapped_model = None
-        model_type = None
-        
-        if 'haiku' in model_lower:
-            mapped_model = models_config["small_model"]
-            model_type = "SMALL"
-        elif 'sonnet' in model_lower:
-            mapped_model = models_config["middle_model"]
-            model_type = "MIDDLE"
-        elif 'opus' in model_lower:
-            mapped_model = models_config["big_model"]
-            model_type = "BIG"
-        else:
-            # Default to big model for unknown models
-            mapped_model = models_config["big_model"]
-            model_type = "BIG(default)"
+        # Map based on model naming patterns; unknown models default to the big model
+        tier = self._tier_for(claude_model)
+        mapped_model = models_config[f"{tier or 'big'}_model"]
+        model_type = tier.upper() if tier else "BIG(default)"
         
         # Log the model mapping
         masked_key = "****"
@@ -51,4 +50,30 @@ class ModelManager:
         
         return mapped_model
 
+    def fallback_models_for(self, claude_model: str) -> List[str]:
+        """Ordered fallback chain for a Claude model, after the model it maps to.
+
+        Comes from <TIER>_MODEL_FALLBACKS or the client key's
+        API_KEY_MODEL_MAPPING_<ID>_<TIER>_FALLBACKS. Without a tier chain (and for
+        models used as-is) the CIRCUIT_BREAKER_FALLBACKS links of the mapped
+        model are followed instead.
+        """
+        if self._is_passthrough(claude_model):
+            primary, configured = claude_model, []
+        else:
+            models_config = self.config.get_models_for_api_key(get_current_api_key())
+            tier = self._tier_for(claude_model) or "big"
+            primary, configured = models_config[f"{tier}_model"], models_config.get(f"{tier}_fallbacks") or []
+        if not configured:
+            links = self.config.circuit_breaker_fallbacks
+            model = links.get(primary)
+            while model and model != primary and model not in configured:
+                configured.append(model)
+                model = links.get(model)
+        chain = []
+        for model in configured:
+            if model != primary and model not in chain:
+                chain.append(model)
+        return chain
+
 model_manager = ModelManager(config)
\ No newline at end of file
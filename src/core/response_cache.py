@@ -0,0 +1,108 @@
+"""
+Exact-match cache for deterministic upstream responses.
+
+Only requests with `temperature == 0` (and a single choice) are cached. Keys
+are a canonical hash of the converted OpenAI request, the response mode and the
+calling client's API key, so tenants never see each other's entries. Buffered
+entries hold the OpenAI response dict; streaming entries hold the parsed chunk
+dicts of a completed stream, which are replayed through the normal converter.
+Entries are evicted by LRU order, by count and by TTL.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+
+from src.core.config import config
+from src.core.metrics import metrics_registry
+from src.models.openai import OpenAIStreamChunk
+
+# Transport-level fields that do not change the generated content
+_VOLATILE_FIELDS = ("stream", "stream_options", "extra_headers")
+
+cache_requests_total = metrics_registry.counter(
+    "claude_proxy_response_cache_requests_total",
+    "Response cache lookups by mode and result.",
+    ("mode", "result"),
+)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def cacheable(openai_request: Dict[str, Any]) -> bool:
+        return openai_request.get("temperature") == 0 and openai_request.get("n", 1) == 1
+
+    @staticmethod
+    def key_for(openai_request: Dict[str, Any], mode: str, client_api_key: Optional[str]) -> str:
+        canonical = {k: v for k, v in openai_request.items() if k not in _VOLATILE_FIELDS}
+        digest = hashlib.sha256()
+        digest.update(mode.encode())
+        digest.update(b"\0")
+        digest.update((client_api_key or "").encode())
+        digest.update(b"\0")
+        digest.update(
+            json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode(
+                "utf-8", "surrogatepass"
+            )
+        )
+        return digest.hexdigest()
+
+    def get(self, key: str, mode: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            cache_requests_total.inc(mode=mode, result="miss")
+            return None
+        self._entries.move_to_end(key)
+        cache_requests_total.inc(mode=mode, result="hit")
+        return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def record_stream(
+        self, key: str, stream: AsyncIterator[OpenAIStreamChunk]
+    ) -> AsyncGenerator[OpenAIStreamChunk, None]:
+        """Pass `stream` through, caching its chunks only if it runs to completion."""
+        chunks: List[OpenAIStreamChunk] = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        self.put(key, chunks)
+
+    @staticmethod
+    async def replay(chunks: List[OpenAIStreamChunk]) -> AsyncGenerator[OpenAIStreamChunk, None]:
+        for chunk in chunks:
+            yield chunk
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = ResponseCache(
+    config.response_cache_max_entries if config.response_cache_enabled else 0,
+    config.response_cache_ttl,
+)
+
+metrics_registry.gauge(
+    "claude_proxy_response_cache_entries",
+    "Entries in the response cache.",
+    callback=lambda: len(response_cache),
+)
@@ -0,0 +1,188 @@
+"""
+Request coalescing (single-flight) for identical concurrent upstream calls.
+
+While an upstream call is running, byte-identical requests (same converted
+OpenAI request, mode and client API key) attach to it instead of starting
+their own. Buffered waiters share the result; streaming waiters each get every
+chunk from the start, so late joiners see the same stream as the first caller.
+
+The shared call runs under its own request id (`<first request id>-shared`) and
+gets the `Flight` as its disconnect watcher: it is only cancelled once the last
+waiter has disconnected.
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from src.core.logging import logger
+from src.core.metrics import metrics_registry
+
+T = TypeVar("T")
+
+coalesced_requests_total = metrics_registry.counter(
+    "claude_proxy_coalesced_requests_total",
+    "Requests that attached to an identical in-flight upstream call.",
+    ("mode",),
+)
+
+
+class Flight:
+    """One shared upstream call and the clients waiting on it.
+
+    Exposes the `DisconnectWatcher` surface (`event`, `disconnected`,
+    `add_callback`) so the retry, hedging and streaming helpers can run under it
+    unchanged; it "disconnects" when the last waiter leaves.
+    """
+
+    def __init__(self, key: str, request_id: str):
+        self.key = key
+        self.request_id = f"{request_id}-shared"
+        self.waiters = 0
+        self.event = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        # Streaming flights: chunks received so far, woken on every change
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self._callbacks: List[Callable[[], object]] = []
+
+    @property
+    def disconnected(self) -> bool:
+        return self.event.is_set()
+
+    def add_callback(self, callback: Callable[[], object]) -> None:
+        if self.disconnected:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def join(self) -> Callable[[], None]:
+        """Attach a waiter; returns an idempotent `leave` function."""
+        self.waiters += 1
+        left = False
+
+        def leave() -> None:
+            nonlocal left
+            if left:
+                return
+            left = True
+            self.waiters -= 1
+            if self.waiters == 0 and self.task is not None and not self.task.done():
+                self._abandon()
+
+        return leave
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def _abandon(self) -> None:
+        logger.info(f"Shared request {self.request_id}: all waiters left, cancelling upstream call")
+        self.event.set()
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Shared request {self.request_id}: cancel callback failed: {e}")
+        self._callbacks.clear()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _attach(self, key: str, request_id: str, mode: str, start: Callable[[Flight], Awaitable[Any]]) -> Flight:
+        flight = self._flights.get(key)
+        # A flight whose waiters all left is being cancelled; do not join it
+        if flight is not None and not flight.disconnected:
+            coalesced_requests_total.inc(mode=mode)
+            logger.info(f"Request {request_id}: joined in-flight {flight.request_id} ({flight.waiters} waiting)")
+            return flight
+
+        flight = Flight(key, request_id)
+        self._flights[key] = flight
+        flight.task = asyncio.create_task(start(flight))
+        flight.task.add_done_callback(lambda task: self._finished(flight, task))
+        return flight
+
+    def _finished(self, flight: Flight, task: asyncio.Task) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        # Waiters re-raise the error; retrieve it here so an unobserved one is not logged as lost
+        if not task.cancelled():
+            task.exception()
+
+    async def call(
+        self,
+        key: str,
+        request_id: str,
+        disconnect_watcher,
+        fetch: Callable[[Flight], Awaitable[T]],
+    ) -> T:
+        """Return `fetch(flight)`'s result, sharing one call among identical concurrent requests."""
+        flight = self._attach(key, request_id, "buffered", fetch)
+        leave = flight.join()
+        disconnected = asyncio.ensure_future(disconnect_watcher.event.wait())
+        try:
+            await asyncio.wait({flight.task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if flight.task.done():
+                return flight.task.result()
+            raise HTTPException(status_code=499, detail="Client disconnected")
+        finally:
+            disconnected.cancel()
+            leave()
+
+    async def stream(
+        self,
+        key: str,
+        request_id: str,
+        disconnect_watcher,
+        open_stream: Callable[[Flight], AsyncIterator[Any]],
+    ) -> AsyncGenerator[Any, None]:
+        """Yield the chunks of `open_stream(flight)`, broadcast to identical concurrent requests."""
+
+        async def pump(flight: Flight) -> None:
+            try:
+                async for chunk in open_stream(flight):
+                    flight.chunks.append(chunk)
+                    flight.notify()
+            except Exception as e:
+                flight.error = e
+            finally:
+                flight.finished = True
+                flight.notify()
+
+        flight = self._attach(key, request_id, "stream", pump)
+        leave = flight.join()
+        disconnect_watcher.add_callback(leave)
+        try:
+            index = 0
+            while True:
+                changed = flight.changed
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.finished:
+                    if index < len(flight.chunks):
+                        continue
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            leave()
+
+
+single_flight = SingleFlight()
+
+metrics_registry.gauge(
+    "claude_proxy_shared_upstream_calls",
+    "Upstream calls currently shared by coalesced requests.",
+    callback=lambda: len(single_flight),
+)
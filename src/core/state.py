@@ -0,0 +1,318 @@
+"""
+State shared between the worker processes of one proxy instance.
+
+With `WORKERS` > 1 every worker has its own memory, so a key benched after a
+429 in one worker would keep being hammered by the others, and each worker
+would enforce a client key's rate limit on its own. Such state goes through a
+`StateBackend`:
+
+  memory  per-process dict (default; exact for a single worker)
+  unix    a small key/value server on a unix socket, started by the master
+          process and shared by every worker on the host
+
+Values are floats with an optional TTL; deadlines are wall-clock timestamps so
+they mean the same thing in every process. `take` is an atomic token bucket for
+rate limits. On a shared backend reads and writes never block (they go through
+a local mirror synced by a background thread); only `take` makes a round trip.
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from src.core.config import config
+from src.core.logging import logger
+
+
+class StateBackend:
+    """Interface of the shared state store."""
+
+    # True when other processes see the writes, i.e. local copies must be refreshed
+    shared = False
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        """Values of the `keys` that exist and have not expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: float, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def set_max(self, key: str, value: float, ttl: Optional[float] = None) -> float:
+        """Store `max(current, value)` atomically and return the stored value."""
+        raise NotImplementedError
+
+    def take(self, key: str, rate: float, burst: float, tokens: float = 1.0) -> float:
+        """Token bucket: take `tokens` if available and return 0, else return the seconds until they are.
+
+        May block on a shared backend; async callers run it in a thread.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._values: Dict[str, Tuple[float, Optional[float]]] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[float]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._values[key]
+            return None
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        now = self._clock()
+        with self._lock:
+            values = {key: self._live(key, now) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def set(self, key: str, value: float, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (value, self._clock() + ttl if ttl is not None else None)
+
+    def set_max(self, key: str, value: float, ttl: Optional[float] = None) -> float:
+        now = self._clock()
+        with self._lock:
+            current = self._live(key, now)
+            if current is not None and current >= value:
+                return current
+            self._values[key] = (value, now + ttl if ttl is not None else None)
+            return value
+
+    def take(self, key: str, rate: float, burst: float, tokens: float = 1.0) -> float:
+        now = self._clock()
+        with self._lock:
+            available, updated = self._buckets.get(key, (burst, now))
+            available = min(burst, available + (now - updated) * rate)
+            if available >= tokens:
+                self._buckets[key] = (available - tokens, now)
+                return 0.0
+            self._buckets[key] = (available, now)
+        return (tokens - available) / rate if rate > 0 else float("inf")
+
+
+class _StateRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        backend: MemoryStateBackend = self.server.backend
+        for line in self.rfile:
+            try:
+                op, args = json.loads(line)
+                if op not in ("get_many", "set", "set_max", "take"):
+                    raise ValueError(f"unknown operation '{op}'")
+                reply = {"result": getattr(backend, op)(*args)}
+            except Exception as e:
+                reply = {"error": str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class StateServer(socketserver.ThreadingUnixStreamServer):
+    """Serves a `MemoryStateBackend` to the workers over a unix socket (runs in the master process)."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _StateRequestHandler)
+        self.path = path
+        self.backend = MemoryStateBackend()
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="state-server", daemon=True)
+        thread.start()
+        logger.info(f"Shared state server listening on {self.path}")
+        return thread
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class UnixSocketStateBackend(StateBackend):
+    """Client of a `StateServer`, safe to use from the event loop.
+
+    Only `take` talks to the server synchronously, so callers on the event loop
+    run it in a thread (`asyncio.to_thread`). `set` / `set_max` apply locally and
+    are sent by a background thread. `get_many` answers from a local mirror that
+    the same thread refreshes every `refresh_interval` seconds for the keys that
+    have been asked for. While the server is unreachable everything runs on the
+    local state. Reconnects are retried with exponential backoff, up to
+    `max_backoff` seconds apart.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path: str,
+        timeout: float = 1.0,
+        refresh_interval: float = 0.25,
+        max_backoff: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._local = MemoryStateBackend()
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._watched: Dict[str, None] = {}
+        self._pending: "queue.SimpleQueue[Tuple[str, tuple]]" = queue.SimpleQueue()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._backoff = 0.0
+        self._retry_at = float("-inf")
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def _start(self) -> None:
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="state-client", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+            if not self._closed:
+                self.sync()
+
+    def _connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+        self._sock = None
+        self._reader = None
+
+    def _call(self, op: str, *args):
+        """One round trip to the server; None (after scheduling a reconnect) if it is unreachable."""
+        with self._lock:
+            if self._sock is None:
+                if self._clock() < self._retry_at:
+                    return None
+                try:
+                    self._connect()
+                except OSError as e:
+                    self._failed(e)
+                    return None
+                if self._backoff:
+                    logger.info(f"Shared state server at {self.path} reachable again")
+                self._backoff = 0.0
+            try:
+                self._sock.sendall(json.dumps([op, args]).encode() + b"\n")
+                reply = json.loads(self._reader.readline())
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                self._failed(e)
+                return None
+        if "error" in reply:
+            raise ValueError(f"Shared state operation '{op}' failed: {reply['error']}")
+        return reply
+
+    def _failed(self, error: Exception) -> None:
+        if not self._backoff:
+            logger.error(f"Shared state server at {self.path} unavailable, using per-process state: {error}")
+        self._backoff = min(self.max_backoff, self._backoff * 2 or 0.5)
+        self._retry_at = self._clock() + self._backoff
+
+    def sync(self) -> None:
+        """Send queued writes and refresh the mirrored keys (blocking; runs on the background thread)."""
+        while True:
+            try:
+                op, args = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if self._call(op, *args) is None:
+                # Server gone: the writes are in the local state, later ones would be stale anyway
+                while not self._pending.empty():
+                    self._pending.get_nowait()
+                return
+        keys = list(self._watched)
+        if not keys:
+            return
+        reply = self._call("get_many", keys)
+        if reply is None:
+            return
+        for key, value in reply["result"].items():
+            # Expire mirrored values soon after the server stops reporting them
+            self._local.set_max(key, value, ttl=self.refresh_interval * 4)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        keys = list(keys)
+        for key in keys:
+            self._watched[key] = None
+        self._start()
+        return self._local.get_many(keys)
+
+    def set(self, key: str, value: float, ttl: Optional[float] = None) -> None:
+        self._local.set(key, value, ttl)
+        self._send("set", key, value, ttl)
+
+    def set_max(self, key: str, value: float, ttl: Optional[float] = None) -> float:
+        stored = self._local.set_max(key, value, ttl)
+        self._send("set_max", key, value, ttl)
+        return stored
+
+    def _send(self, op: str, *args) -> None:
+        self._pending.put((op, args))
+        self._start()
+        self._wakeup.set()
+
+    def take(self, key: str, rate: float, burst: float, tokens: float = 1.0) -> float:
+        """Atomic across workers; blocks for a round trip, so call it off the event loop."""
+        reply = self._call("take", key, rate, burst, tokens)
+        if reply is None:
+            return self._local.take(key, rate, burst, tokens)
+        return reply["result"]
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout * 2)
+        with self._lock:
+            self._disconnect()
+
+
+def build_state_backend(kind: str, socket_path: str) -> StateBackend:
+    if kind == "unix":
+        return UnixSocketStateBackend(socket_path)
+    if kind != "memory":
+        logger.warning(f"Unknown STATE_BACKEND '{kind}', using memory")
+    return MemoryStateBackend()
+
+
+state_backend = build_state_backend(config.state_backend, config.state_socket_path)
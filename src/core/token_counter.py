@@ -0,0 +1,269 @@
+"""
+Token counting for /v1/messages/count_tokens.
+
+Counts the full converted OpenAI payload (system, messages, tool calls, tool
+results, images and tool schemas) with the tiktoken encoding of the mapped
+model. Vocabularies are only read from `TOKENIZER_VOCAB_DIR`, never fetched
+at request time; when tiktoken or the vocabulary is missing, or the model maps
+to an encoding other than o200k_base/cl100k_base, the counter falls back to the
+4-characters-per-token heuristic.
+
+Populate the vocabulary directory once (e.g. at image build time) with:
+    python -m src.core.token_counter --download
+"""
+
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.config import config
+from src.core.logging import logger
+from src.core.metrics import metrics_registry
+
+try:
+    import tiktoken
+    from tiktoken.load import load_tiktoken_bpe
+except ImportError:  # optional dependency
+    tiktoken = None
+
+# tiktoken caches each vocabulary under sha1(<public blob url>)
+_TIKTOKEN_BLOB_URL = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+
+# Split pattern and special tokens of the encodings chat models map to, as registered
+# by tiktoken_ext.openai_public. The registry constructors can only read the vocabulary
+# through TIKTOKEN_CACHE_DIR, so the Encoding is built here from the local file instead.
+_ENDOFTEXT = "<|endoftext|>"
+_ENDOFPROMPT = "<|endofprompt|>"
+_ENCODING_PARAMS: Dict[str, Dict[str, Any]] = {
+    "cl100k_base": {
+        "pat_str": r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+        "special_tokens": {
+            _ENDOFTEXT: 100257,
+            "<|fim_prefix|>": 100258,
+            "<|fim_middle|>": 100259,
+            "<|fim_suffix|>": 100260,
+            _ENDOFPROMPT: 100276,
+        },
+    },
+    "o200k_base": {
+        "pat_str": "|".join(
+            [
+                r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+                r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+                r"""\p{N}{1,3}""",
+                r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+                r"""\s*[\r\n]+""",
+                r"""\s+(?!\S)""",
+                r"""\s+""",
+            ]
+        ),
+        "special_tokens": {_ENDOFTEXT: 199999, _ENDOFPROMPT: 200018},
+    },
+}
+
+# Per-message framing overhead of the OpenAI chat format
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_NAME = 1
+_REPLY_PRIMING_TOKENS = 3
+# Images are billed by size; without decoding use the cost of a full-size screenshot
+_IMAGE_TOKENS = 1600
+
+
+def _vocab_cache_path(vocab_dir: str, encoding_name: str) -> str:
+    blob_url = _TIKTOKEN_BLOB_URL.format(name=encoding_name)
+    return os.path.join(vocab_dir, hashlib.sha1(blob_url.encode()).hexdigest())
+
+
+def _without_image_data(block: Any) -> Any:
+    """`block` with image parts reduced to their type for the memo key.
+
+    Images count a flat `_IMAGE_TOKENS`, and serializing their data URLs to hash
+    them would cost as much as tokenizing the rest of the message.
+    """
+    content = block.get("content") if isinstance(block, dict) else None
+    if not isinstance(content, list) or not any(
+        isinstance(part, dict) and part.get("type") == "image_url" for part in content
+    ):
+        return block
+    return {
+        **block,
+        "content": [
+            {"type": "image_url"} if isinstance(part, dict) and part.get("type") == "image_url" else part
+            for part in content
+        ],
+    }
+
+
+def load_tiktoken_encoding(encoding_name: str, vocab_dir: str):
+    """Load a tiktoken encoding from `vocab_dir` only. Returns None if unavailable."""
+    params = _ENCODING_PARAMS.get(encoding_name)
+    if tiktoken is None or params is None:
+        return None
+    vocab_path = _vocab_cache_path(vocab_dir, encoding_name)
+    if not os.path.exists(vocab_path):
+        return None
+    return tiktoken.Encoding(
+        name=encoding_name,
+        pat_str=params["pat_str"],
+        mergeable_ranks=load_tiktoken_bpe(vocab_path),
+        special_tokens=params["special_tokens"],
+    )
+
+
+class TokenCounter:
+    """Counts prompt tokens of converted OpenAI requests with per-model encoders.
+
+    Conversations grow by a message or two per turn, so per-message and tool-schema
+    counts are memoized in a bounded LRU keyed by content hash and only new
+    messages are tokenized.
+    """
+
+    def __init__(self, config, loader: Optional[Callable[[str, str], Any]] = None):
+        self.config = config
+        self.loader = loader or load_tiktoken_encoding
+        self._encoding_names: Dict[str, str] = {}
+        self._encoders: Dict[str, Any] = {}
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def encoding_name_for_model(self, model: str) -> str:
+        name = self._encoding_names.get(model)
+        if name is None:
+            name = self.config.tokenizer_encoding
+            if tiktoken is not None and model:
+                try:
+                    name = tiktoken.encoding_name_for_model(model)
+                except KeyError:
+                    pass
+            self._encoding_names[model] = name
+        return name
+
+    def get_encoder(self, model: str):
+        """Return the cached encoder for `model`, loading it lazily on first use."""
+        name = self.encoding_name_for_model(model)
+        if name not in self._encoders:
+            encoder = None
+            try:
+                encoder = self.loader(name, self.config.tokenizer_vocab_dir)
+            except Exception as e:
+                logger.warning(f"Failed to load tokenizer '{name}': {e}")
+            if encoder is None:
+                logger.info(f"Tokenizer '{name}' unavailable, using character heuristic for token counts")
+            self._encoders[name] = encoder
+        return self._encoders[name]
+
+    def count_request(self, openai_request: Dict[str, Any]) -> int:
+        encoder = self.get_encoder(openai_request.get("model", ""))
+        encoding_name = self.encoding_name_for_model(openai_request.get("model", ""))
+        total = _REPLY_PRIMING_TOKENS
+        for message in openai_request.get("messages", []):
+            total += self._cached_count(encoding_name, message, encoder, self.count_message)
+        if openai_request.get("tools"):
+            total += self._cached_count(encoding_name, openai_request["tools"], encoder, self.count_tools)
+        return max(1, total)
+
+    def _cached_count(self, encoding_name: str, block: Any, encoder, count_fn) -> int:
+        # The heuristic is cheaper than hashing, only memoize real tokenization
+        if encoder is None or self.config.token_count_cache_size <= 0:
+            return count_fn(block, encoder)
+
+        digest = hashlib.sha1(
+            json.dumps(_without_image_data(block), sort_keys=True, ensure_ascii=False).encode("utf-8", "surrogatepass")
+        ).digest()
+        key = (encoding_name, digest)
+        count = self._cache.get(key)
+        if count is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return count
+
+        self.cache_misses += 1
+        count = count_fn(block, encoder)
+        self._cache[key] = count
+        if len(self._cache) > self.config.token_count_cache_size:
+            self._cache.popitem(last=False)
+        return count
+
+    def cache_stats(self) -> Dict[str, Any]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "entries": len(self._cache),
+            "max_entries": self.config.token_count_cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def count_message(self, message: Dict[str, Any], encoder) -> int:
+        total = _TOKENS_PER_MESSAGE + self.count_text(message.get("role", ""), encoder)
+
+        content = message.get("content")
+        if isinstance(content, str):
+            total += self.count_text(content, encoder)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += self.count_text(part.get("text", ""), encoder)
+                elif part.get("type") == "image_url":
+                    total += _IMAGE_TOKENS
+
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            total += _TOKENS_PER_MESSAGE + _TOKENS_PER_NAME
+            total += self.count_text(function.get("name", ""), encoder)
+            total += self.count_text(function.get("arguments", ""), encoder)
+
+        if message.get("tool_call_id"):
+            total += _TOKENS_PER_NAME
+        return total
+
+    def count_tools(self, tools: List[Dict[str, Any]], encoder) -> int:
+        return self.count_text(json.dumps(tools, ensure_ascii=False), encoder)
+
+    @staticmethod
+    def count_text(text: str, encoder) -> int:
+        if not text:
+            return 0
+        if encoder is None:
+            return len(text) // 4
+        return len(encoder.encode(text, disallowed_special=()))
+
+
+token_counter = TokenCounter(config)
+
+metrics_registry.gauge(
+    "claude_proxy_token_count_cache_hits_total",
+    "Token count cache hits.",
+    callback=lambda: token_counter.cache_hits,
+    type_name="counter",
+)
+metrics_registry.gauge(
+    "claude_proxy_token_count_cache_misses_total",
+    "Token count cache misses.",
+    callback=lambda: token_counter.cache_misses,
+    type_name="counter",
+)
+metrics_registry.gauge(
+    "claude_proxy_token_count_cache_entries",
+    "Entries in the token count cache.",
+    callback=lambda: len(token_counter._cache),
+)
+
+
+if __name__ == "__main__":
+    if "--download" not in sys.argv:
+        print("Usage: python -m src.core.token_counter --download [encoding ...]")
+        sys.exit(1)
+    if tiktoken is None:
+        print("tiktoken is not installed (pip install tiktoken)")
+        sys.exit(1)
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or ["o200k_base", "cl100k_base"]
+    os.makedirs(config.tokenizer_vocab_dir, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = config.tokenizer_vocab_dir
+    for encoding_name in names:
+        tiktoken.get_encoding(encoding_name)
+        print(f"Saved {encoding_name} to {config.tokenizer_vocab_dir}")
@@ -0,0 +1,548 @@
+"""
+Routing of mapped models across several OpenAI-compatible upstreams.
+
+Each upstream (an Azure region, an ARK endpoint, a local vLLM, ...) has its own
+`OpenAIClient` and serves a set of models. For every (upstream, model) pair the
+router keeps an EWMA of observed time-to-first-token (streams), of the total
+latency of buffered calls, and of the error rate, and sends each request to the
+candidate with the lowest expected cost:
+
+    cost = ewma_latency * (in_flight + 1) * (1 + error_penalty * error_rate)
+
+where ewma_latency is the TTFT EWMA for a stream and the buffered latency EWMA
+for a buffered call (a buffered call's latency mostly measures output length,
+so the two are never mixed), so traffic drifts away from an upstream as soon as
+it slows down or fails, and concurrent requests spread instead of piling onto
+the single fastest backend. A candidate that has not been picked for
+`probe_interval` seconds is sent one request so its statistics recover once it
+is healthy again.
+
+With circuit breakers enabled, candidates whose circuit is open are skipped;
+when every upstream serving a model is open the request fails fast with a 503
+(`X-Circuit-Breaker: open`), which moves it on to the next model of its
+fallback chain (see `ModelManager.fallback_models_for`).
+"""
+
+import math
+import time
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.core.circuit_breaker import STATE_VALUES, CircuitBreaker, is_outage
+from src.core.client import OpenAIClient
+from src.core.http_pool import build_http_client, pool_max_connections, pool_state, prewarm
+from src.core.logging import logger
+from src.core.metrics import RequestTimer
+from src.core.state import state_backend
+from src.models.openai import OpenAIStreamChunk
+
+
+def is_upstream_failure(status_code: int) -> bool:
+    """Errors that say something about the upstream rather than the request."""
+    return status_code == 429 or status_code >= 500 or status_code in {401, 403, 404, 408}
+
+
+class Upstream:
+    """One backend: its client and the models it serves.
+
+    `models` is None (serves everything), a list of model names, or a mapping
+    of mapped model name to the name this upstream knows it by (e.g. an Azure
+    deployment or ARK endpoint id).
+    """
+
+    def __init__(self, name: str, client: OpenAIClient, models=None):
+        self.name = name
+        self.client = client
+        if isinstance(models, (list, tuple)):
+            models = {model: model for model in models}
+        self.models: Optional[Dict[str, str]] = models
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def prepare(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Shallow copy of `request` addressed to this upstream's model name."""
+        prepared = dict(request)
+        if self.models is not None:
+            prepared["model"] = self.models.get(request.get("model", ""), request.get("model", ""))
+        return prepared
+
+
+class RouteStats:
+    __slots__ = ("ttft", "latency", "error_rate", "in_flight", "requests", "errors", "last_selected")
+
+    def __init__(self):
+        self.ttft: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_selected = float("-inf")
+
+
+class UpstreamRouter:
+    """Picks an upstream per request; exposes the same call surface as `OpenAIClient`."""
+
+    def __init__(
+        self,
+        upstreams: List[Upstream],
+        alpha: float = 0.3,
+        error_penalty: float = 10.0,
+        default_ttft: float = 1.0,
+        probe_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        circuit_breaker: Optional[Dict[str, float]] = None,
+    ):
+        if not upstreams:
+            raise ValueError("UpstreamRouter needs at least one upstream")
+        # CircuitBreaker settings (None: disabled)
+        self.circuit_breaker = circuit_breaker
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self.upstreams = upstreams
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.default_ttft = default_ttft
+        self.probe_interval = probe_interval
+        self._clock = clock
+        self._stats: Dict[Tuple[str, str], RouteStats] = {}
+
+    @classmethod
+    def from_config(cls, config) -> "UpstreamRouter":
+        upstreams = [
+            Upstream(
+                spec["name"],
+                OpenAIClient(
+                    spec["api_keys"][0],
+                    spec["base_url"],
+                    config.request_timeout,
+                    api_version=spec.get("api_version"),
+                    api_keys=spec["api_keys"],
+                    key_bench_seconds=config.key_bench_seconds,
+                    state=state_backend,
+                    name=spec["name"],
+                    adaptive_limit=config.adaptive_limit,
+                    http_client=build_http_client(
+                        spec["name"],
+                        max_connections=config.upstream_max_connections,
+                        max_keepalive_connections=config.upstream_max_keepalive_connections,
+                        keepalive_expiry=config.upstream_keepalive_expiry,
+                        http2=config.upstream_http2,
+                    ),
+                ),
+                spec.get("models"),
+            )
+            for spec in config.upstreams
+        ]
+        return cls(
+            upstreams,
+            alpha=config.router_ewma_alpha,
+            probe_interval=config.router_probe_interval,
+            circuit_breaker=config.circuit_breaker,
+        )
+
+    def stats_for(self, upstream: Upstream, model: str) -> RouteStats:
+        key = (upstream.name, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = RouteStats()
+        return stats
+
+    def cost(self, upstream: Upstream, model: str, stream: bool = True) -> float:
+        stats = self.stats_for(upstream, model)
+        latency = stats.ttft if stream else stats.latency
+        if latency is None:
+            latency = self.default_ttft
+        return latency * (stats.in_flight + 1) * (1 + self.error_penalty * stats.error_rate)
+
+    def breaker_for(self, upstream: Upstream, model: str) -> Optional[CircuitBreaker]:
+        if self.circuit_breaker is None:
+            return None
+        key = (upstream.name, model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(**self.circuit_breaker, clock=self._clock)
+        return breaker
+
+    def _available(self, upstream: Upstream, model: str) -> bool:
+        breaker = self.breaker_for(upstream, model)
+        return breaker is None or breaker.available()
+
+    def select(self, model: str, stream: bool = True) -> Optional[Upstream]:
+        """Cheapest upstream for `model`; None if all of them have an open circuit."""
+        candidates = [upstream for upstream in self.upstreams if upstream.serves(model)]
+        if not candidates:
+            raise HTTPException(status_code=404, detail=f"No upstream configured for model '{model}'")
+        candidates = [upstream for upstream in candidates if self._available(upstream, model)]
+        if not candidates:
+            return None
+
+        now = self._clock()
+        chosen = None
+        if len(candidates) > 1:
+            # Re-measure candidates that lost all traffic so they can win it back
+            # (never-used candidates count as stale, so each one is measured once up front)
+            stale = [
+                upstream for upstream in candidates
+                if now - self.stats_for(upstream, model).last_selected >= self.probe_interval
+            ]
+            if stale:
+                chosen = min(stale, key=lambda upstream: self.stats_for(upstream, model).last_selected)
+        if chosen is None:
+            chosen = min(candidates, key=lambda upstream: self.cost(upstream, model, stream))
+
+        self.stats_for(chosen, model).last_selected = now
+        return chosen
+
+    def record_success(self, upstream: Upstream, model: str, latency: float, stream: bool = True) -> None:
+        """Feed a stream's time to first token, or a buffered call's total latency."""
+        stats = self.stats_for(upstream, model)
+        if stream:
+            stats.ttft = latency if stats.ttft is None else stats.ttft + self.alpha * (latency - stats.ttft)
+        else:
+            stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+        stats.error_rate -= self.alpha * stats.error_rate
+
+    def record_failure(self, upstream: Upstream, model: str) -> None:
+        stats = self.stats_for(upstream, model)
+        stats.errors += 1
+        stats.error_rate += self.alpha * (1.0 - stats.error_rate)
+
+    def _begin(self, upstream: Upstream, model: str) -> RouteStats:
+        stats = self.stats_for(upstream, model)
+        stats.in_flight += 1
+        stats.requests += 1
+        return stats
+
+    def route(self, model: str, stream: bool = True) -> Upstream:
+        """Upstream to send a request for `model` to; a 503 if every circuit for it is open."""
+        upstream = self.select(model, stream)
+        if upstream is not None:
+            return upstream
+        retry_after = min(
+            breaker.retry_after() for (name, breaker_model), breaker in self._breakers.items() if breaker_model == model
+        )
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model '{model}' is temporarily unavailable (circuit breaker open). Please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after))), "X-Circuit-Breaker": "open"},
+        )
+
+    def _begin_route(
+        self, request: Dict[str, Any], stream: bool
+    ) -> Tuple[Upstream, str, Optional[CircuitBreaker], bool]:
+        model = request.get("model", "")
+        upstream = self.route(model, stream)
+        breaker = self.breaker_for(upstream, model)
+        probe = breaker.begin() if breaker is not None else False
+        return upstream, model, breaker, probe
+
+    def _record_error(self, upstream: Upstream, model: str, exc: HTTPException) -> None:
+        if is_upstream_failure(exc.status_code):
+            self.record_failure(upstream, model)
+            logger.warning(
+                f"Upstream {upstream.name} failed for model={model} (status={exc.status_code}), "
+                f"error_rate={self.stats_for(upstream, model).error_rate:.2f}"
+            )
+
+    @staticmethod
+    def _elapsed(started: float, timer: RequestTimer, limit_wait: float) -> float:
+        """Time since `started` minus the time the call queued for the upstream's adaptive limit.
+
+        A throttled upstream would otherwise look slow and be routed away from,
+        which in turn moves its AIMD limit.
+        """
+        return time.perf_counter() - started - (timer.stages.get("upstream_limit", 0.0) - limit_wait)
+
+    async def create_chat_completion(
+        self, request: Dict[str, Any], request_id: Optional[str] = None, timer: Optional[RequestTimer] = None
+    ) -> Dict[str, Any]:
+        upstream, model, breaker, probe = self._begin_route(request, stream=False)
+        stats = self._begin(upstream, model)
+        # The client reports its adaptive limit wait through the timer
+        timer = timer if timer is not None else RequestTimer()
+        started = time.perf_counter()
+        limit_wait = timer.stages.get("upstream_limit", 0.0)
+        healthy: Optional[bool] = None
+        try:
+            response = await upstream.client.create_chat_completion(upstream.prepare(request), request_id, timer)
+            healthy = True
+        except HTTPException as exc:
+            self._record_error(upstream, model, exc)
+            if is_outage(exc.status_code):
+                healthy = False
+            raise
+        finally:
+            stats.in_flight -= 1
+            self._record_breaker(upstream, model, breaker, probe, healthy)
+        # A buffered call only reveals its total latency, which is tracked apart from TTFT
+        self.record_success(upstream, model, self._elapsed(started, timer, limit_wait), stream=False)
+        return response
+
+    async def create_chat_completion_stream(
+        self, request: Dict[str, Any], request_id: Optional[str] = None, timer: Optional[RequestTimer] = None
+    ) -> AsyncGenerator[OpenAIStreamChunk, None]:
+        upstream, model, breaker, probe = self._begin_route(request, stream=True)
+        stats = self._begin(upstream, model)
+        timer = timer if timer is not None else RequestTimer()
+        started = time.perf_counter()
+        limit_wait = timer.stages.get("upstream_limit", 0.0)
+        first_chunk = True
+        healthy: Optional[bool] = None
+        try:
+            async for chunk in upstream.client.create_chat_completion_stream(
+                upstream.prepare(request), request_id, timer
+            ):
+                if first_chunk:
+                    first_chunk = False
+                    healthy = True
+                    self.record_success(upstream, model, self._elapsed(started, timer, limit_wait))
+                yield chunk
+            if first_chunk:
+                healthy = True
+                self.record_success(upstream, model, self._elapsed(started, timer, limit_wait))
+        except HTTPException as exc:
+            self._record_error(upstream, model, exc)
+            # A stream that already produced output proved the model is up
+            if first_chunk and is_outage(exc.status_code):
+                healthy = False
+            raise
+        finally:
+            stats.in_flight -= 1
+            self._record_breaker(upstream, model, breaker, probe, healthy)
+
+    def _record_breaker(
+        self, upstream: Upstream, model: str, breaker: Optional[CircuitBreaker], probe: bool, healthy: Optional[bool]
+    ) -> None:
+        if breaker is None:
+            return
+        if healthy is None:
+            breaker.record_ignored(probe)
+        elif healthy:
+            breaker.record_success(probe)
+        else:
+            opens_before = breaker.opens
+            breaker.record_failure(probe)
+            if breaker.opens != opens_before:
+                logger.error(
+                    f"Circuit breaker opened for upstream {upstream.name}, model={model} "
+                    f"after {breaker.failures} consecutive failures, failing fast for {breaker.open_seconds:.0f}s"
+                )
+
+    async def prewarm(self, connections: int) -> None:
+        """Open `connections` keep-alive connections to every upstream before serving traffic."""
+        for upstream in self.upstreams:
+            if upstream.client.http_client is None:
+                continue
+            started = time.perf_counter()
+            opened = await prewarm(upstream.client.http_client, upstream.client.base_url, connections)
+            logger.info(
+                f"Pre-warmed {opened}/{connections} connections to upstream {upstream.name} "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+
+    async def aclose(self) -> None:
+        for upstream in self.upstreams:
+            if upstream.client.http_client is not None:
+                await upstream.client.http_client.aclose()
+
+    def cancel_request(self, request_id: str) -> bool:
+        """Cancel `request_id` on whichever upstream is serving it.
+
+        Request ids are created by the worker that also watches the client
+        connection, so a cancellation never has to leave this process.
+        """
+        cancelled = False
+        for upstream in self.upstreams:
+            cancelled = upstream.client.cancel_request(request_id) or cancelled
+        return cancelled
+
+    def classify_openai_error(self, error_detail: Any) -> str:
+        return self.upstreams[0].client.classify_openai_error(error_detail)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        result = []
+        for upstream in self.upstreams:
+            routes = {
+                model: {
+                    "ewma_ttft_ms": round(stats.ttft * 1000, 1) if stats.ttft is not None else None,
+                    "ewma_buffered_latency_ms": round(stats.latency * 1000, 1) if stats.latency is not None else None,
+                    "error_rate": round(stats.error_rate, 4),
+                    "in_flight": stats.in_flight,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "circuit": self._breakers[(name, model)].stats() if (name, model) in self._breakers else None,
+                }
+                for (name, model), stats in self._stats.items()
+                if name == upstream.name
+            }
+            result.append(
+                {
+                    "name": upstream.name,
+                    "base_url": upstream.client.base_url,
+                    "models": sorted(upstream.models) if upstream.models is not None else "*",
+                    "routes": routes,
+                    "keys": upstream.client.key_pool.stats(),
+                    "adaptive_limits": {model: limit.stats() for model, limit in upstream.client.limits.items()},
+                    "pool": self._pool_stats(upstream),
+                }
+            )
+        return result
+
+    @staticmethod
+    def _pool_stats(upstream: Upstream) -> Optional[Dict[str, int]]:
+        state = pool_state(upstream.client.http_client)
+        if state is None:
+            return None
+        active, idle, queued = state
+        return {"active": active, "idle": idle, "queued": queued}
+
+    def register_metrics(self, registry) -> None:
+        def per_route(attribute: Callable[[RouteStats], Optional[float]]):
+            def collect():
+                samples = {}
+                for (name, model), stats in self._stats.items():
+                    value = attribute(stats)
+                    if value is not None:
+                        samples[(name, model)] = value
+                return samples
+            return collect
+
+        def per_key(attribute):
+            return lambda: {
+                (upstream.name, key.label): attribute(key)
+                for upstream in self.upstreams
+                for key in upstream.client.key_pool.keys
+            }
+
+        registry.gauge(
+            "claude_proxy_upstream_ewma_ttft_seconds",
+            "EWMA of time to first token per upstream and model.",
+            ("upstream", "model"),
+            callback=per_route(lambda stats: stats.ttft),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_ewma_buffered_latency_seconds",
+            "EWMA of buffered (non-streaming) response latency per upstream and model.",
+            ("upstream", "model"),
+            callback=per_route(lambda stats: stats.latency),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_error_rate",
+            "EWMA of the upstream failure rate per upstream and model.",
+            ("upstream", "model"),
+            callback=per_route(lambda stats: stats.error_rate),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_in_flight",
+            "In-flight requests per upstream and model.",
+            ("upstream", "model"),
+            callback=per_route(lambda stats: stats.in_flight),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_requests_total",
+            "Requests routed per upstream and model.",
+            ("upstream", "model"),
+            callback=per_route(lambda stats: stats.requests),
+            type_name="counter",
+        )
+        registry.gauge(
+            "claude_proxy_upstream_circuit_state",
+            "Circuit breaker state per upstream and model (0 closed, 1 half-open, 2 open).",
+            ("upstream", "model"),
+            callback=lambda: {key: STATE_VALUES[breaker.state] for key, breaker in self._breakers.items()},
+        )
+        registry.gauge(
+            "claude_proxy_upstream_circuit_opens_total",
+            "Times the circuit breaker opened per upstream and model.",
+            ("upstream", "model"),
+            callback=lambda: {key: breaker.opens for key, breaker in self._breakers.items()},
+            type_name="counter",
+        )
+
+        def per_limit(attribute):
+            return lambda: {
+                (upstream.name, model): attribute(limit)
+                for upstream in self.upstreams
+                for model, limit in upstream.client.limits.items()
+            }
+
+        registry.gauge(
+            "claude_proxy_upstream_concurrency_limit",
+            "Adaptive concurrency limit per upstream and model.",
+            ("upstream", "model"),
+            callback=per_limit(lambda limit: limit.limit),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_limit_queued_requests",
+            "Requests waiting for an adaptive concurrency slot per upstream and model.",
+            ("upstream", "model"),
+            callback=per_limit(lambda limit: limit.queued),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_overloads_total",
+            "429 / 5xx responses seen by the adaptive limit, per upstream and model.",
+            ("upstream", "model"),
+            callback=per_limit(lambda limit: limit.overloads),
+            type_name="counter",
+        )
+
+        def per_pool(index: int, relative: bool = False):
+            def collect():
+                samples = {}
+                for upstream in self.upstreams:
+                    state = pool_state(upstream.client.http_client)
+                    if state is None:
+                        continue
+                    value = state[index]
+                    if relative:
+                        value = value / max(1, pool_max_connections(upstream.client.http_client) or 0)
+                    samples[(upstream.name,)] = value
+                return samples
+            return collect
+
+        registry.gauge(
+            "claude_proxy_upstream_pool_active_connections",
+            "Upstream connections currently serving a request.",
+            ("upstream",),
+            callback=per_pool(0),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_pool_idle_connections",
+            "Idle keep-alive upstream connections.",
+            ("upstream",),
+            callback=per_pool(1),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_pool_queued_requests",
+            "Requests waiting for an upstream connection.",
+            ("upstream",),
+            callback=per_pool(2),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_pool_utilization",
+            "Active upstream connections as a fraction of the pool limit.",
+            ("upstream",),
+            callback=per_pool(0, relative=True),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_key_in_flight",
+            "In-flight upstream requests per API key.",
+            ("upstream", "key"),
+            callback=per_key(lambda key: key.in_flight),
+        )
+        registry.gauge(
+            "claude_proxy_upstream_key_rate_limited_total",
+            "429 responses per API key.",
+            ("upstream", "key"),
+            callback=per_key(lambda key: key.rate_limited),
+            type_name="counter",
+        )
+        registry.gauge(
+            "claude_proxy_upstream_key_requests_total",
+            "Upstream requests sent per API key.",
+            ("upstream", "key"),
+            callback=per_key(lambda key: key.total_requests),
+            type_name="counter",
+        )
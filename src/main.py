@@ -1,12 +1,34 @@
+import multiprocessing
+import signal
+import socket
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.api.endpoints import router as api_router
+from src.api.endpoints import router as api_router, openai_client
+from src.conversion.image_policy import image_policy
 import uvicorn
 import sys
 from src.core.config import config
+from src.core.logging import logger
+from src.core.metrics import RequestTimingMiddleware
+from src.core.state import StateServer, state_backend
 
-app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open upstream connections before the first request needs them
+    if config.upstream_prewarm_connections > 0:
+        await openai_client.prewarm(config.upstream_prewarm_connections)
+    yield
+    await openai_client.aclose()
+    image_policy.shutdown()
+    state_backend.close()
+
+
+app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.0.0", lifespan=lifespan)
 
 app.include_router(api_router)
+# Outermost, so request timing starts before the body is read and validated
+app.add_middleware(RequestTimingMiddleware)
 
 
 def main():
@@ -33,6 +55,9 @@ def main():
         print(f"  MAX_TOKENS_LIMIT - Token limit (default: 4096)")
         print(f"  MIN_TOKENS_LIMIT - Minimum token limit (default: 100)")
         print(f"  REQUEST_TIMEOUT - Request timeout in seconds (default: 90)")
+        print(f"  WORKERS - Worker processes (default: 1)")
+        print(f"  REUSE_PORT - Give each worker its own SO_REUSEPORT socket (default: false)")
+        print(f"  STATE_BACKEND - Shared state: memory or unix (default: unix with several workers)")
         print("")
         print("Model mapping:")
         print(f"  Claude haiku models -> {config.small_model}")
@@ -49,6 +74,11 @@ def main():
     print(f"   Max Tokens Limit: {config.max_tokens_limit}")
     print(f"   Request Timeout: {config.request_timeout}s")
     print(f"   Server: {config.host}:{config.port}")
+    if config.workers > 1:
+        print(
+            f"   Workers: {config.workers} ({'SO_REUSEPORT' if config.reuse_port else 'shared socket'}, "
+            f"{config.state_backend} state)"
+        )
     print(f"   Client API Key Validation: {'Enabled' if config.anthropic_api_key else 'Disabled'}")
     print("")
 
@@ -60,14 +90,67 @@ def main():
     if log_level not in valid_levels:
         log_level = 'info'
 
+    # Shared rate-limit state lives in this (master) process
+    state_server = None
+    if config.state_backend == "unix":
+        state_server = StateServer(config.state_socket_path)
+        state_server.start()
+    elif config.workers > 1:
+        logger.warning("STATE_BACKEND=memory with several workers: key benches and client rate-limit buckets stay per worker")
+
     # Start server
-    uvicorn.run(
-        "src.main:app",
-        host=config.host,
-        port=config.port,
-        log_level=log_level,
-        reload=False,
-    )
+    try:
+        if config.workers > 1 and config.reuse_port:
+            _run_reuse_port_workers(config.workers, log_level)
+        else:
+            uvicorn.run(
+                "src.main:app",
+                host=config.host,
+                port=config.port,
+                log_level=log_level,
+                workers=config.workers,
+                reload=False,
+            )
+    finally:
+        if state_server is not None:
+            state_server.stop()
+
+
+def _serve_reuse_port(log_level: str) -> None:
+    """Worker process: bind a private SO_REUSEPORT socket so the kernel spreads connections across workers."""
+    sock = socket.socket(socket.AF_INET6 if ":" in config.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((config.host, config.port))
+    sock.set_inheritable(True)
+    server = uvicorn.Server(uvicorn.Config("src.main:app", log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def _run_reuse_port_workers(workers: int, log_level: str) -> None:
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("REUSE_PORT is not supported on this platform")
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_serve_reuse_port, args=(log_level,), name=f"worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop()
+        for process in processes:
+            process.join()
 
 
 if __name__ == "__main__":
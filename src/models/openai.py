@@ -0,0 +1,36 @@
+from typing import Any, Dict, List, Optional, TypedDict
+
+
+class OpenAIStreamToolCallFunction(TypedDict, total=False):
+    name: Optional[str]
+    arguments: Optional[str]
+
+
+class OpenAIStreamToolCall(TypedDict, total=False):
+    index: int
+    id: Optional[str]
+    type: Optional[str]
+    function: OpenAIStreamToolCallFunction
+
+
+class OpenAIStreamDelta(TypedDict, total=False):
+    role: Optional[str]
+    content: Optional[str]
+    tool_calls: Optional[List[OpenAIStreamToolCall]]
+
+
+class OpenAIStreamChoice(TypedDict, total=False):
+    index: int
+    delta: OpenAIStreamDelta
+    finish_reason: Optional[str]
+
+
+class OpenAIStreamChunk(TypedDict, total=False):
+    """A single `chat.completion.chunk` event, parsed once from the upstream SSE body."""
+
+    id: str
+    object: str
+    created: int
+    model: str
+    choices: List[OpenAIStreamChoice]
+    usage: Optional[Dict[str, Any]]
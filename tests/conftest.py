@@ -0,0 +1,6 @@
+import os
+import sys
+
+# src.core.config exits at import time without an upstream key
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,195 @@
+"""Tests for the AIMD adaptive upstream concurrency limit."""
+
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+
+from src.core.adaptive_limit import AdaptiveLimit
+from src.core.client import OpenAIClient
+from src.core.upstream_router import Upstream, UpstreamRouter
+
+RPM = 6000  # 100 requests per second, enforced in fixed one-second windows
+LATENCY = 0.05
+
+
+def _completion():
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 1,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+class RateLimitedUpstream:
+    """Stub upstream accepting RPM / 60 requests per one-second window; the rest get 429 + Retry-After."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.window = -1
+        self.used = 0
+        self.rejected = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        elapsed = time.monotonic() - self.start
+        window = int(elapsed)
+        if window != self.window:
+            self.window, self.used = window, 0
+        if self.used >= RPM / 60:
+            self.rejected += 1
+            retry_after_ms = (window + 1 - elapsed) * 1000
+            return httpx.Response(429, json={"error": {"message": "rate limit"}}, headers={"retry-after-ms": f"{retry_after_ms:.0f}"})
+        self.used += 1
+        await asyncio.sleep(LATENCY)
+        return httpx.Response(200, json=_completion())
+
+
+def _simulate(adaptive_limit, seconds=2.0, clients=50):
+    upstream = RateLimitedUpstream()
+    client = OpenAIClient("sk-test", "http://stub/v1", adaptive_limit=adaptive_limit)
+    client.client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://stub/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)),
+        max_retries=0,
+    )
+    completed = 0
+
+    async def agent():
+        nonlocal completed
+        deadline = upstream.start + seconds
+        while time.monotonic() < deadline:
+            try:
+                await client.create_chat_completion({"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]})
+                completed += 1
+            except HTTPException as exc:
+                assert exc.status_code == 429
+
+    async def run():
+        await asyncio.gather(*(agent() for _ in range(clients)))
+
+    asyncio.run(run())
+    return completed, upstream.rejected, client
+
+
+def test_limiter_keeps_goodput_near_the_upstream_limit_without_hammering():
+    completed, rejected, client = _simulate({"initial": 16})
+    unlimited_completed, unlimited_rejected, _ = _simulate(None)
+
+    capacity = RPM / 60 * 2
+    assert completed >= 0.85 * capacity
+    assert rejected <= 0.1 * completed
+    # Without the limiter the same load hammers the upstream with far more 429s
+    assert unlimited_completed >= 0.85 * capacity
+    assert unlimited_rejected > 10 * rejected
+    assert client.limits["gpt-4o"].overloads == rejected
+
+
+def test_limit_grows_on_success_and_halves_once_per_overload():
+    async def scenario():
+        now = [0.0]
+        limit = AdaptiveLimit(initial=4, backoff=0.5, clock=lambda: now[0])
+        granted = [await limit.acquire() for _ in range(4)]
+        now[0] = 1.0
+        for granted_at in granted[:2]:
+            limit.on_overload(granted_at, retry_after=2.0)
+        assert limit.limit == 2.0  # both failures belong to the same overload
+
+        waiter = asyncio.ensure_future(limit.acquire())
+        limit.on_success(granted[2])
+        limit.on_success(granted[3])
+        await asyncio.sleep(0)
+        assert not waiter.done()  # Retry-After still blocks new requests
+        now[0] = 3.0
+        limit._schedule()
+        assert await waiter == 3.0
+        return limit
+
+    limit = asyncio.run(scenario())
+    assert limit.limit > 2.0 and limit.in_flight == 1
+
+
+def test_rising_latency_shrinks_the_limit():
+    async def scenario():
+        limit = AdaptiveLimit(initial=10, backoff=0.5, alpha=1.0)
+        limit.on_success(await limit.acquire(), latency=0.2)
+        limit.on_success(await limit.acquire(), latency=1.0)
+        return limit.limit
+
+    assert asyncio.run(scenario()) < 6
+
+
+def test_time_queued_for_the_limit_does_not_count_as_stream_ttft():
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY)
+        chunk = {"choices": [{"index": 0, "delta": {"content": "ok"}, "finish_reason": "stop"}]}
+        return httpx.Response(
+            200,
+            text=f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n",
+            headers={"content-type": "text/event-stream"},
+        )
+
+    client = OpenAIClient("sk-test", "http://stub/v1", adaptive_limit={"initial": 16})
+    client.client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://stub/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)),
+        max_retries=0,
+    )
+
+    async def stream():
+        request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]}
+        return [chunk async for chunk in client.create_chat_completion_stream(request)]
+
+    async def run():
+        # 64 streams against a constant-latency upstream: most of them queue for the limit
+        for _ in range(2):
+            await asyncio.gather(*(stream() for _ in range(64)))
+
+    asyncio.run(run())
+    limit = client.limits["gpt-4o"]
+    assert limit.limit >= 16
+    assert limit.latency < 4 * LATENCY
+
+
+def test_time_queued_for_the_limit_does_not_count_as_routing_latency():
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY)
+        if not json.loads(request.content).get("stream"):
+            return httpx.Response(200, json=_completion())
+        chunk = {"choices": [{"index": 0, "delta": {"content": "ok"}, "finish_reason": "stop"}]}
+        return httpx.Response(
+            200,
+            text=f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n",
+            headers={"content-type": "text/event-stream"},
+        )
+
+    client = OpenAIClient("sk-test", "http://stub/v1", adaptive_limit={"initial": 2, "max_limit": 2})
+    client.client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://stub/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)),
+        max_retries=0,
+    )
+    throttled = Upstream("throttled", client)
+    router = UpstreamRouter([throttled])
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]}
+
+    async def stream():
+        return [chunk async for chunk in router.create_chat_completion_stream(dict(request))]
+
+    async def run():
+        # 16 calls through a limit of 2: most of them queue for several upstream latencies
+        await asyncio.gather(*(stream() for _ in range(16)))
+        await asyncio.gather(*(router.create_chat_completion(dict(request)) for _ in range(16)))
+
+    asyncio.run(run())
+    stats = router.stats_for(throttled, "gpt-4o")
+    assert stats.ttft < 3 * LATENCY
+    assert stats.latency < 3 * LATENCY
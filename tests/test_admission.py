@@ -0,0 +1,88 @@
+"""Tests for per-client-key admission control and fair queuing."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.core.admission import AdmissionController, admission_rejected_total
+from src.core.state import MemoryStateBackend
+
+
+def test_concurrency_cap_queues_until_release():
+    async def scenario():
+        controller = AdmissionController(queue_timeout=1)
+        limits = {"max_concurrency": 1}
+        first = await controller.admit("team-a", limits)
+        second = asyncio.create_task(controller.admit("team-a", limits))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+        assert controller.queue_depth() == {("team-a",): 1}
+
+        first.release()
+        first.release()  # idempotent
+        (await second).release()
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiting_keys_are_served_by_weight():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_timeout=1)
+        order = []
+        holder = await controller.admit("heavy", {"weight": 1})
+
+        async def request(key_id, weight):
+            ticket = await controller.admit(key_id, {"weight": weight})
+            order.append(key_id)
+            await asyncio.sleep(0)
+            ticket.release()
+
+        tasks = [asyncio.create_task(request("heavy", 1)) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request("light", 2)) for _ in range(2)]
+        await asyncio.sleep(0)
+        holder.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+
+    # The later, higher-weight key is not stuck behind the heavy key's backlog
+    assert order[:4].count("light") == 2
+
+
+def test_queue_timeout_rejects_with_429():
+    async def scenario():
+        controller = AdmissionController(queue_timeout=0.05)
+        await controller.admit("team-b", {"max_concurrency": 1})
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.admit("team-b", {"max_concurrency": 1})
+        return exc_info.value, controller
+
+    error, controller = asyncio.run(scenario())
+
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "1"
+    assert controller.queue_depth() == {("team-b",): 0}
+    assert admission_rejected_total.get(key="team-b", reason="concurrency") == 1
+
+
+def test_token_bucket_waits_then_rejects_past_the_timeout():
+    async def scenario():
+        controller = AdmissionController(queue_timeout=0.5, state=MemoryStateBackend())
+        fast = {"rate_limit_rpm": 600, "burst": 1}  # one token every 100ms
+        await controller.admit("team-c", fast)
+        await controller.admit("team-c", fast)
+
+        slow = {"rate_limit_rpm": 1, "burst": 1}
+        await controller.admit("team-d", slow)
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.admit("team-d", slow)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+
+    assert error.status_code == 429
+    assert admission_rejected_total.get(key="team-d", reason="rate_limit") == 1
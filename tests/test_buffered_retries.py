@@ -0,0 +1,173 @@
+"""Tests for buffered-mode retries and disconnect handling in the messages endpoint."""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+
+import src.api.endpoints as endpoints
+from src.core.client import OpenAIClient
+from src.core.hedging import HedgePolicy
+
+
+def _completion(model):
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 1,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def _stub_client(handler):
+    client = OpenAIClient("sk-test", "http://stub/v1")
+    client.client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://stub/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        max_retries=0,
+    )
+    return client
+
+
+class _ManualWatcher:
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.callbacks = []
+
+    @property
+    def disconnected(self):
+        return self.event.is_set()
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def disconnect(self):
+        self.event.set()
+        for callback in self.callbacks:
+            callback()
+
+
+@pytest.fixture
+def stub_openai_client(monkeypatch):
+    def install(handler):
+        client = _stub_client(handler)
+        monkeypatch.setattr(endpoints, "openai_client", client)
+        return client
+
+    return install
+
+
+def test_buffered_retry_recovers_from_5xx(stub_openai_client, monkeypatch):
+    monkeypatch.setattr(endpoints.config, "max_retries", 2)
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, json={"error": {"message": "overloaded"}})
+        return httpx.Response(200, json=_completion("gpt-4o"))
+
+    stub_openai_client(handler)
+
+    async def scenario():
+        watcher = _ManualWatcher()
+        return await endpoints._gather_openai_response_with_retries(
+            {"model": "gpt-4o", "messages": []}, "gpt-4o", "req-1", watcher, "buffered"
+        )
+
+    response = asyncio.run(scenario())
+    assert response["choices"][0]["message"]["content"] == "ok"
+    assert len(calls) == 2
+
+
+def test_buffered_disconnect_cancels_in_flight_attempt_immediately(stub_openai_client):
+    async def handler(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, json=_completion("gpt-4o"))
+
+    client = stub_openai_client(handler)
+
+    async def scenario():
+        watcher = _ManualWatcher()
+        watcher.callbacks.append(lambda: client.cancel_request("req-2"))
+        asyncio.get_running_loop().call_later(0.05, watcher.disconnect)
+        start = time.perf_counter()
+        with pytest.raises(HTTPException) as exc_info:
+            await endpoints._gather_openai_response_with_retries(
+                {"model": "gpt-4o", "messages": []}, "gpt-4o", "req-2", watcher, "buffered"
+            )
+        return exc_info.value.status_code, time.perf_counter() - start
+
+    status_code, elapsed = asyncio.run(scenario())
+    assert status_code == 499
+    assert elapsed < 1.0
+    assert client.active_requests == {}
+
+
+def test_buffered_disconnect_cuts_retry_backoff_short(stub_openai_client, monkeypatch):
+    monkeypatch.setattr(endpoints.config, "max_retries", 2)
+
+    async def handler(request):
+        return httpx.Response(500, json={"error": {"message": "boom"}})
+
+    stub_openai_client(handler)
+
+    async def scenario():
+        watcher = _ManualWatcher()
+        asyncio.get_running_loop().call_later(0.1, watcher.disconnect)
+        start = time.perf_counter()
+        with pytest.raises(HTTPException) as exc_info:
+            await endpoints._gather_openai_response_with_retries(
+                {"model": "gpt-4o", "messages": []}, "gpt-4o", "req-3", watcher, "buffered"
+            )
+        return exc_info.value.status_code, time.perf_counter() - start
+
+    status_code, elapsed = asyncio.run(scenario())
+    assert status_code == 499
+    assert elapsed < 0.9
+
+
+def test_slow_buffered_call_is_hedged_and_loser_cancelled(stub_openai_client, monkeypatch):
+    hedge_config = SimpleNamespace(
+        hedge_models=["gpt-4o"], hedge_percentile=95, hedge_min_delay=0.05, hedge_min_samples=20
+    )
+    policy = HedgePolicy(hedge_config)
+    assert policy.delay_for("gpt-4o") is None  # still learning
+    for _ in range(20):
+        policy.tracker.record("gpt-4o", 0.02)
+    assert policy.delay_for("gpt-4o") == 0.05
+    monkeypatch.setattr(endpoints, "hedge_policy", policy)
+    calls = []
+
+    async def handler(request):
+        calls.append(time.perf_counter())
+        # The first call is stuck, the hedge answers quickly
+        await asyncio.sleep(5 if len(calls) == 1 else 0.01)
+        return httpx.Response(200, json=_completion("gpt-4o"))
+
+    client = stub_openai_client(handler)
+
+    async def scenario():
+        watcher = _ManualWatcher()
+        start = time.perf_counter()
+        response = await endpoints._gather_openai_response_with_retries(
+            {"model": "gpt-4o", "messages": []}, "gpt-4o", "req-4", watcher, "buffered"
+        )
+        return response, time.perf_counter() - start, watcher
+
+    response, elapsed, watcher = asyncio.run(scenario())
+
+    assert response["choices"][0]["message"]["content"] == "ok"
+    assert len(calls) == 2
+    assert 0.05 <= elapsed < 1.0
+    assert client.active_requests == {}
+    # A later disconnect would also cancel the hedge
+    assert len(watcher.callbacks) == 1
@@ -0,0 +1,115 @@
+"""Tests for the per-route circuit breaker."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import src.api.endpoints as endpoints
+from src.api.endpoints import _should_retry
+from src.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from src.core.model_manager import model_manager
+from src.core.upstream_router import Upstream, UpstreamRouter
+from tests.test_buffered_retries import _ManualWatcher
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeClient:
+    def __init__(self):
+        self.requests = []
+        self.down = set()
+        self.base_url = "http://fake"
+
+    async def create_chat_completion(self, request, request_id=None, timer=None):
+        self.requests.append(request["model"])
+        if request["model"] in self.down:
+            raise HTTPException(status_code=502, detail="bad gateway")
+        return {"model": request["model"]}
+
+    def cancel_request(self, request_id):
+        return False
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_when_half_open():
+    clock = _Clock()
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=10, clock=clock)
+
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.available()
+    assert breaker.retry_after() == 10
+
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.begin() is True
+    assert not breaker.available()  # one probe at a time
+    breaker.record_failure(probe=True)
+    assert breaker.state == OPEN
+
+    clock.now += 10
+    probe = breaker.begin()
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED and breaker.available()
+
+
+def test_open_circuit_fails_fast_then_recovers():
+    clock = _Clock()
+    client = _FakeClient()
+    upstream = Upstream("azure", client)
+    router = UpstreamRouter([upstream], clock=clock, circuit_breaker={"failure_threshold": 2, "open_seconds": 30})
+    client.down.add("gpt-4o")
+    request = {"model": "gpt-4o", "messages": []}
+
+    async def call():
+        return await router.create_chat_completion(dict(request))
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            asyncio.run(call())
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(call())
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "30"
+    assert not _should_retry(exc_info.value)
+    assert client.requests == ["gpt-4o", "gpt-4o"]
+    assert router.breaker_for(upstream, "gpt-4o").state == OPEN
+
+    client.down.clear()
+    clock.now += 30
+    assert asyncio.run(call()) == {"model": "gpt-4o"}
+    assert router.breaker_for(upstream, "gpt-4o").state == CLOSED
+
+
+def test_open_circuit_moves_the_request_along_its_fallback_chain(monkeypatch):
+    client = _FakeClient()
+    router = UpstreamRouter(
+        [Upstream("azure", client)],
+        clock=_Clock(),
+        circuit_breaker={"failure_threshold": 1, "open_seconds": 30},
+    )
+    monkeypatch.setattr(endpoints, "openai_client", router)
+    monkeypatch.setattr(endpoints.config, "max_retries", 0)
+    monkeypatch.setattr(endpoints.config, "circuit_breaker_fallbacks", {"gpt-4o": "gpt-4o-mini"})
+    client.down.add("gpt-4o")
+    models = ["gpt-4o"] + model_manager.fallback_models_for("gpt-4o")
+
+    async def scenario():
+        request = {"model": "gpt-4o", "messages": []}
+        first = await endpoints._gather_openai_response_with_fallbacks(request, models, "req-1", _ManualWatcher(), "buffered")
+        # The circuit is open now: the primary fails fast without reaching the upstream
+        second = await endpoints._gather_openai_response_with_fallbacks(request, models, "req-2", _ManualWatcher(), "buffered")
+        return first, second
+
+    assert asyncio.run(scenario()) == ({"model": "gpt-4o-mini"}, {"model": "gpt-4o-mini"})
+    assert client.requests == ["gpt-4o", "gpt-4o-mini", "gpt-4o-mini"]
@@ -0,0 +1,175 @@
+"""Parity tests: the fast dict-based request path against the pydantic path."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.exceptions import RequestValidationError
+
+import src.api.endpoints as endpoints
+from src.conversion import dict_converter, request_converter
+from src.conversion.dict_converter import convert_claude_dict_to_openai, parse_messages_request
+from src.conversion.message_cache import MessageConversionCache
+from src.conversion.request_converter import convert_claude_to_openai
+from src.core.model_manager import model_manager
+from src.models.claude import ClaudeMessagesRequest
+
+TOOL_SESSION = [
+    {"role": "user", "content": [{"type": "text", "text": "List the files", "cache_control": {"type": "ephemeral"}}]},
+    {
+        "role": "assistant",
+        "content": [
+            {"type": "text", "text": "Sure, "},
+            {"type": "text", "text": "running ls."},
+            {"type": "tool_use", "id": "toolu_1", "name": "Bash", "input": {"command": "ls", "note": "“quoted” ✓"}},
+            {"type": "tool_use", "id": "toolu_2", "name": "Glob", "input": {}},
+        ],
+    },
+    {
+        "role": "user",
+        "content": [
+            {"type": "tool_result", "tool_use_id": "toolu_1", "content": "a.py\nb.py"},
+            {"type": "tool_result", "tool_use_id": "toolu_2", "content": [{"type": "text", "text": "x"}, {"k": 1}]},
+            {"type": "text", "text": "dropped with tool results"},
+        ],
+    },
+    {"role": "assistant", "content": [{"type": "tool_use", "id": "toolu_3", "name": "Read", "input": {"p": [1, 2]}}]},
+    {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_3", "content": {"type": "text", "text": "ok"}}]},
+    {"role": "assistant", "content": "Done."},
+]
+
+CASES = {
+    "plain": {"model": "claude-3-5-sonnet", "max_tokens": 100, "messages": [{"role": "user", "content": "hi"}]},
+    "options": {
+        "model": "claude-3-haiku",
+        "max_tokens": 1,
+        "temperature": 0,
+        "top_p": 1,
+        "stream": True,
+        "stop_sequences": ["\n\nHuman:"],
+        "system": "  Be brief.  ",
+        "messages": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}],
+    },
+    "system_blocks": {
+        "model": "claude-3-opus",
+        "max_tokens": 100000,
+        "system": [{"type": "text", "text": "one"}, {"type": "text", "text": "two", "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": [{"type": "text", "text": "only text"}]}],
+    },
+    "images": {
+        "model": "claude-3-5-sonnet",
+        "max_tokens": 100,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "What is this?"},
+                    {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "iVBORw0KGgo="}},
+                    {"type": "image", "source": {"type": "url", "url": "https://example.com/a.png"}},
+                ],
+            }
+        ],
+    },
+    "tools": {
+        "model": "claude-3-5-sonnet",
+        "max_tokens": 4096,
+        "messages": TOOL_SESSION,
+        "tools": [
+            {"name": "Bash", "description": "Run a command", "input_schema": {"type": "object"}},
+            {"name": "Glob", "input_schema": {"type": "object", "properties": {}}},
+            {"name": "  ", "input_schema": {"type": "object"}},
+        ],
+        "tool_choice": {"type": "tool", "name": "Bash"},
+    },
+    "tool_choice_any": {
+        "model": "claude-3-5-sonnet",
+        "max_tokens": 10,
+        "messages": [{"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t", "content": "orphan"}]}],
+        "tool_choice": {"type": "any"},
+    },
+}
+
+
+@pytest.mark.parametrize("cached", [False, True])
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_dict_path_matches_pydantic_path(monkeypatch, name, cached):
+    cache = MessageConversionCache(4096 if cached else 0)
+    monkeypatch.setattr(request_converter, "message_cache", cache)
+    monkeypatch.setattr(dict_converter, "message_cache", cache)
+    body = json.dumps(CASES[name]).encode()
+
+    expected = convert_claude_to_openai(ClaudeMessagesRequest.model_validate_json(body), model_manager)
+    for _ in range(2):
+        assert convert_claude_dict_to_openai(parse_messages_request(body), model_manager) == expected
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"{not json",
+        b"[]",
+        b'{"max_tokens": 1, "messages": []}',
+        b'{"model": "m", "max_tokens": "many", "messages": []}',
+        b'{"model": "m", "max_tokens": 1, "messages": [{"role": "system", "content": "x"}]}',
+        b'{"model": "m", "max_tokens": 1, "messages": [{"role": "user", "content": [{"text": "no type"}]}]}',
+        b'{"model": "m", "max_tokens": 1, "messages": [], "temperature": "hot"}',
+        b'{"model": "m", "max_tokens": 1, "messages": [], "tools": [{"name": "t"}]}',
+    ],
+)
+def test_invalid_bodies_are_rejected(body):
+    with pytest.raises(RequestValidationError):
+        parse_messages_request(body)
+
+
+def _with_block(block, role="user", system=None):
+    body = {"model": "m", "max_tokens": 1, "messages": [{"role": role, "content": [block]}]}
+    if system is not None:
+        body["system"] = system
+    return json.dumps(body).encode()
+
+
+@pytest.mark.parametrize(
+    "body, loc",
+    [
+        (_with_block({"type": "document", "source": {}}), ["type"]),
+        (_with_block({"type": "text"}), ["text"]),
+        (_with_block({"type": "text", "text": 1}), ["text"]),
+        (_with_block({"type": "image", "source": "https://example.com/a.png"}), ["source"]),
+        (_with_block({"type": "tool_use", "input": {}}, role="assistant"), ["id"]),
+        (_with_block({"type": "tool_use", "id": "toolu_1", "input": {}}, role="assistant"), ["name"]),
+        (_with_block({"type": "tool_use", "id": "toolu_1", "name": "Bash"}, role="assistant"), ["input"]),
+        (_with_block({"type": "tool_result", "content": "ok"}), ["tool_use_id"]),
+        (_with_block({"type": "tool_result", "tool_use_id": "t"}), ["content"]),
+        (_with_block({"type": "tool_result", "tool_use_id": "t", "content": ["ok"]}), ["content"]),
+        (_with_block({"type": "text", "text": "hi"}, system=[{"type": "image", "source": {}}]), ["type"]),
+        (_with_block({"type": "text", "text": "hi"}, system=[{"type": "text"}]), ["text"]),
+    ],
+)
+def test_blocks_the_pydantic_model_rejects_are_rejected(body, loc):
+    with pytest.raises(ValueError):
+        ClaudeMessagesRequest.model_validate_json(body)
+
+    with pytest.raises(RequestValidationError) as exc_info:
+        parse_messages_request(body)
+
+    assert exc_info.value.errors()[0]["loc"][-1:] == tuple(loc)
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_endpoint_rejects_invalid_body_with_422(monkeypatch, fast):
+    from src.main import app
+
+    monkeypatch.setattr(endpoints.config, "fast_request_parsing", fast)
+    monkeypatch.setattr(endpoints.config, "anthropic_api_key", None)
+    monkeypatch.setattr(endpoints.config, "api_key_model_mapping", {})
+
+    async def post():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            return await client.post("/v1/messages", json={"model": "m", "messages": []})
+
+    response = asyncio.run(post())
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", "max_tokens"]
@@ -0,0 +1,100 @@
+"""Tests for the shared upstream connection pool, pre-warming and pool metrics."""
+
+import asyncio
+import json
+import logging
+
+from src.core.client import OpenAIClient
+from src.core.http_pool import build_http_client, new_connections_total, pool_state, pool_wait_seconds, prewarm
+from tests.test_upstream_router import _serve, _stub_app
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def _wait_samples(upstream):
+    counts = pool_wait_seconds._counts.get((upstream,), [])
+    return sum(counts), pool_wait_seconds._sums.get((upstream,), 0.0)
+
+
+def test_prewarmed_connections_are_reused_by_requests():
+    async def scenario():
+        async with _serve(_stub_app("east", {"seconds": 0.05})) as url:
+            http_client = build_http_client("prewarm-test", max_connections=10, max_keepalive_connections=10)
+            client = OpenAIClient("sk-test", url, http_client=http_client)
+
+            opened = await prewarm(http_client, url, 4)
+            warm_state = pool_state(http_client)
+            connects_before = new_connections_total.get(upstream="prewarm-test")
+
+            await asyncio.gather(
+                *(client.create_chat_completion({"model": "gpt-4o", "messages": []}) for _ in range(4))
+            )
+            connects_after = new_connections_total.get(upstream="prewarm-test")
+            await http_client.aclose()
+            return opened, warm_state, connects_before, connects_after
+
+    opened, warm_state, connects_before, connects_after = asyncio.run(scenario())
+
+    assert opened == 4
+    assert warm_state == (0, 4, 0)
+    assert connects_before == 4
+    assert connects_after == connects_before
+
+
+def test_pool_wait_is_measured_when_connections_run_out():
+    async def scenario():
+        async with _serve(_stub_app("east", {"seconds": 0.2})) as url:
+            http_client = build_http_client("wait-test", max_connections=1)
+            client = OpenAIClient("sk-test", url, http_client=http_client)
+
+            calls = [
+                asyncio.create_task(client.create_chat_completion({"model": "gpt-4o", "messages": []}))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.1)
+            busy_state = pool_state(http_client)
+            await asyncio.gather(*calls)
+            await http_client.aclose()
+            return busy_state
+
+    busy_state = asyncio.run(scenario())
+    count, total_wait = _wait_samples("wait-test")
+
+    assert busy_state == (1, 0, 1)
+    assert count == 2
+    assert total_wait >= 0.15
+
+
+def test_pooled_keys_share_one_http_client():
+    http_client = build_http_client("shared-test")
+    client = OpenAIClient("sk-a", "http://stub/v1", api_keys=["sk-a", "sk-b"], http_client=http_client)
+
+    transports = {id(key.client._client) for key in client.key_pool.keys}
+
+    assert transports == {id(http_client)}
+    asyncio.run(http_client.aclose())
+
+
+def test_json_bodies_are_encoded_as_compact_utf8():
+    http_client = build_http_client("encode-test")
+    payload = {"model": "gpt-4o", "messages": [{"role": "user", "content": "héllo “world”"}]}
+
+    request = http_client.build_request("POST", "http://upstream.invalid/v1/chat/completions", json=payload)
+
+    assert json.loads(request.content) == payload
+    assert "héllo".encode() in request.content
+    assert request.headers["content-type"] == "application/json"
+    assert request.headers["content-length"] == str(len(request.content))
+
+
+def test_pool_state_is_none_when_httpcore_internals_change(monkeypatch):
+    http_client = build_http_client("internals-test")
+    assert pool_state(http_client) == (0, 0, 0)
+
+    # Stands in for an httpcore release without the private request queue
+    monkeypatch.setattr(http_client._transport, "_pool", type("Pool", (), {"connections": []})())
+
+    assert pool_state(http_client) is None
+    assert pool_state(None) is None
+    monkeypatch.undo()
+    asyncio.run(http_client.aclose())
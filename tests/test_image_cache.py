@@ -0,0 +1,41 @@
+"""Tests for interning image data URLs by content."""
+
+from src.conversion.image_cache import ImageUrlCache
+
+
+def test_identical_images_share_one_url_string():
+    cache = ImageUrlCache()
+    first = cache.data_url("image/png", "".join(["iVBOR", "w0KGgo="]))
+    second = cache.data_url("image/png", "".join(["iVBORw0K", "Ggo="]))
+
+    assert first == "data:image/png;base64,iVBORw0KGgo="
+    assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_media_type_is_part_of_the_identity():
+    cache = ImageUrlCache()
+    png = cache.data_url("image/png", "AAAA")
+    jpeg = cache.data_url("image/jpeg", "AAAA")
+
+    assert jpeg == "data:image/jpeg;base64,AAAA"
+    assert jpeg is not png
+
+
+def test_cache_is_bounded_by_total_size():
+    url_size = len("data:image/png;base64,") + 100
+    cache = ImageUrlCache(max_bytes=url_size * 2)
+    for letter in "ABC":
+        cache.data_url("image/png", letter * 100)
+
+    assert len(cache) == 2
+    assert cache.total_bytes == url_size * 2
+    cache.data_url("image/png", "A" * 100)  # evicted, built again
+    assert cache.misses == 4
+
+
+def test_oversized_or_disabled_images_are_not_cached():
+    for cache in (ImageUrlCache(max_bytes=0), ImageUrlCache(max_bytes=10)):
+        url = cache.data_url("image/png", "A" * 100)
+        assert url.endswith("A" * 100)
+        assert len(cache) == 0
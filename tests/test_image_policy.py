@@ -0,0 +1,120 @@
+"""Tests for the per-model image policy stage."""
+
+import asyncio
+import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.conversion.image_policy import ImagePolicy, ImagePolicyStage, process_image
+
+PNG_URL = "data:image/png;base64,iVBORw0KGgo="
+
+
+def _request(model="gpt-4o-mini", url=PNG_URL):
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "Be brief."},
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": "What is this?"}, {"type": "image_url", "image_url": {"url": url}}],
+            },
+        ],
+    }
+
+
+def _stage(processor, **policies):
+    return ImagePolicyStage(
+        policies or {"gpt-4o-mini": {"max_dimension": 512, "format": "jpeg", "quality": 70}},
+        processor=processor,
+        executor=ThreadPoolExecutor(max_workers=1),
+    )
+
+
+def test_policy_lookup_falls_back_to_wildcard():
+    stage = _stage(None, **{"GPT-4o-mini": {"format": "webp"}, "*": {"max_dimension": 1024}, "bad": {"format": "bmp"}})
+
+    assert stage.policy_for("gpt-4o-mini") == ImagePolicy(format="WEBP")
+    assert stage.policy_for("other-model") == ImagePolicy(max_dimension=1024)
+    assert "bad" not in stage.policies
+
+
+def test_images_are_replaced_without_mutating_the_request():
+    calls = []
+
+    def processor(data, max_dimension, image_format, quality):
+        calls.append((data, max_dimension, image_format, quality))
+        return "image/jpeg", "/9j/AAAA"
+
+    stage = _stage(processor)
+    request = _request()
+
+    processed = asyncio.run(stage.apply(request))
+    again = asyncio.run(stage.apply(_request()))
+
+    assert processed["messages"][1]["content"][1]["image_url"]["url"] == "data:image/jpeg;base64,/9j/AAAA"
+    assert request["messages"][1]["content"][1]["image_url"]["url"] == PNG_URL
+    assert processed["messages"][0] is request["messages"][0]
+    assert again["messages"][1]["content"][1]["image_url"]["url"] == "data:image/jpeg;base64,/9j/AAAA"
+    assert calls == [("iVBORw0KGgo=", 512, "JPEG", 70)]
+
+
+def test_models_without_policy_and_failures_keep_the_original():
+    def failing(*args):
+        raise OSError("cannot identify image file")
+
+    stage = _stage(failing)
+    unmatched = _request(model="gpt-4o")
+
+    assert asyncio.run(stage.apply(unmatched)) is unmatched
+    failed = asyncio.run(stage.apply(_request()))
+    assert failed["messages"][1]["content"][1]["image_url"]["url"] == PNG_URL
+
+
+def test_process_image_downscales_and_converts():
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGBA", (2000, 1000), (255, 0, 0, 128)).save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode()
+
+    media_type, encoded = process_image(data, 500, "JPEG", 80)
+
+    assert media_type == "image/jpeg"
+    with Image.open(io.BytesIO(base64.b64decode(encoded))) as image:
+        assert image.size == (500, 250)
+        assert image.format == "JPEG"
+    assert process_image(data, 4000, None, 80) is None
+
+
+def test_cache_is_keyed_by_digest_and_bounded_by_size():
+    calls = []
+
+    def processor(data, max_dimension, image_format, quality):
+        calls.append(data)
+        return None if data.startswith("keep") else ("image/jpeg", data[:40])
+
+    stage = _stage(processor)
+    stage.cache_max_bytes = 150
+    originals = [f"data:image/png;base64,{index}" + "A" * 1000 for index in range(3)]
+    kept = "data:image/png;base64,keep" + "A" * 1000
+
+    for url in originals + [kept, kept, originals[2]]:
+        asyncio.run(stage.apply(_request(url=url)))
+
+    assert all(url not in str(key) for key in stage._cache for url in originals + [kept])
+    assert None in stage._cache.values()  # unchanged images are remembered without their data
+    assert stage.cache_bytes == sum(len(url) for url in stage._cache.values() if url) <= 150
+    assert len(calls) == 4
+    again = asyncio.run(stage.apply(_request(url=kept)))
+    assert again["messages"][1]["content"][1]["image_url"]["url"] == kept
+    assert len(calls) == 4
+
+
+def test_worker_processes_are_not_forked():
+    stage = ImagePolicyStage({"*": {"format": "jpeg"}}, workers=1)
+    try:
+        assert stage._get_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        stage.shutdown()
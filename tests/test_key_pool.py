@@ -0,0 +1,168 @@
+"""Tests for the upstream API key pool and 429 failover in OpenAIClient."""
+
+import asyncio
+import json
+
+import httpx
+from openai import AsyncOpenAI
+
+from src.core.client import OpenAIClient
+from src.core.key_pool import KeyPool, PooledKey, parse_reset_duration, parse_retry_after
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _completion():
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 1,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def _pooled_client(handler, keys=("sk-key-aaaaaaaaaaaa", "sk-key-bbbbbbbbbbbb")):
+    client = OpenAIClient(keys[0], "http://stub/v1", api_keys=list(keys))
+    for pooled in client.key_pool.keys:
+        pooled.client = AsyncOpenAI(
+            api_key=pooled.api_key,
+            base_url="http://stub/v1",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            max_retries=0,
+        )
+    return client
+
+
+def _used_key(request: httpx.Request) -> str:
+    return request.headers["authorization"].removeprefix("Bearer ")
+
+
+def test_acquire_prefers_fewest_in_flight_then_most_budget():
+    a, b, c = PooledKey("sk-a", None), PooledKey("sk-b", None), PooledKey("sk-c", None)
+    pool = KeyPool([a, b, c])
+    a.in_flight = 2
+    b.remaining_requests = 10
+    c.remaining_requests = 500
+
+    assert pool.acquire() is c
+    assert pool.acquire() is b  # c now has one in flight
+    pool.release(c)
+    assert pool.acquire() is c
+
+
+def test_exhausted_budget_and_429_bench_keys_until_reset():
+    clock = _Clock()
+    a, b = PooledKey("sk-a", None), PooledKey("sk-b", None)
+    pool = KeyPool([a, b], bench_seconds=20, clock=clock)
+
+    pool.record_headers(a, {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m30s"})
+    assert pool.acquire() is b
+    pool.bench(b, retry_after=None)
+
+    # Everything benched: the key that comes back first is used
+    assert pool.acquire() is b
+    clock.now += 30
+    assert a.is_benched(clock.now) and not b.is_benched(clock.now)
+    clock.now += 60
+    assert not a.is_benched(clock.now)
+    assert parse_reset_duration("6m0s") == 360.0
+    assert parse_reset_duration("20ms") == 0.02
+    assert parse_retry_after(httpx.Headers({"retry-after": "7"})) == 7.0
+
+
+def test_rate_limited_key_is_benched_and_request_fails_over():
+    calls = []
+
+    def handler(request):
+        key = _used_key(request)
+        calls.append(key)
+        if key.endswith("a"):
+            return httpx.Response(429, json={"error": {"message": "slow down"}}, headers={"retry-after": "30"})
+        return httpx.Response(200, json=_completion(), headers={"x-ratelimit-remaining-requests": "99"})
+
+    client = _pooled_client(handler)
+    key_a, key_b = client.key_pool.keys
+
+    result = asyncio.run(client.create_chat_completion({"model": "gpt-4o", "messages": []}, "req-1"))
+
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert calls == ["sk-key-aaaaaaaaaaaa", "sk-key-bbbbbbbbbbbb"]
+    assert key_a.rate_limited == 1 and key_a.benched_until > 0
+    assert key_b.remaining_requests == 99
+    assert key_a.in_flight == key_b.in_flight == 0
+
+
+def test_pooled_keys_keep_sdk_retries_for_everything_but_429():
+    calls = []
+    responses = {
+        "sk-key-aaaaaaaaaaaa": [503, 429],
+        "sk-key-bbbbbbbbbbbb": [500, 200],
+    }
+
+    def handler(request):
+        key = _used_key(request)
+        calls.append(key)
+        status = responses[key].pop(0)
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": "try again"}}, headers={"retry-after-ms": "1"})
+        return httpx.Response(200, json=_completion())
+
+    client = OpenAIClient(
+        "sk-key-aaaaaaaaaaaa",
+        "http://stub/v1",
+        api_keys=["sk-key-aaaaaaaaaaaa", "sk-key-bbbbbbbbbbbb"],
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+    result = asyncio.run(client.create_chat_completion({"model": "gpt-4o", "messages": []}, "req-1"))
+
+    assert result["choices"][0]["message"]["content"] == "ok"
+    # 5xx is retried on the same key by the SDK, a 429 moves to the other key right away
+    assert calls == ["sk-key-aaaaaaaaaaaa"] * 2 + ["sk-key-bbbbbbbbbbbb"] * 2
+    assert client.key_pool.keys[0].rate_limited == 1
+
+
+def test_stream_fails_over_before_first_chunk():
+    def handler(request):
+        if _used_key(request).endswith("a"):
+            return httpx.Response(429, json={"error": {"message": "slow down"}})
+        body = 'data: {"choices": [{"delta": {"content": "hi"}}]}\n\ndata: [DONE]\n\n'
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    client = _pooled_client(handler)
+
+    async def collect():
+        return [chunk async for chunk in client.create_chat_completion_stream({"model": "gpt-4o", "messages": []}, "req-1")]
+
+    chunks = asyncio.run(collect())
+
+    assert chunks == [{"choices": [{"delta": {"content": "hi"}}]}]
+    assert client.key_pool.keys[0].rate_limited == 1
+
+
+def test_concurrent_requests_spread_across_keys():
+    seen = []
+
+    async def handler(request):
+        seen.append(_used_key(request))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=_completion())
+
+    client = _pooled_client(handler)
+
+    async def run():
+        await asyncio.gather(
+            *(client.create_chat_completion({"model": "gpt-4o", "messages": []}, f"req-{i}") for i in range(6))
+        )
+
+    asyncio.run(run())
+
+    assert sorted(seen.count(key) for key in set(seen)) == [3, 3]
@@ -0,0 +1,132 @@
+"""Tests for the per-message conversion cache."""
+
+import src.conversion.request_converter as request_converter
+from src.conversion.message_cache import MessageConversionCache, message_key
+from src.core.model_manager import model_manager
+from src.models.claude import ClaudeMessagesRequest
+
+
+def _session(turns):
+    messages = [{"role": "user", "content": "Fix the failing test"}]
+    for turn in range(turns):
+        messages.append(
+            {
+                "role": "assistant",
+                "content": [
+                    {"type": "text", "text": f"Reading file {turn}"},
+                    {"type": "tool_use", "id": f"toolu_{turn}", "name": "Read", "input": {"path": f"src/{turn}.py"}},
+                ],
+            }
+        )
+        messages.append(
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": f"toolu_{turn}",
+                        "content": [{"type": "text", "text": f"contents of {turn}"}],
+                    }
+                ],
+            }
+        )
+    return ClaudeMessagesRequest(model="claude-3-5-sonnet", max_tokens=100, messages=messages)
+
+
+def _convert(monkeypatch, cache, request):
+    monkeypatch.setattr(request_converter, "message_cache", cache)
+    return request_converter.convert_claude_to_openai(request, model_manager)
+
+
+def test_cached_conversion_matches_uncached(monkeypatch):
+    request = _session(5)
+
+    uncached = _convert(monkeypatch, MessageConversionCache(0), request)
+    cache = MessageConversionCache()
+    first = _convert(monkeypatch, cache, request)
+    second = _convert(monkeypatch, cache, request)
+
+    assert first == uncached
+    assert second == uncached
+    assert cache.misses == 11
+    assert cache.hits == 11
+
+
+def test_only_new_messages_are_converted(monkeypatch):
+    cache = MessageConversionCache()
+    _convert(monkeypatch, cache, _session(5))
+    misses = cache.misses
+
+    _convert(monkeypatch, cache, _session(6))
+
+    # One new assistant message and its tool results
+    assert cache.misses - misses == 2
+
+
+def test_cache_is_bounded():
+    cache = MessageConversionCache(max_entries=2)
+    request = _session(3)
+    for msg in request.messages:
+        cache.convert("user", msg, lambda m: [{"role": "user", "content": "x"}])
+
+    assert len(cache) == 2
+
+
+def test_values_that_compare_equal_but_serialize_differently_get_distinct_keys():
+    def tool_result(content):
+        return ClaudeMessagesRequest(
+            model="claude-3-5-sonnet",
+            max_tokens=100,
+            messages=[{"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1", "content": content}]}],
+        ).messages[0]
+
+    def tool_use(tool_input):
+        return {"role": "assistant", "content": [{"type": "tool_use", "id": "toolu_1", "name": "Run", "input": tool_input}]}
+
+    assert message_key(tool_result({"ok": True})) != message_key(tool_result({"ok": 1}))
+    assert message_key(tool_use({"a": 1})) != message_key(tool_use([["a", 1]]))
+    assert message_key(tool_use({"n": 1})) != message_key(tool_use({"n": 1.0}))
+    assert message_key(tool_use({"a": [1, "x"]})) == message_key(tool_use({"a": [1, "x"]}))
+
+
+def _screenshot(data, as_dict=False):
+    msg = {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "What changed?"},
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": data}},
+        ],
+    }
+    if as_dict:
+        return msg
+    return ClaudeMessagesRequest(model="claude-3-5-sonnet", max_tokens=100, messages=[msg]).messages[0]
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, tuple):
+        for item in value:
+            yield from _strings(item)
+
+
+def test_image_payloads_are_keyed_by_digest():
+    data = "iVBORw0KGgo" * 1000
+
+    for as_dict in (False, True):
+        key = message_key(_screenshot(data, as_dict))
+        assert all(data not in string for string in _strings(key))
+        assert key == message_key(_screenshot(data, as_dict))
+        assert key != message_key(_screenshot(data + "A", as_dict))
+
+
+def test_cache_is_bounded_by_size():
+    cache = MessageConversionCache(max_entries=100, max_bytes=2500)
+    for index in range(5):
+        cache.convert("user", _screenshot(f"{index}" * 1000), lambda m: [{"role": "user", "content": m.content[1].source["data"]}])
+
+    assert len(cache) == 2
+    assert cache.total_bytes == 2 * (1000 + len("user"))
+
+    cache.convert("user", _screenshot("x" * 5000), lambda m: [{"role": "user", "content": m.content[1].source["data"]}])
+    assert len(cache) == 2  # larger than the whole cache, not stored
@@ -0,0 +1,72 @@
+"""Unit tests for the metrics registry and per-request stage timers."""
+
+import asyncio
+
+from src.conversion.response_converter import convert_openai_streaming_to_claude_with_cancellation
+from src.core.metrics import MetricsRegistry, RequestTimer, request_stage_seconds
+from src.models.claude import ClaudeMessagesRequest
+from tests.test_streaming import _ConnectedWatcher, _NullClient, _NullLogger, _aiter, _collect
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="convert")
+    histogram.observe(0.5, stage="convert")
+    histogram.observe(5.0, stage="convert")
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{stage="convert",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="convert",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="convert",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{stage="convert"} 3' in lines
+    assert 'latency_seconds_sum{stage="convert"} 5.55' in lines
+
+
+def test_callback_gauge_is_evaluated_on_scrape():
+    registry = MetricsRegistry()
+    hits = {"value": 1}
+    registry.gauge("hits_total", "Hits.", callback=lambda: hits["value"], type_name="counter")
+    hits["value"] = 7
+
+    assert "hits_total 7" in registry.render().splitlines()
+    assert "# TYPE hits_total counter" in registry.render()
+
+
+def test_request_timer_formats_server_timing():
+    timer = RequestTimer(start=0.0)
+    timer.add("convert", 0.0015)
+    timer.add("convert", 0.0005)
+    timer.add("upstream", 0.25)
+
+    assert timer.server_timing() == "convert;dur=2.00, upstream;dur=250.00"
+
+
+def test_stream_ends_with_server_timing_comment_and_publishes():
+    request = ClaudeMessagesRequest(
+        model="claude-3-5-sonnet-20241022",
+        max_tokens=100,
+        messages=[{"role": "user", "content": "hi"}],
+    )
+    chunks = [
+        {"choices": [{"delta": {"content": "Hi"}, "finish_reason": None}]},
+        {"choices": [{"delta": {}, "finish_reason": "stop"}]},
+    ]
+    before = request_stage_seconds._counts.get(("total", "stream"), [0])
+    before_count = sum(before)
+    timer = RequestTimer()
+
+    events = asyncio.run(
+        _collect(
+            convert_openai_streaming_to_claude_with_cancellation(
+                _aiter(chunks), request, _NullLogger(), _ConnectedWatcher(), _NullClient(), "req-1", timer
+            )
+        )
+    )
+
+    body = b"".join(events).decode("utf-8")
+    assert body.index("event: message_stop") < body.index(": server-timing ")
+    assert "stream_convert;dur=" in body and "total;dur=" in body
+    assert sum(request_stage_seconds._counts[("total", "stream")]) == before_count + 1
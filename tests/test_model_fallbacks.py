@@ -0,0 +1,241 @@
+"""Tests for per-tier model fallback chains."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import src.api.endpoints as endpoints
+from src.core.model_manager import ModelManager
+from tests.test_buffered_retries import _ManualWatcher, _completion, _stub_client
+from tests.test_streaming import _collect
+
+
+class _Config:
+    def __init__(self, models, circuit_breaker_fallbacks=None):
+        self.models = models
+        self.circuit_breaker_fallbacks = circuit_breaker_fallbacks or {}
+
+    def get_models_for_api_key(self, api_key):
+        return self.models
+
+
+def _chunk(content=None, finish_reason=None):
+    delta = {"content": content} if content else {}
+    return {"choices": [{"delta": delta, "finish_reason": finish_reason}]}
+
+
+class _ScriptedClient:
+    """Answers each model with a scripted behaviour: an exception, a delay, or chunks."""
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = []
+
+    async def create_chat_completion(self, request, request_id=None, timer=None):
+        model = request["model"]
+        self.calls.append(model)
+        behaviour = self.script[model]
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        if isinstance(behaviour, float):
+            await asyncio.sleep(behaviour)
+        return {"model": model}
+
+    async def create_chat_completion_stream(self, request, request_id=None, timer=None):
+        model = request["model"]
+        self.calls.append(model)
+        behaviour = self.script[model]
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        yield _chunk()  # role-only chunk, sent right away
+        if isinstance(behaviour, float):
+            await asyncio.sleep(behaviour)
+        yield _chunk(model)
+        yield _chunk(finish_reason="stop")
+
+    def cancel_request(self, request_id):
+        return False
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    def install(script, budgets=None):
+        client = _ScriptedClient(script)
+        monkeypatch.setattr(endpoints, "openai_client", client)
+        monkeypatch.setattr(endpoints.config, "max_retries", 0)
+        monkeypatch.setattr(endpoints.config, "model_ttft_budgets", budgets or {})
+        monkeypatch.setattr(endpoints.config, "model_streaming_modes", {})
+        return client
+
+    return install
+
+
+def test_fallback_chain_follows_the_tier_and_skips_the_primary():
+    manager = ModelManager(
+        _Config(
+            {
+                "big_model": "gpt-4o",
+                "middle_model": "gpt-4.1",
+                "small_model": "gpt-4o-mini",
+                "big_fallbacks": ["gpt-4o", "gpt-4.1", "gpt-4.1"],
+                "middle_fallbacks": ["gpt-4o"],
+                "small_fallbacks": [],
+            }
+        )
+    )
+
+    assert manager.fallback_models_for("claude-opus-4") == ["gpt-4.1"]
+    assert manager.fallback_models_for("claude-sonnet-4") == ["gpt-4o"]
+    assert manager.fallback_models_for("claude-3-5-haiku") == []
+    assert manager.fallback_models_for("gpt-4o") == []
+
+
+def test_models_without_a_tier_chain_follow_circuit_breaker_fallbacks():
+    models = {"big_model": "gpt-4o", "middle_model": "gpt-4o", "small_model": "gpt-4o-mini", "small_fallbacks": []}
+    manager = ModelManager(_Config(models, {"gpt-4o-mini": "gpt-4.1-mini", "gpt-4.1-mini": "gpt-4o-mini", "gpt-4.1": "gpt-4o"}))
+
+    assert manager.fallback_models_for("claude-3-5-haiku") == ["gpt-4.1-mini"]
+    assert manager.fallback_models_for("gpt-4.1") == ["gpt-4o"]
+
+
+def test_buffered_request_falls_back_on_429_and_ttft_budget(scripted):
+    client = scripted(
+        {
+            "primary": HTTPException(status_code=429, detail="rate limited"),
+            "slow": 1.0,
+            "backup": 0.0,
+        },
+        budgets={"slow": 0.05},
+    )
+
+    response = asyncio.run(
+        endpoints._gather_openai_response_with_fallbacks(
+            {"model": "primary", "messages": []}, ["primary", "slow", "backup"], "req-1", _ManualWatcher(), "buffered"
+        )
+    )
+
+    assert response == {"model": "backup"}
+    assert client.calls == ["primary", "slow", "backup"]
+    assert endpoints.model_fallbacks_total.get(model="slow", fallback="backup", reason="ttft_budget") == 1
+
+
+def test_client_errors_do_not_fall_back(scripted):
+    client = scripted({"primary": HTTPException(status_code=400, detail="bad request"), "backup": 0.0})
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(
+            endpoints._gather_openai_response_with_fallbacks(
+                {"model": "primary", "messages": []}, ["primary", "backup"], "req-2", _ManualWatcher(), "buffered"
+            )
+        )
+
+    assert exc_info.value.status_code == 400
+    assert client.calls == ["primary"]
+
+
+def test_stream_falls_back_before_the_first_token(scripted):
+    client = scripted(
+        {"primary": HTTPException(status_code=503, detail="overloaded"), "slow": 1.0, "backup": 0.0},
+        budgets={"slow": 0.05},
+    )
+
+    chunks = asyncio.run(
+        _collect(
+            endpoints._stream_openai_response_with_fallbacks(
+                {"model": "primary", "messages": []}, ["primary", "slow", "backup"], "req-3", _ManualWatcher()
+            )
+        )
+    )
+
+    # The slow model's role chunk was held back, so the client only sees the backup's stream
+    assert chunks == [_chunk(), _chunk("backup"), _chunk(finish_reason="stop")]
+    assert client.calls == ["primary", "slow", "backup"]
+
+
+def test_ttft_budget_cancels_the_abandoned_upstream_call(monkeypatch):
+    cancelled = []
+    started = asyncio.Event()
+
+    async def handler(request):
+        model = json.loads(request.content)["model"]
+        if model == "slow":
+            started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(model)
+                raise
+        return httpx.Response(200, json=_completion(model))
+
+    monkeypatch.setattr(endpoints, "openai_client", _stub_client(handler))
+    monkeypatch.setattr(endpoints.config, "max_retries", 0)
+    monkeypatch.setattr(endpoints.config, "model_ttft_budgets", {"slow": 0.5})
+
+    async def scenario():
+        response = await endpoints._gather_openai_response_with_fallbacks(
+            {"model": "slow", "messages": []}, ["slow", "backup"], "req-4", _ManualWatcher(), "buffered"
+        )
+        assert started.is_set()
+        await asyncio.sleep(0)
+        return response, [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    response, leftover = asyncio.run(scenario())
+
+    assert response["model"] == "backup"
+    assert cancelled == ["slow"]
+    assert leftover == []
+    assert endpoints.openai_client.active_requests == {}
+
+
+def test_fallback_models_use_their_own_streaming_mode(scripted, monkeypatch):
+    client = scripted({"primary": HTTPException(status_code=503, detail="overloaded"), "backup": 0.0})
+    monkeypatch.setattr(endpoints.config, "model_streaming_modes", {"backup": "buffered"})
+
+    async def fetch_buffered(request, request_id=None, timer=None):
+        client.calls.append(f"{request['model']} (buffered)")
+        assert "stream" not in request
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "whole"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1},
+        }
+
+    monkeypatch.setattr(client, "create_chat_completion", fetch_buffered)
+
+    chunks = asyncio.run(
+        _collect(
+            endpoints._stream_openai_response_with_fallbacks(
+                {"model": "primary", "messages": [], "stream": True}, ["primary", "backup"], "req-5", _ManualWatcher()
+            )
+        )
+    )
+
+    assert client.calls == ["primary", "backup (buffered)"]
+    assert [chunk["choices"][0]["delta"].get("content") for chunk in chunks[:2]] == ["whole", None]
+    assert chunks[-1]["usage"] == {"prompt_tokens": 1, "completion_tokens": 1}
+
+
+def test_fallback_requests_get_their_own_image_policy(scripted, monkeypatch):
+    scripted({"primary": HTTPException(status_code=429, detail="rate limited"), "backup": 0.0})
+    applied = []
+
+    class _Policies:
+        enabled = True
+
+        async def apply(self, request):
+            applied.append((request["model"], request["messages"]))
+            return request
+
+    monkeypatch.setattr(endpoints, "image_policy", _Policies())
+    original = {"model": "primary", "messages": ["original"]}
+    processed = {"model": "primary", "messages": ["downscaled for primary"]}
+
+    asyncio.run(
+        endpoints._gather_openai_response_with_fallbacks(
+            processed, ["primary", "backup"], "req-6", _ManualWatcher(), "buffered", base_request=original
+        )
+    )
+
+    assert applied == [("backup", ["original"])]
@@ -0,0 +1,156 @@
+"""Tests for the exact-match response cache."""
+
+import asyncio
+import json
+
+import httpx
+
+import src.api.endpoints as endpoints
+from src.core.response_cache import ResponseCache
+from tests.test_buffered_retries import _stub_client
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _request(**overrides):
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}], "temperature": 0}
+    request.update(overrides)
+    return request
+
+
+def test_key_is_canonical_and_scoped_per_client_key():
+    key = ResponseCache.key_for(_request(), "buffered", "client-a")
+
+    reordered = dict(reversed(list(_request(stream_options={"include_usage": True}).items())))
+    assert ResponseCache.key_for(reordered, "buffered", "client-a") == key
+    assert ResponseCache.key_for(_request(), "buffered", "client-b") != key
+    assert ResponseCache.key_for(_request(), "stream", "client-a") != key
+    assert ResponseCache.key_for(_request(max_tokens=10), "buffered", "client-a") != key
+
+
+def test_only_deterministic_requests_are_cacheable():
+    assert ResponseCache.cacheable(_request())
+    assert not ResponseCache.cacheable(_request(temperature=0.7))
+    assert not ResponseCache.cacheable({"model": "gpt-4o", "messages": []})
+
+
+def test_lru_and_ttl_eviction():
+    clock = _Clock()
+    cache = ResponseCache(max_entries=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a", "buffered") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+
+    assert cache.get("b", "buffered") is None
+    assert cache.get("a", "buffered") == 1
+
+    clock.now = 11
+    assert cache.get("c", "buffered") is None
+    assert len(cache) == 1
+
+
+def test_incomplete_stream_is_not_cached():
+    cache = ResponseCache()
+
+    async def broken():
+        yield {"choices": [{"delta": {"content": "Hel"}}]}
+        raise RuntimeError("upstream dropped")
+
+    async def consume():
+        async for _ in cache.record_stream("k", broken()):
+            pass
+
+    try:
+        asyncio.run(consume())
+    except RuntimeError:
+        pass
+    assert len(cache) == 0
+
+
+def _completion_handler(calls):
+    def handler(request):
+        calls.append(json.loads(request.content))
+        if calls[-1].get("stream"):
+            chunks = [
+                {"id": "c1", "choices": [{"index": 0, "delta": {"content": "Hello"}, "finish_reason": None}]},
+                {"id": "c1", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+            ]
+            body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        return httpx.Response(
+            200,
+            json={
+                "id": "c1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4o",
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": "Hello"}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+            },
+        )
+
+    return handler
+
+
+def _post_twice(monkeypatch, body):
+    from src.main import app
+
+    calls = []
+    monkeypatch.setattr(endpoints, "openai_client", _stub_client(_completion_handler(calls)))
+    monkeypatch.setattr(endpoints, "response_cache", ResponseCache(max_entries=16, ttl=60))
+    monkeypatch.setattr(endpoints.config, "anthropic_api_key", None)
+    monkeypatch.setattr(endpoints.config, "api_key_model_mapping", {})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            first = await client.post("/v1/messages", json=body)
+            second = await client.post("/v1/messages", json=body)
+            return first, second
+
+    first, second = asyncio.run(run())
+    return calls, first, second
+
+
+def test_buffered_response_is_served_from_cache(monkeypatch):
+    body = {
+        "model": "gpt-4o",
+        "max_tokens": 16,
+        "temperature": 0,
+        "messages": [{"role": "user", "content": "hi"}],
+    }
+
+    calls, first, second = _post_twice(monkeypatch, body)
+
+    assert len(calls) == 1
+    assert first.headers["x-proxy-cache"] == "MISS"
+    assert second.headers["x-proxy-cache"] == "HIT"
+    assert second.json()["content"] == first.json()["content"]
+
+
+def test_stream_is_replayed_from_cache(monkeypatch):
+    monkeypatch.setattr(endpoints.config, "default_streaming_mode", "stream")
+    monkeypatch.setattr(endpoints.config, "model_streaming_modes", {})
+    body = {
+        "model": "gpt-4o",
+        "max_tokens": 16,
+        "temperature": 0,
+        "stream": True,
+        "messages": [{"role": "user", "content": "hi"}],
+    }
+
+    calls, first, second = _post_twice(monkeypatch, body)
+
+    assert len(calls) == 1
+    assert second.headers["x-proxy-cache"] == "HIT"
+    assert '"text": "Hello"' in second.text
+    assert "message_stop" in second.text
@@ -0,0 +1,105 @@
+"""Tests for coalescing identical concurrent upstream calls."""
+
+import asyncio
+
+from fastapi import HTTPException
+
+from src.core.single_flight import SingleFlight
+from tests.test_buffered_retries import _ManualWatcher
+
+
+def test_identical_buffered_calls_share_one_upstream_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch(flight):
+        calls.append(flight.request_id)
+        await asyncio.sleep(0.01)
+        return {"id": "shared"}
+
+    async def run():
+        return await asyncio.gather(
+            *(flights.call("key", f"req-{i}", _ManualWatcher(), fetch) for i in range(3))
+        )
+
+    results = asyncio.run(run())
+
+    assert calls == ["req-0-shared"]
+    assert results == [{"id": "shared"}] * 3
+    assert len(flights) == 0
+
+
+def test_upstream_is_cancelled_only_when_last_waiter_leaves():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def fetch(flight):
+        flight.add_callback(lambda: cancelled.append(flight.request_id))
+        await flight.event.wait()
+        raise HTTPException(status_code=499, detail="Request cancelled by client")
+
+    async def run():
+        first, second = _ManualWatcher(), _ManualWatcher()
+        waiters = [
+            asyncio.create_task(flights.call("key", "req-a", first, fetch)),
+            asyncio.create_task(flights.call("key", "req-b", second, fetch)),
+        ]
+        await asyncio.sleep(0)
+        first.disconnect()
+        await asyncio.sleep(0.01)
+        assert cancelled == []
+        second.disconnect()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert cancelled == ["req-a-shared"]
+    assert all(isinstance(result, HTTPException) and result.status_code == 499 for result in results)
+
+
+def test_stream_is_broadcast_to_late_joiners():
+    flights = SingleFlight()
+    opened = []
+    release = None
+
+    async def upstream(flight):
+        opened.append(flight.request_id)
+        yield {"n": 1}
+        await release.wait()
+        yield {"n": 2}
+
+    async def consume(request_id):
+        return [chunk async for chunk in flights.stream("key", request_id, _ManualWatcher(), upstream)]
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        early = asyncio.create_task(consume("req-a"))
+        await asyncio.sleep(0.01)
+        late = asyncio.create_task(consume("req-b"))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(early, late)
+
+    early, late = asyncio.run(run())
+
+    assert opened == ["req-a-shared"]
+    assert early == late == [{"n": 1}, {"n": 2}]
+
+
+def test_stream_error_reaches_every_waiter():
+    flights = SingleFlight()
+
+    async def upstream(flight):
+        yield {"n": 1}
+        raise HTTPException(status_code=502, detail="bad gateway")
+
+    async def consume(request_id):
+        return [chunk async for chunk in flights.stream("key", request_id, _ManualWatcher(), upstream)]
+
+    async def run():
+        return await asyncio.gather(consume("req-a"), consume("req-b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert [result.status_code for result in results] == [502, 502]
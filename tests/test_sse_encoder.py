@@ -0,0 +1,113 @@
+"""Tests for the byte-level Claude SSE event encoder."""
+
+import json
+
+import pytest
+
+from src.conversion import sse_encoder
+from src.core.constants import Constants
+
+TRICKY = 'say "hi"\n\tto 世界 — \\   \x01 😀'
+
+
+def _fstring(event_type, payload):
+    """The f-string + json.dumps encoding the encoder replaced."""
+    return f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def _parse(event: bytes):
+    text = event.decode("utf-8")
+    assert text.endswith("\n\n")
+    event_line, data_line = text[:-2].split("\n")
+    assert event_line.startswith("event: ") and data_line.startswith("data: ")
+    return event_line[len("event: "):], json.loads(data_line[len("data: "):])
+
+
+@pytest.mark.parametrize(
+    "event, event_type, payload",
+    [
+        (
+            sse_encoder.text_delta(0, TRICKY),
+            Constants.EVENT_CONTENT_BLOCK_DELTA,
+            {"type": Constants.EVENT_CONTENT_BLOCK_DELTA, "index": 0, "delta": {"type": Constants.DELTA_TEXT, "text": TRICKY}},
+        ),
+        (
+            sse_encoder.input_json_delta(3, '{"path": "a\\nb", "t'),
+            Constants.EVENT_CONTENT_BLOCK_DELTA,
+            {
+                "type": Constants.EVENT_CONTENT_BLOCK_DELTA,
+                "index": 3,
+                "delta": {"type": Constants.DELTA_INPUT_JSON, "partial_json": '{"path": "a\\nb", "t'},
+            },
+        ),
+        (
+            sse_encoder.content_block_stop(2),
+            Constants.EVENT_CONTENT_BLOCK_STOP,
+            {"type": Constants.EVENT_CONTENT_BLOCK_STOP, "index": 2},
+        ),
+        (
+            sse_encoder.text_block_start(0),
+            Constants.EVENT_CONTENT_BLOCK_START,
+            {"type": Constants.EVENT_CONTENT_BLOCK_START, "index": 0, "content_block": {"type": Constants.CONTENT_TEXT, "text": ""}},
+        ),
+        (
+            sse_encoder.tool_use_block_start(1, "toolu_\"1\"", "Read 文件"),
+            Constants.EVENT_CONTENT_BLOCK_START,
+            {
+                "type": Constants.EVENT_CONTENT_BLOCK_START,
+                "index": 1,
+                "content_block": {"type": Constants.CONTENT_TOOL_USE, "id": "toolu_\"1\"", "name": "Read 文件", "input": {}},
+            },
+        ),
+        (
+            sse_encoder.message_start("msg_1", "claude-3-5-sonnet"),
+            Constants.EVENT_MESSAGE_START,
+            {
+                "type": Constants.EVENT_MESSAGE_START,
+                "message": {
+                    "id": "msg_1",
+                    "type": "message",
+                    "role": Constants.ROLE_ASSISTANT,
+                    "model": "claude-3-5-sonnet",
+                    "content": [],
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": 0, "output_tokens": 0},
+                },
+            },
+        ),
+        (
+            sse_encoder.message_delta("end_turn", {"input_tokens": 5, "output_tokens": 7}),
+            Constants.EVENT_MESSAGE_DELTA,
+            {
+                "type": Constants.EVENT_MESSAGE_DELTA,
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"input_tokens": 5, "output_tokens": 7},
+            },
+        ),
+        (
+            sse_encoder.error("api_error", TRICKY),
+            "error",
+            {"type": "error", "error": {"type": "api_error", "message": TRICKY}},
+        ),
+        (sse_encoder.PING, Constants.EVENT_PING, {"type": Constants.EVENT_PING}),
+        (sse_encoder.MESSAGE_STOP, Constants.EVENT_MESSAGE_STOP, {"type": Constants.EVENT_MESSAGE_STOP}),
+    ],
+)
+def test_events_match_the_fstring_encoding_and_round_trip(event, event_type, payload):
+    assert isinstance(event, bytes)
+    assert event == _fstring(event_type, payload)
+    assert _parse(event) == (event_type, payload)
+
+
+def test_text_is_escaped_into_a_single_data_line():
+    event = sse_encoder.text_delta(0, "line one\nline two\r\n\"quoted\" 世界")
+
+    # Newlines in the payload must not break the SSE framing
+    assert event.count(b"\n") == 3
+    assert '世界'.encode("utf-8") in event  # non-ASCII is sent as UTF-8, not \\u escapes
+    assert _parse(event)[1]["delta"]["text"] == "line one\nline two\r\n\"quoted\" 世界"
+
+
+def test_comment():
+    assert sse_encoder.comment("server-timing total;dur=1.00") == b": server-timing total;dur=1.00\n\n"
@@ -0,0 +1,92 @@
+"""Tests for the shared worker state backends."""
+
+import os
+import tempfile
+
+from src.core.key_pool import KeyPool, PooledKey
+from src.core.state import MemoryStateBackend, StateServer, UnixSocketStateBackend
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _socket_path() -> str:
+    return os.path.join(tempfile.mkdtemp(), "state.sock")
+
+
+def test_memory_backend_ttl_max_and_token_bucket():
+    clock = _Clock()
+    state = MemoryStateBackend(clock=clock)
+
+    state.set("a", 1.0, ttl=5)
+    assert state.set_max("a", 0.5) == 1.0
+    assert state.set_max("b", 2.0) == 2.0
+    clock.now += 5
+    assert state.get_many(["a", "b", "c"]) == {"b": 2.0}
+
+    assert [state.take("bucket", rate=2, burst=2) for _ in range(3)] == [0.0, 0.0, 0.5]
+    clock.now += 0.5
+    assert state.take("bucket", rate=2, burst=2) == 0.0
+
+
+def test_unix_socket_backend_shares_state_between_clients():
+    path = _socket_path()
+    server = StateServer(path)
+    server.start()
+    first, second = UnixSocketStateBackend(path), UnixSocketStateBackend(path)
+    try:
+        first.set("bench:default:a", 1.0, ttl=60)
+        # Reads come from the local mirror, which the background sync refreshes
+        assert second.get_many(["bench:default:a", "bench:default:b"]) == {}
+        first.sync()
+        second.sync()
+        assert second.get_many(["bench:default:a", "bench:default:b"]) == {"bench:default:a": 1.0}
+        assert first.take("bucket", 1, 1) == 0.0
+        assert second.take("bucket", 1, 1) > 0.0
+    finally:
+        first.close()
+        second.close()
+        server.stop()
+
+
+def test_unreachable_server_falls_back_to_process_state_and_reconnects():
+    clock = _Clock()
+    path = _socket_path()
+    state = UnixSocketStateBackend(path, clock=clock)
+
+    state.set("a", 3.0)
+    assert state.get_many(["a"]) == {"a": 3.0}
+    assert state.take("bucket", 1, 1) == 0.0
+    assert not state.connected
+
+    server = StateServer(path)
+    server.start()
+    try:
+        state.take("bucket", 1, 1)
+        assert not state.connected  # still backing off
+        clock.now += 1
+        assert state.take("bucket", 1, 1) == 0.0  # the server has its own bucket
+        assert state.connected
+    finally:
+        state.close()
+        server.stop()
+
+
+def test_bench_in_one_worker_is_seen_by_another():
+    state = MemoryStateBackend()
+    state.shared = True  # stands in for a server shared by two workers
+    a1, b1 = PooledKey("sk-key-aaaaaaaaaaaa", None), PooledKey("sk-key-bbbbbbbbbbbb", None)
+    a2, b2 = PooledKey("sk-key-aaaaaaaaaaaa", None), PooledKey("sk-key-bbbbbbbbbbbb", None)
+    worker1 = KeyPool([a1, b1], state=state, namespace="default")
+    worker2 = KeyPool([a2, b2], state=state, namespace="default", sync_interval=0)
+
+    worker1.bench(a1, retry_after=30)
+
+    assert worker2.acquire() is b2
+    assert worker2.acquire() is b2  # a2 stays benched even though b2 is busier
+
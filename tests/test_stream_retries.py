@@ -0,0 +1,120 @@
+"""Tests for streaming retries before the first token and mid-stream resume."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import src.api.endpoints as endpoints
+from tests.test_buffered_retries import _ManualWatcher, _stub_client
+from tests.test_streaming import _ConnectedWatcher, _NullClient, _NullLogger, _collect
+from src.conversion.response_converter import convert_openai_streaming_to_claude_with_cancellation
+from src.models.claude import ClaudeMessagesRequest
+
+
+def _sse_body(*contents, finish=True):
+    chunks = [{"choices": [{"delta": {"content": content}, "finish_reason": None}]} for content in contents]
+    if finish:
+        chunks.append({"choices": [{"delta": {}, "finish_reason": "stop"}]})
+    return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + ("data: [DONE]\n\n" if finish else "")
+
+
+class _BrokenStream(httpx.AsyncByteStream):
+    """Sends part of an SSE body, then drops the connection."""
+
+    def __init__(self, body: str):
+        self.body = body.encode()
+
+    async def __aiter__(self):
+        yield self.body
+        raise httpx.ReadError("connection dropped")
+
+
+def _stream(monkeypatch, handler, **config_overrides):
+    monkeypatch.setattr(endpoints.config, "max_retries", 2)
+    for name, value in config_overrides.items():
+        monkeypatch.setattr(endpoints.config, name, value)
+    monkeypatch.setattr(endpoints, "_retry_backoff", _no_backoff)
+    monkeypatch.setattr(endpoints, "openai_client", _stub_client(handler))
+    return endpoints._stream_openai_response_with_retries(
+        {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]}, "gpt-4o", "req-1", _ManualWatcher()
+    )
+
+
+async def _no_backoff(attempt, request_id, disconnect_watcher):
+    return None
+
+
+def _text(chunks):
+    return "".join(
+        (choice.get("delta") or {}).get("content") or "" for chunk in chunks for choice in chunk.get("choices") or []
+    )
+
+
+def test_failure_before_first_chunk_is_retried(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, json={"error": {"message": "overloaded"}})
+        return httpx.Response(200, text=_sse_body("Hel", "lo"), headers={"content-type": "text/event-stream"})
+
+    chunks = asyncio.run(_collect(_stream(monkeypatch, handler)))
+
+    assert _text(chunks) == "Hello"
+    assert len(calls) == 2
+
+
+def test_mid_stream_failure_is_raised_without_resume(monkeypatch):
+    def handler(request):
+        return httpx.Response(
+            200, stream=_BrokenStream(_sse_body("Hel", finish=False)), headers={"content-type": "text/event-stream"}
+        )
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(_collect(_stream(monkeypatch, handler, stream_resume=False)))
+    assert exc_info.value.status_code == 500
+
+
+def test_mid_stream_failure_resumes_with_partial_text_on_same_block(monkeypatch):
+    bodies = []
+
+    def handler(request):
+        bodies.append(json.loads(request.content))
+        if len(bodies) == 1:
+            return httpx.Response(
+                200, stream=_BrokenStream(_sse_body("Hel", finish=False)), headers={"content-type": "text/event-stream"}
+            )
+        return httpx.Response(200, text=_sse_body("lo", " world"), headers={"content-type": "text/event-stream"})
+
+    openai_stream = _stream(
+        monkeypatch,
+        handler,
+        stream_resume=True,
+        stream_resume_extra_body={"continue_final_message": True},
+    )
+    request = ClaudeMessagesRequest(
+        model="claude-3-5-sonnet-20241022", max_tokens=100, messages=[{"role": "user", "content": "hi"}]
+    )
+    events = asyncio.run(
+        _collect(
+            convert_openai_streaming_to_claude_with_cancellation(
+                openai_stream, request, _NullLogger(), _ConnectedWatcher(), _NullClient(), "req-1"
+            )
+        )
+    )
+    body = b"".join(events).decode()
+
+    assert bodies[1]["messages"][-1] == {"role": "assistant", "content": "Hel"}
+    assert bodies[1]["continue_final_message"] is True
+    deltas = [
+        json.loads(line[len("data: "):])
+        for line in body.splitlines()
+        if line.startswith("data: ") and '"text_delta"' in line
+    ]
+    assert [(delta["index"], delta["delta"]["text"]) for delta in deltas] == [(0, "Hel"), (0, "lo"), (0, " world")]
+    assert body.count("event: content_block_start") == 1
+    assert "event: error" not in body
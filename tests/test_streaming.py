@@ -0,0 +1,186 @@
+"""Unit tests for the raw SSE streaming path and the Claude stream converter."""
+
+import asyncio
+import json
+
+import pytest
+from openai import APIError
+
+from src.core.client import iter_sse_chunks
+from src.conversion.response_converter import convert_openai_streaming_to_claude_with_cancellation
+from src.models.claude import ClaudeMessagesRequest
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def _sse(*events):
+    lines = []
+    for event in events:
+        lines.append(f"data: {event if isinstance(event, str) else json.dumps(event)}")
+        lines.append("")
+    return lines
+
+
+class _ConnectedWatcher:
+    disconnected = False
+
+    def stop(self):
+        pass
+
+
+class _NullClient:
+    def cancel_request(self, request_id):
+        return False
+
+
+class _NullLogger:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def _convert(chunks):
+    request = ClaudeMessagesRequest(
+        model="claude-3-5-sonnet-20241022",
+        max_tokens=100,
+        messages=[{"role": "user", "content": "hi"}],
+    )
+    events = asyncio.run(
+        _collect(
+            convert_openai_streaming_to_claude_with_cancellation(
+                _aiter(chunks), request, _NullLogger(), _ConnectedWatcher(), _NullClient(), "req-1"
+            )
+        )
+    )
+    parsed = []
+    # One write may carry several events
+    body = b"".join(event if isinstance(event, bytes) else event.encode("utf-8") for event in events)
+    for event in body.decode("utf-8").split("\n\n"):
+        if not event or event.startswith(":"):
+            continue
+        name, data = event.strip().split("\n", 1)
+        parsed.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+def test_sse_chunks_are_parsed_once_and_stop_at_done():
+    lines = _sse({"choices": [{"delta": {"content": "a"}}]}, {"choices": [{"delta": {"content": "b"}}]}, "[DONE]")
+    lines += _sse({"choices": [{"delta": {"content": "never"}}]})
+    chunks = asyncio.run(_collect(iter_sse_chunks(_aiter(lines))))
+    assert [c["choices"][0]["delta"]["content"] for c in chunks] == ["a", "b"]
+
+
+def test_sse_chunks_skip_comments_and_handle_compact_data_prefix():
+    lines = [": keep-alive", "", "event: message", 'data:{"choices": []}', "", "data: [DONE]", ""]
+    chunks = asyncio.run(_collect(iter_sse_chunks(_aiter(lines))))
+    assert chunks == [{"choices": []}]
+
+
+def test_sse_error_event_raises_api_error():
+    lines = _sse({"error": {"message": "upstream overloaded"}})
+    with pytest.raises(APIError):
+        asyncio.run(_collect(iter_sse_chunks(_aiter(lines))))
+
+
+def test_converter_consumes_chunk_dicts():
+    chunks = [
+        {"choices": [{"delta": {"role": "assistant", "content": "Hel"}, "finish_reason": None}]},
+        {"choices": [{"delta": {"content": "lo"}, "finish_reason": None}]},
+        {"choices": [{"delta": {}, "finish_reason": "stop"}]},
+        {"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": 2}},
+    ]
+    events = _convert(chunks)
+    texts = [data["delta"]["text"] for name, data in events if name == "content_block_delta"]
+    assert texts == ["Hel", "lo"]
+    message_delta = [data for name, data in events if name == "message_delta"][0]
+    assert message_delta["delta"]["stop_reason"] == "end_turn"
+    assert message_delta["usage"]["input_tokens"] == 7
+    assert events[-1][0] == "message_stop"
+
+
+def test_json_tracker_forwards_fragments_until_value_closes():
+    from src.conversion.json_stream import JsonCompletenessTracker
+
+    tracker = JsonCompletenessTracker()
+    fragments = ['{"path": "a}b', '\\\\', '\\"c", "items": [1, {"x"', ': "]"}]', "}", '{"path": "dup"}']
+    forwarded = [tracker.feed(fragment) for fragment in fragments]
+    assert forwarded[:-1] == fragments[:-1]
+    assert forwarded[-1] == ""
+    assert tracker.complete
+    assert json.loads("".join(forwarded)) == {"path": 'a}b\\"c', "items": [1, {"x": "]"}]}
+
+
+def test_json_tracker_escape_split_across_fragments():
+    from src.conversion.json_stream import JsonCompletenessTracker
+
+    tracker = JsonCompletenessTracker()
+    assert tracker.feed('{"q": "say \\') == '{"q": "say \\'
+    assert not tracker.complete
+    assert tracker.feed('"hi\\"" }  ') == '"hi\\"" }'
+    assert tracker.complete
+
+
+def test_converter_streams_tool_arguments_incrementally():
+    tool_start = {"index": 0, "id": "call_1", "type": "function", "function": {"name": "write", "arguments": ""}}
+    pieces = ['{"content": "', "x" * 10, '", "path": "/tmp/f"', "}"]
+    chunks = [{"choices": [{"delta": {"tool_calls": [tool_start]}, "finish_reason": None}]}]
+    for piece in pieces:
+        chunks.append({"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}}]})
+    chunks.append({"choices": [{"delta": {}, "finish_reason": "tool_calls"}]})
+
+    events = _convert(chunks)
+    partials = [
+        data["delta"]["partial_json"]
+        for name, data in events
+        if name == "content_block_delta" and data["delta"]["type"] == "input_json_delta"
+    ]
+    assert partials == pieces
+    assert json.loads("".join(partials)) == {"content": "x" * 10, "path": "/tmp/f"}
+    starts = [data for name, data in events if name == "content_block_start" and data["index"] == 1]
+    assert starts[0]["content_block"]["name"] == "write"
+
+
+def test_converter_keeps_arguments_sent_before_tool_name():
+    chunks = [
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "call_1", "function": {"arguments": '{"a": '}}]}}]},
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"name": "f", "arguments": "1}"}}]}}]},
+        {"choices": [{"delta": {}, "finish_reason": "tool_calls"}]},
+    ]
+    partials = [
+        data["delta"]["partial_json"]
+        for name, data in _convert(chunks)
+        if name == "content_block_delta" and data["delta"]["type"] == "input_json_delta"
+    ]
+    assert partials == ['{"a": 1}']
+
+
+def test_disconnect_watcher_fires_callbacks_once_on_http_disconnect():
+    from src.core.disconnect import DisconnectWatcher
+
+    async def scenario():
+        messages = asyncio.Queue()
+
+        class _Request:
+            receive = messages.get
+
+        cancelled = []
+        watcher = DisconnectWatcher(_Request(), "req-1")
+        watcher.add_callback(lambda: cancelled.append("req-1"))
+        watcher.start()
+        await asyncio.sleep(0)
+        assert not watcher.disconnected
+
+        await messages.put({"type": "http.request", "body": b"", "more_body": False})
+        await messages.put({"type": "http.disconnect"})
+        await asyncio.wait_for(watcher.event.wait(), timeout=1)
+        watcher.add_callback(lambda: cancelled.append("late"))
+        watcher.stop()
+        return watcher.disconnected, cancelled
+
+    assert asyncio.run(scenario()) == (True, ["req-1", "late"])
@@ -0,0 +1,164 @@
+"""Tests for the count_tokens token counter."""
+
+import base64
+import json
+import os
+
+import pytest
+
+import src.core.token_counter as token_counter
+from src.conversion.request_converter import convert_claude_to_openai
+from src.core.config import config
+from src.core.model_manager import model_manager
+from src.core.token_counter import TokenCounter, _vocab_cache_path, load_tiktoken_encoding
+from src.models.claude import ClaudeMessagesRequest
+
+
+class _WordEncoder:
+    """Stand-in encoder: one token per whitespace-separated word."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def _openai_request(**overrides):
+    payload = {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 100,
+        "messages": [{"role": "user", "content": "hello there"}],
+    }
+    payload.update(overrides)
+    return convert_claude_to_openai(ClaudeMessagesRequest(**payload), model_manager)
+
+
+def test_encoders_are_loaded_lazily_and_cached_per_encoding():
+    loads = []
+
+    def loader(name, vocab_dir):
+        loads.append(name)
+        return _WordEncoder()
+
+    counter = TokenCounter(config, loader=loader)
+    assert loads == []
+    counter.count_request(_openai_request())
+    counter.count_request(_openai_request())
+    assert len(loads) == 1
+
+
+def test_falls_back_to_heuristic_without_vocabulary(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "tokenizer_vocab_dir", str(tmp_path))
+    counter = TokenCounter(config)
+    request = _openai_request(messages=[{"role": "user", "content": "x" * 400}])
+    assert counter.get_encoder(request["model"]) is None
+    assert counter.count_request(request) >= 100
+
+
+def test_counts_tools_tool_calls_tool_results_and_images():
+    counter = TokenCounter(config, loader=lambda name, vocab_dir: _WordEncoder())
+    text_only = counter.count_request(_openai_request())
+
+    tools = [{"name": "read_file", "description": "Read a file", "input_schema": {"type": "object"}}]
+    messages = [
+        {"role": "user", "content": "hello there"},
+        {
+            "role": "assistant",
+            "content": [{"type": "tool_use", "id": "toolu_1", "name": "read_file", "input": {"path": "a b c"}}],
+        },
+        {
+            "role": "user",
+            "content": [
+                {"type": "tool_result", "tool_use_id": "toolu_1", "content": "one two three four"},
+            ],
+        },
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "look"},
+                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "AAAA"}},
+            ],
+        },
+    ]
+    full = counter.count_request(_openai_request(messages=messages, tools=tools))
+    with_tools_only = counter.count_request(_openai_request(tools=tools))
+
+    assert with_tools_only > text_only
+    assert full > with_tools_only + 1600
+
+
+def test_growing_conversation_only_tokenizes_new_messages():
+    class _CountingEncoder(_WordEncoder):
+        calls = 0
+
+        def encode(self, text, disallowed_special=()):
+            _CountingEncoder.calls += 1
+            return super().encode(text)
+
+    counter = TokenCounter(config, loader=lambda name, vocab_dir: _CountingEncoder())
+    messages = [{"role": "user", "content": "turn zero"}]
+    totals = []
+    for turn in range(1, 4):
+        before = _CountingEncoder.calls
+        totals.append(counter.count_request(_openai_request(messages=list(messages))))
+        if turn > 1:
+            # role + content of the two new messages only
+            assert _CountingEncoder.calls - before == 4
+        messages += [{"role": "assistant", "content": f"reply {turn}"}, {"role": "user", "content": f"turn {turn}"}]
+
+    uncached = TokenCounter(config, loader=lambda name, vocab_dir: _WordEncoder())
+    assert totals[-1] == uncached.count_request(_openai_request(messages=messages[:-2]))
+    stats = counter.cache_stats()
+    assert stats["hits"] == 1 + 3
+    assert stats["misses"] == 1 + 2 + 2
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_image_data_is_not_serialized_for_the_memo_key(monkeypatch):
+    serialized = []
+    dumps = json.dumps
+
+    def recording_dumps(value, **kwargs):
+        serialized.append(dumps(value, **kwargs))
+        return serialized[-1]
+
+    monkeypatch.setattr(token_counter.json, "dumps", recording_dumps)
+    counter = TokenCounter(config, loader=lambda name, vocab_dir: _WordEncoder())
+
+    def screenshot(data):
+        return {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "what changed"},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{data}"}},
+            ],
+        }
+
+    encoder = counter.get_encoder("gpt-4o")
+    first = counter._cached_count("o200k_base", screenshot("A" * 100_000), encoder, counter.count_message)
+    second = counter._cached_count("o200k_base", screenshot("B" * 100_000), encoder, counter.count_message)
+
+    assert first == second
+    assert counter.cache_stats()["hits"] == 1
+    assert max(len(text) for text in serialized) < 1000
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(config, "token_count_cache_size", 2)
+    counter = TokenCounter(config, loader=lambda name, vocab_dir: _WordEncoder())
+    for i in range(5):
+        counter.count_request(_openai_request(messages=[{"role": "user", "content": f"message {i}"}]))
+    assert counter.cache_stats()["entries"] == 2
+
+
+def test_loads_the_vocabulary_file_without_touching_the_environment(tmp_path, monkeypatch):
+    pytest.importorskip("tiktoken")
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+    ranks = [bytes([byte]) for byte in range(256)] + [b"he", b"ll", b"hell", b"hello"]
+    with open(_vocab_cache_path(str(tmp_path), "cl100k_base"), "wb") as f:
+        f.writelines(base64.b64encode(token) + b" %d\n" % rank for rank, token in enumerate(ranks))
+
+    encoding = load_tiktoken_encoding("cl100k_base", str(tmp_path))
+
+    assert encoding.encode("hello") == [259]
+    assert encoding.encode("<|endoftext|>", allowed_special="all") == [100257]
+    assert "TIKTOKEN_CACHE_DIR" not in os.environ
+    assert load_tiktoken_encoding("p50k_base", str(tmp_path)) is None
@@ -0,0 +1,41 @@
+"""Tests for conversion-layer payload tracing."""
+
+import json
+import logging
+
+from src.conversion.tracing import LazyPayload, redact_payload, trace_payload
+
+
+def test_redacts_base64_images_and_truncates_long_strings():
+    payload = {
+        "messages": [
+            {"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 5000}}]},
+            {"role": "user", "content": [{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "B" * 10}}]},
+            {"role": "assistant", "content": "x" * 50},
+        ]
+    }
+    redacted = redact_payload(payload, max_chars=20)
+    assert redacted["messages"][0]["content"][0]["image_url"]["url"] == "data:image/png;base64,<5000 chars redacted>"
+    assert redacted["messages"][1]["content"][0]["source"]["data"] == "<10 chars redacted>"
+    assert redacted["messages"][2]["content"] == "x" * 20 + "...<30 more chars>"
+    # the original payload is left untouched
+    assert payload["messages"][2]["content"] == "x" * 50
+
+
+def test_payload_is_not_serialized_when_debug_is_disabled(caplog):
+    class _Explodes:
+        def __repr__(self):
+            raise AssertionError("serialized while DEBUG disabled")
+
+    logger = logging.getLogger("tests.tracing")
+    with caplog.at_level(logging.INFO, logger="tests.tracing"):
+        trace_payload(logger, "payload", {"value": _Explodes()})
+    assert caplog.records == []
+
+    with caplog.at_level(logging.DEBUG, logger="tests.tracing"):
+        trace_payload(logger, "payload", {"value": "ok"})
+    assert json.loads(caplog.records[0].getMessage().split(": ", 1)[1]) == {"value": "ok"}
+
+
+def test_lazy_payload_formats_on_str():
+    assert json.loads(str(LazyPayload({"a": [1, 2]}, 100))) == {"a": [1, 2]}
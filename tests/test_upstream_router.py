@@ -0,0 +1,198 @@
+"""Tests for latency-aware routing across upstreams."""
+
+import asyncio
+import contextlib
+import logging
+
+import pytest
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+from src.core.client import OpenAIClient
+from src.core.upstream_router import Upstream, UpstreamRouter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeClient:
+    def __init__(self, fail_with=None):
+        self.requests = []
+        self.fail_with = fail_with
+        self.base_url = "http://fake"
+
+    async def create_chat_completion(self, request, request_id=None, timer=None):
+        self.requests.append(request)
+        if self.fail_with:
+            raise HTTPException(status_code=self.fail_with, detail="upstream failed")
+        return {"model": request["model"]}
+
+    def cancel_request(self, request_id):
+        return False
+
+
+def _router(*upstreams, **kwargs):
+    kwargs.setdefault("clock", _Clock())
+    return UpstreamRouter(list(upstreams), **kwargs)
+
+
+def test_selects_lowest_ewma_ttft_and_shifts_when_it_slows_down():
+    fast, slow = Upstream("fast", _FakeClient()), Upstream("slow", _FakeClient())
+    router = _router(fast, slow)
+    router.record_success(fast, "gpt-4o", 0.2)
+    router.record_success(slow, "gpt-4o", 0.8)
+    for upstream in (fast, slow):
+        router.stats_for(upstream, "gpt-4o").last_selected = router._clock()
+
+    assert router.select("gpt-4o") is fast
+
+    for _ in range(5):
+        router.record_success(fast, "gpt-4o", 3.0)
+
+    assert router.select("gpt-4o") is slow
+
+
+def test_buffered_latency_does_not_skew_stream_routing():
+    a, b = Upstream("a", _FakeClient()), Upstream("b", _FakeClient())
+    router = _router(a, b)
+    router.record_success(a, "gpt-4o", 0.2)
+    router.record_success(b, "gpt-4o", 0.4)
+    # Long buffered answers on `a` say nothing about its time to first token
+    for _ in range(5):
+        router.record_success(a, "gpt-4o", 30.0, stream=False)
+    router.record_success(b, "gpt-4o", 2.0, stream=False)
+    for upstream in (a, b):
+        router.stats_for(upstream, "gpt-4o").last_selected = router._clock()
+
+    assert router.select("gpt-4o", stream=True) is a
+    assert router.select("gpt-4o", stream=False) is b
+    assert router.stats_for(a, "gpt-4o").ttft == 0.2
+
+
+def test_errors_and_in_flight_requests_raise_the_cost():
+    a, b = Upstream("a", _FakeClient()), Upstream("b", _FakeClient())
+    router = _router(a, b)
+    for upstream in (a, b):
+        router.record_success(upstream, "m", 0.5)
+        router.stats_for(upstream, "m").last_selected = router._clock()
+
+    router.record_failure(a, "m")
+    assert router.select("m") is b
+
+    router.stats_for(b, "m").in_flight = 20
+    assert router.select("m") is a
+
+
+def test_unused_candidates_are_probed_after_the_interval():
+    clock = _Clock()
+    fast, slow = Upstream("fast", _FakeClient()), Upstream("slow", _FakeClient())
+    router = _router(fast, slow, clock=clock, probe_interval=30)
+
+    # Every candidate is measured once up front
+    assert {router.select("m").name, router.select("m").name} == {"fast", "slow"}
+    router.record_success(fast, "m", 0.1)
+    router.record_success(slow, "m", 5.0)
+
+    clock.now += 10
+    assert router.select("m") is fast
+    clock.now += 25
+    assert router.select("m") is slow
+    assert router.select("m") is fast
+
+
+def test_model_filter_and_rename():
+    azure = Upstream("azure", _FakeClient(), {"gpt-4o": "my-gpt4o-deployment"})
+    local = Upstream("vllm", _FakeClient(), ["qwen"])
+    router = _router(azure, local)
+
+    response = asyncio.run(router.create_chat_completion({"model": "gpt-4o", "messages": []}))
+
+    assert response == {"model": "my-gpt4o-deployment"}
+    assert router.select("qwen") is local
+    with pytest.raises(HTTPException) as excinfo:
+        router.select("claude-3")
+    assert excinfo.value.status_code == 404
+
+
+def test_upstream_failures_are_counted_but_request_errors_are_not():
+    broken = Upstream("broken", _FakeClient(fail_with=503))
+    router = _router(broken)
+
+    with pytest.raises(HTTPException):
+        asyncio.run(router.create_chat_completion({"model": "m", "messages": []}))
+    broken.client.fail_with = 400
+    with pytest.raises(HTTPException):
+        asyncio.run(router.create_chat_completion({"model": "m", "messages": []}))
+
+    stats = router.stats_for(broken, "m")
+    assert stats.errors == 1 and stats.in_flight == 0
+
+
+def _stub_app(name, delay):
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(body: dict):
+        await asyncio.sleep(delay["seconds"])
+        return {
+            "id": f"chatcmpl-{name}",
+            "object": "chat.completion",
+            "created": 1,
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": name}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    return app
+
+
+@contextlib.asynccontextmanager
+async def _serve(app):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="error", lifespan="off", ws="none"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def test_traffic_shifts_between_local_stub_servers():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    delays = {"east": {"seconds": 0.01}, "west": {"seconds": 0.15}}
+
+    async def scenario():
+        async with _serve(_stub_app("east", delays["east"])) as east_url, \
+                _serve(_stub_app("west", delays["west"])) as west_url:
+            clients = {"east": OpenAIClient("sk-east", east_url), "west": OpenAIClient("sk-west", west_url)}
+            # Keep connection setup out of the first latency samples
+            for client in clients.values():
+                await client.create_chat_completion({"model": "gpt-4o", "messages": []})
+            router = UpstreamRouter([Upstream(name, client) for name, client in clients.items()], alpha=0.5)
+
+            async def burst(count):
+                served = []
+                for i in range(count):
+                    response = await router.create_chat_completion(
+                        {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]}, f"req-{i}"
+                    )
+                    served.append(response["choices"][0]["message"]["content"])
+                return served
+
+            first = await burst(8)
+            delays["east"]["seconds"] = 0.4
+            second = await burst(8)
+            return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first.count("east") >= 6
+    assert second[-4:] == ["west"] * 4